@@ -0,0 +1,73 @@
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import masscan_parser
+import scanners
+
+# 在 127.0.0.0/8 上启动若干本地监听端口, 用 asyncio connect 扫描器扫描, 检查结果并输出探测速率
+# 用法: python benchmarks/bench_connect.py [目标前缀长度, 默认 20] [并发数, 默认 2000] [速率 pps, 默认 100000]
+
+PORTS = [18080, 18443, 18880, 12052, 12082]
+LISTENERS = 40
+
+
+# 在后台线程的事件循环中监听, 接受连接后立即关闭
+def start_listeners(addresses, ports):
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    async def handle(reader, writer):
+        writer.close()
+
+    async def serve():
+        for address in addresses:
+            for port in ports:
+                await asyncio.start_server(handle, address, port, backlog=4096)
+        ready.set()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(serve())
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+
+
+def main():
+    prefix_length = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    rate = int(sys.argv[3]) if len(sys.argv) > 3 else 100000
+    size = 1 << (32 - prefix_length)
+    rng = random.Random(0)
+    # 127.0.0.0 和 127.0.0.1 之外的随机地址
+    addresses = [f"127.0.{value >> 8}.{value & 255}" for value in rng.sample(range(2, size), LISTENERS)]
+    start_listeners(addresses, PORTS)
+
+    backend = scanners.ConnectBackend(concurrency=concurrency, timeout=1.0)
+    scan_ports = ",".join(str(port) for port in PORTS)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_file = os.path.join(tmp_dir, "scan_result.txt")
+        start = time.perf_counter()
+        backend.scan(f"127.0.0.0/{prefix_length}", output_file, scan_ports, rate)
+        elapsed = time.perf_counter() - start
+        ports, ips, _ = masscan_parser.load_columns(output_file)
+
+    probes = size * len(PORTS)
+    found = {(int(ip), int(port)) for ip, port in zip(ips.tolist(), ports.tolist())}
+    expected = {(int.from_bytes(bytes(map(int, address.split('.'))), 'big'), port)
+                for address in addresses for port in PORTS}
+    print(f"{probes} probes in {elapsed:.2f}s ({probes / elapsed:.0f} probes/s), "
+          f"{len(found)} open, expected {len(expected)}")
+    assert found == expected
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import enrich
+import result_store
+
+# 用本地替身服务 (HTTP、HTTPS、SSH banner、不响应) 测试服务识别阶段的正确性和吞吐量
+# 替身服务监听 0.0.0.0, 目标地址分散在 127.0.0.0/8 上; 需要 openssl 命令生成自签名证书
+# 用法: python benchmarks/bench_enrich.py [目标数, 默认 20000] [并发数, 默认 500]
+
+HTTP_PORT, HTTPS_PORT, SSH_PORT, SILENT_PORT = 18080, 18443, 12222, 12345
+# 不响应的目标每个要等满超时, 只放很少一部分
+SILENT_TARGETS = 20
+HTTP_RESPONSE = b"HTTP/1.1 200 OK\r\nServer: stand-in/1.0\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+
+
+def make_certificate(tmp_dir):
+    cert_file, key_file = os.path.join(tmp_dir, "cert.pem"), os.path.join(tmp_dir, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "30",
+                    "-keyout", key_file, "-out", cert_file, "-subj", "/O=Stand-in CA/CN=stand-in.test",
+                    "-addext", "subjectAltName=DNS:stand-in.test,DNS:www.stand-in.test"],
+                   check=True, capture_output=True)
+    return cert_file, key_file
+
+
+def start_servers(cert_file, key_file):
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_file, key_file)
+
+    async def http(reader, writer):
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            writer.write(HTTP_RESPONSE)
+            await writer.drain()
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        writer.close()
+
+    async def ssh(reader, writer):
+        writer.write(b"SSH-2.0-OpenSSH_9.6 stand-in\r\n")
+        await writer.drain()
+        await reader.read(1024)
+        writer.close()
+
+    async def silent(reader, writer):
+        await reader.read()
+        writer.close()
+
+    async def serve():
+        await asyncio.start_server(http, "0.0.0.0", HTTP_PORT, backlog=4096)
+        await asyncio.start_server(http, "0.0.0.0", HTTPS_PORT, ssl=context, backlog=4096)
+        await asyncio.start_server(ssh, "0.0.0.0", SSH_PORT, backlog=4096)
+        await asyncio.start_server(silent, "0.0.0.0", SILENT_PORT, backlog=4096)
+        ready.set()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(serve())
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+
+
+def main():
+    targets = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    rng = np.random.default_rng(0)
+    ips = rng.choice(np.arange(0x7F000002, 0x7F100000, dtype=np.uint32), targets, replace=False)
+    ports = rng.choice(np.array([HTTP_PORT, HTTPS_PORT, SSH_PORT], dtype=np.uint16), targets)
+    ports[:SILENT_TARGETS] = SILENT_PORT
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cert_file, key_file = make_certificate(tmp_dir)
+        start_servers(cert_file, key_file)
+        store_path = os.path.join(tmp_dir, "bench" + result_store.FILE_SUFFIX)
+        result_store.write_results(store_path, ports, ips, np.zeros(targets, dtype=np.uint32), "0", "bench", 0, 0, 0)
+
+        with open(cert_file) as file:
+            certificate = enrich.parse_certificate(ssl.PEM_cert_to_DER_cert(file.read()))
+        print(f"Parsed certificate: {certificate}")
+        assert certificate["issuer_o"] == "Stand-in CA" and certificate["self_signed"]
+        assert certificate["san"] == ["stand-in.test", "www.stand-in.test"]
+
+        enrich.TLS_PORTS.add(HTTPS_PORT)
+        enrich.HTTP_PORTS.add(HTTP_PORT)
+        start = time.perf_counter()
+        target_ips, target_ports = enrich.load_targets(store_path)
+        summary = enrich.enrich_targets(target_ips, target_ports, os.path.join(tmp_dir, "records.jsonl"), concurrency)
+        elapsed = time.perf_counter() - start
+
+    table = summary.to_dict()
+    for port, row in table.items():
+        print(f"port {port}: {row}")
+    print(f"{targets} targets in {elapsed:.2f}s ({targets / elapsed:.0f} targets/s)")
+    assert table[str(HTTP_PORT)]["services"] == {"http": int((ports == HTTP_PORT).sum())}
+    assert table[str(HTTPS_PORT)]["services"] == {"https": int((ports == HTTPS_PORT).sum())}
+    assert table[str(SSH_PORT)]["services"] == {"ssh": int((ports == SSH_PORT).sum())}
+    assert table[str(SILENT_PORT)]["services"] == {"silent": SILENT_TARGETS}
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import masscan_parser
+
+# 对比逐行解析与 NumPy 批量解析 masscan -oL 输出的速度
+# 用法: python benchmarks/bench_parser.py [行数, 默认 10000000]
+
+DEFAULT_LINES = 10_000_000
+PORTS = [80, 443, 2052, 2053, 2082, 2083, 2086, 2087, 2095, 2096, 8080, 8443, 8880]
+
+
+# 生成合成的 masscan 列表输出
+def generate_masscan_file(path, lines, batch=100_000):
+    rng = np.random.default_rng(0)
+    with open(path, 'w') as file:
+        file.write("#masscan\n")
+        written = 0
+        while written < lines:
+            n = min(batch, lines - written)
+            ports = rng.choice(PORTS, n, p=None)
+            ips = rng.integers(0x01000000, 0xDF000000, n, dtype=np.uint32)
+            timestamps = 1720000000 + np.sort(rng.integers(0, 3600, n))
+            file.writelines(
+                f"open tcp {port} {ip >> 24}.{(ip >> 16) & 255}.{(ip >> 8) & 255}.{ip & 255} {ts}\n"
+                for port, ip, ts in zip(ports.tolist(), ips.tolist(), timestamps.tolist()))
+            written += n
+        file.write(f"# end {1720003600}\n")
+
+
+# 原来 multi_port.parse_masscan_output 的逐行实现, 作为基线
+def parse_line_by_line(file_path):
+    port_counts = defaultdict(int)
+    with open(file_path, 'r') as file:
+        for line in file:
+            if line.startswith('open'):
+                parts = line.split()
+                if len(parts) >= 3:
+                    port = int(parts[2])
+                    port_counts[port] += 1
+    return port_counts
+
+
+def timed(label, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:8.2f}s")
+    return result, elapsed
+
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_LINES
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "scan_result.txt")
+        timed(f"generate {lines} lines", generate_masscan_file, path, lines)
+        print(f"file size: {os.path.getsize(path) / 1024 / 1024:.1f} MiB")
+
+        baseline, baseline_time = timed("line-by-line", parse_line_by_line, path)
+        histogram, histogram_time = timed("numpy count_ports", masscan_parser.count_ports, path)
+        columns, columns_time = timed("numpy load_columns", masscan_parser.load_columns, path)
+
+        assert masscan_parser.histogram_to_dict(histogram) == baseline
+        assert columns[0].size == lines
+        print(f"speedup (count_ports): {baseline_time / histogram_time:.1f}x")
+        print(f"speedup (load_columns): {baseline_time / columns_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
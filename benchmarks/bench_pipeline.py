@@ -0,0 +1,158 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import metrics
+import pipeline
+import prefixes
+import prefix_source
+import result_store
+import scanners
+
+# 端到端基准: 用合成的 masscan 替身 (benchmarks/bin/masscan) 驱动 scan_and_genstatistics,
+# 不需要 root 和网络; 在临时目录中运行, 记录每个阶段 (前缀加载、扫描、解析、统计、绘图、README) 的耗时,
+# 追加到 benchmarks/results/pipeline.jsonl, 并与同一配置的上一次结果对比
+# 用法: python benchmarks/bench_pipeline.py [--profile small|asn|hinet] [--addresses N] [--density D] [--streaming]
+
+BIN_DIR = os.path.join(REPO_DIR, "benchmarks", "bin")
+RESULTS_FILE = os.path.join(REPO_DIR, "benchmarks", "results", "pipeline.jsonl")
+BENCH_ASN = "64512"
+DEFAULT_PORTS = "80,443,2052,2053,2082,2083,2086,2087,2095,2096,8080,8443,8880"
+# small: 快速检查; asn: 中等规模 ASN; hinet: 与 HINET (AS3462) 规模相当, 约 1200 万地址
+PROFILES = {
+    "small": {"addresses": 1 << 16, "density": 0.01},
+    "asn": {"addresses": 1 << 21, "density": 0.01},
+    "hinet": {"addresses": 12_000_000, "density": 0.01},
+}
+STAGES = ("prefixes", "scan", "parse", "statistics", "history", "render", "manifest", "readme")
+
+
+# 合成前缀: 从 60.0.0.0 起按对齐的 /14 - /22 依次排列, 中间留空隙, 并混入少量重叠前缀以覆盖归一化
+def synthetic_prefixes(addresses, seed=0):
+    rng = np.random.default_rng(seed)
+    cidrs = []
+    cursor = 60 << 24
+    total = 0
+    while total < addresses:
+        length = int(rng.integers(14, 23))
+        size = 1 << (32 - length)
+        cursor = (cursor + size - 1) // size * size
+        cidrs.append(f"{result_store.int_to_ip(cursor)}/{length}")
+        total += size
+        cursor += size * int(rng.integers(1, 3))
+    return cidrs + cidrs[::10]
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_pipeline(work_dir, addresses, scan_ports, density, streaming, rate):
+    os.chdir(work_dir)
+    cidrs = synthetic_prefixes(addresses)
+    now = time.time()
+    os.makedirs(prefix_source.ASN_DIR, exist_ok=True)
+    prefixes.write_prefix_cache(prefix_source.cache_path(BENCH_ASN), cidrs,
+                                {"source": "bench", "fetched_at": now, "checked_at": now, "ttl": 86400})
+    os.environ["PATH"] = os.pathsep.join([BIN_DIR, os.path.dirname(sys.executable), os.environ["PATH"]])
+    os.environ["FAKE_MASSCAN_DENSITY"] = str(density)
+    # 替身不需要 root, 强制使用 masscan 后端
+    scanners.DEFAULT_BACKEND = scanners.MasscanBackend.name
+
+    metrics.start_run("bench_pipeline")
+    pipeline.scan_and_genstatistics(BENCH_ASN, scan_ports, rate, streaming=streaming)
+    pipeline.refresh_markdown("ports_results")
+    return metrics.current().report()
+
+
+def load_previous(config):
+    if not os.path.exists(RESULTS_FILE):
+        return None
+    previous = None
+    with open(RESULTS_FILE) as file:
+        for line in file:
+            entry = json.loads(line)
+            if entry["config"] == config:
+                previous = entry
+    return previous
+
+
+def stage_table(report):
+    stages = {}
+    for record in report["phases"]:
+        stage = stages.setdefault(record["phase"], {"wall": 0.0, "cpu": 0.0})
+        stage["wall"] = round(stage["wall"] + record["wall"], 4)
+        stage["cpu"] = round(stage["cpu"] + record["cpu"] + record["children_cpu"], 4)
+        for key in ("results", "results_per_second", "probes_per_second"):
+            if key in record:
+                stage[key] = record[key]
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark with a synthetic masscan")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="small")
+    parser.add_argument("--addresses", type=int, help="override the number of addresses")
+    parser.add_argument("--density", type=float, help="override the open probability per (address, port)")
+    parser.add_argument("--ports", default=DEFAULT_PORTS)
+    parser.add_argument("--rate", type=int, default=100000)
+    parser.add_argument("--streaming", action="store_true")
+    parser.add_argument("--no-record", action="store_true", help="do not append to the results file")
+    args = parser.parse_args()
+    profile = PROFILES[args.profile]
+    config = {
+        "addresses": args.addresses or profile["addresses"],
+        "density": args.density if args.density is not None else profile["density"],
+        "ports": args.ports,
+        "streaming": args.streaming,
+    }
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        try:
+            report = run_pipeline(work_dir, config["addresses"], config["ports"], config["density"],
+                                  config["streaming"], args.rate)
+        finally:
+            os.chdir(cwd)
+
+    stages = stage_table(report)
+    previous = load_previous(config)
+    # scan 包含前缀加载和解析 (流式模式下解析在扫描过程中完成)
+    print(f"\nPipeline benchmark {config} (revision {git_revision()}):")
+    print(f"{'stage':<12}{'wall s':>10}{'cpu s':>10}{'results':>12}{'results/s':>14}{'vs previous':>14}")
+    for name in [stage for stage in STAGES if stage in stages] + [stage for stage in stages if stage not in STAGES]:
+        stage = stages[name]
+        change = ""
+        if previous and name in previous["stages"] and previous["stages"][name]["wall"] > 0:
+            change = f"{(stage['wall'] / previous['stages'][name]['wall'] - 1) * 100:+.1f}%"
+        print(f"{name:<12}{stage['wall']:>10.3f}{stage['cpu']:>10.3f}{stage.get('results', ''):>12}"
+              f"{stage.get('results_per_second', ''):>14}{change:>14}")
+    print(f"total {report['wall']:.3f}s, peak RSS {report['peak_rss_bytes'] / 2 ** 20:.0f} MiB "
+          f"(children {report['children_peak_rss_bytes'] / 2 ** 20:.0f} MiB)")
+
+    if not args.no_record:
+        os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+        entry = {"timestamp": int(time.time()), "revision": git_revision(), "python": platform.python_version(),
+                 "numpy": np.__version__, "config": config, "wall": report["wall"],
+                 "peak_rss_bytes": report["peak_rss_bytes"], "stages": stages}
+        with open(RESULTS_FILE, 'a') as file:
+            file.write(json.dumps(entry) + "\n")
+        print(f"Result appended to {RESULTS_FILE}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asn
+import render
+
+# 对比串行与进程池绘制 asn.ASN_Map 中全部 ASN 的图表的耗时, 并输出主进程的峰值内存
+# 用法: python benchmarks/bench_render.py [进程数, 默认 CPU 核数] [重复次数, 默认 1]
+
+PORTS = "80,443,2052,2053,2082,2083,2086,2087,2095,2096,8080,8443,8880"
+
+
+def make_jobs(results_dir, repeat):
+    rng = random.Random(0)
+    ports = [int(port) for port in PORTS.split(',')]
+    jobs = []
+    for round_index in range(repeat):
+        for asn_number in asn.ASN_Map:
+            jobs.append({
+                "asn": f"{asn_number}" if round_index == 0 else f"{asn_number}-{round_index}",
+                "scan_ports": PORTS,
+                "port_counts": {port: rng.randrange(1, 200000) for port in ports},
+                "results_dir": results_dir,
+            })
+    return jobs
+
+
+def peak_rss_mib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        jobs = make_jobs(tmp_dir, repeat)
+        start = time.perf_counter()
+        render.render_charts(jobs, max_workers=1)
+        serial = time.perf_counter() - start
+        print(f"serial   {len(jobs)} charts {serial:8.2f}s  peak rss {peak_rss_mib():.0f} MiB")
+
+        start = time.perf_counter()
+        paths = render.render_charts(jobs, max_workers=workers, force=True)
+        pooled = time.perf_counter() - start
+        print(f"{workers} procs  {len(jobs)} charts {pooled:8.2f}s  speedup {serial / pooled:.1f}x")
+        assert all(os.path.exists(path) for path in paths)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import os
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import fake_bgpview
+import prefix_index
+import prefix_source
+import prefixes
+
+# 用本地模拟的 bgpview 服务 (benchmarks/fake_bgpview.py) 检查前缀获取的各条路径:
+# 503 重试、TTL 内直接用缓存、过期后的 304 条件请求、服务不可用时退回旧缓存,
+# 以及离线索引中没有的 ASN 改走 bgpview; 不需要网络
+# 用法: python benchmarks/check_prefix_source.py
+
+ASN_NUMBER = "64512"
+INDEXED_ASN = "64513"
+# 重试退避取很小的值, 检查不需要等待
+BACKOFF = 0.01
+
+
+def requests_made(server):
+    return server.RequestHandlerClass.state["requests"]
+
+
+def check_retry_and_ttl(asn_dir):
+    server, base_url = fake_bgpview.serve(prefix_count=50, fail_first=2)
+    try:
+        session = prefix_source.make_session(pool_size=1, retries=3, backoff_factor=BACKOFF)
+        cache = prefix_source.get_api_prefix_cache(ASN_NUMBER, session, base_url, asn_dir=asn_dir)
+        assert requests_made(server) == 3, "two 503 responses should be retried before the 200"
+        assert cache["raw"] == fake_bgpview.fake_prefixes(ASN_NUMBER, 50)
+        assert cache["meta"]["etag"]
+
+        # 缓存在有效期内, 不发请求
+        again = prefix_source.get_api_prefix_cache(ASN_NUMBER, session, base_url, asn_dir=asn_dir)
+        assert requests_made(server) == 3 and again == cache
+
+        # 缓存记录的有效期过后 (这里把检查时间改到有效期之前), 带 If-None-Match 请求, 服务返回 304, 只刷新检查时间
+        expired = dict(cache, meta=dict(cache["meta"], checked_at=cache["meta"]["checked_at"] - cache["meta"]["ttl"]))
+        prefixes.save_prefix_cache(prefix_source.cache_path(ASN_NUMBER, asn_dir), expired)
+        refreshed = prefix_source.get_api_prefix_cache(ASN_NUMBER, session, base_url, asn_dir=asn_dir)
+        assert requests_made(server) == 4
+        assert server.RequestHandlerClass.state["not_modified"] == 1
+        assert refreshed["raw"] == cache["raw"]
+        assert refreshed["meta"]["checked_at"] > cache["meta"]["checked_at"]
+        assert prefix_source.load_cached(ASN_NUMBER, asn_dir)["meta"]["checked_at"] == refreshed["meta"]["checked_at"]
+    finally:
+        server.shutdown()
+    print("retry, TTL and 304 conditional request: ok")
+    return cache
+
+
+def check_stale_fallback(asn_dir, cache):
+    # 每次请求都返回 503, 重试用完后退回已有的旧缓存
+    server, base_url = fake_bgpview.serve(prefix_count=50, fail_first=1000)
+    try:
+        session = prefix_source.make_session(pool_size=1, retries=2, backoff_factor=BACKOFF)
+        stale = prefix_source.get_api_prefix_cache(ASN_NUMBER, session, base_url, asn_dir=asn_dir, force=True)
+        assert requests_made(server) == 3
+        assert stale["raw"] == cache["raw"]
+        assert stale["meta"]["ttl"] == prefix_source.FAILED_REFRESH_TTL
+
+        # 同一次运行中再次读取 (例如扫描时的 get_cidr_ips) 直接使用标记过的旧缓存, 不再请求
+        again = prefix_source.get_api_prefix_cache(ASN_NUMBER, session, base_url, asn_dir=asn_dir)
+        assert requests_made(server) == 3 and again["raw"] == cache["raw"]
+    finally:
+        server.shutdown()
+    print("stale cache fallback: ok")
+
+
+def check_index_fallback(asn_dir):
+    index_path = os.path.join(asn_dir, "prefix_index.opri")
+    prefix_index.save_index(index_path, prefix_index.build_index([("10.0.0.0", 16, int(INDEXED_ASN))]))
+    server, base_url = fake_bgpview.serve(prefix_count=50)
+    try:
+        caches = prefix_source.get_prefix_caches([INDEXED_ASN, "64514"], base_url, asn_dir=asn_dir,
+                                                 index_path=index_path)
+        assert caches[INDEXED_ASN]["normalized"] == ["10.0.0.0/16"]
+        assert caches["64514"]["raw"] == fake_bgpview.fake_prefixes("64514", 50)
+        assert requests_made(server) == 1, "only the ASN missing from the index should be fetched"
+
+        # 索引内容没有变化时不重写 asn/<n>
+        cache_file = prefix_source.cache_path(INDEXED_ASN, asn_dir)
+        written = os.stat(cache_file).st_mtime_ns
+        os.utime(cache_file, ns=(written - 10 ** 9, written - 10 ** 9))
+        prefix_source.get_prefix_cache(INDEXED_ASN, asn_dir=asn_dir, index_path=index_path)
+        assert os.stat(cache_file).st_mtime_ns == written - 10 ** 9
+    finally:
+        server.shutdown()
+    print("offline index with bgpview fallback: ok")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as asn_dir:
+        cache = check_retry_and_ttl(asn_dir)
+        check_stale_fallback(asn_dir, cache)
+        assert prefixes.read_prefix_cache(prefix_source.cache_path(ASN_NUMBER, asn_dir))["raw"] == cache["raw"]
+        check_index_fallback(asn_dir)
+
+
+if __name__ == '__main__':
+    main()
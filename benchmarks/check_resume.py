@@ -0,0 +1,95 @@
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import checkpoint
+import pipeline
+import prefix_source
+import prefixes
+import result_store
+import scanners
+
+# 检查可续跑的分片扫描: 用合成的 masscan 替身 (benchmarks/bin/masscan) 扫描同一组前缀两次,
+# 一次不中断, 一次在扫描到第 N 个分片时模拟任务被取消 (KeyboardInterrupt), 然后重新运行从检查点续跑,
+# 两次合并后的端口计数和记录必须完全相同, 续跑时不会重新扫描已完成的分片
+# 用法: python benchmarks/check_resume.py [分片数, 默认 6] [中断时正在扫描的分片, 默认 3]
+
+BIN_DIR = os.path.join(REPO_DIR, "benchmarks", "bin")
+CHECK_ASN = "64512"
+SCAN_PORTS = "80,443,8080,8443"
+SHARD_SIZE = 1 << 12
+
+
+def prepare(work_dir, shards):
+    os.chdir(work_dir)
+    now = time.time()
+    os.makedirs(prefix_source.ASN_DIR, exist_ok=True)
+    cidrs = [f"60.0.{index * 16}.0/20" for index in range(shards)]
+    prefixes.write_prefix_cache(prefix_source.cache_path(CHECK_ASN), cidrs,
+                                {"source": "check", "fetched_at": now, "checked_at": now, "ttl": 86400})
+
+
+# 扫描到第 interrupt_at 个分片 (从 1 开始) 时抛出 KeyboardInterrupt, 与任务被取消时一样留下已完成分片的检查点
+def interrupting_scan(interrupt_at, scanned):
+    scan_ip_range = pipeline.scan_ip_range
+
+    def scan(targets, *args, **kwargs):
+        scanned.append(targets)
+        if len(scanned) == interrupt_at:
+            raise KeyboardInterrupt
+        return scan_ip_range(targets, *args, **kwargs)
+    return scan
+
+
+def load(store_path):
+    _, columns = result_store.open_results(store_path)
+    order = np.lexsort((columns["ports"], columns["ips"]))
+    return result_store.load_port_histogram(store_path), columns["ips"][order], columns["ports"][order]
+
+
+def main():
+    shards = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    interrupt_at = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    os.environ["PATH"] = os.pathsep.join([BIN_DIR, os.path.dirname(sys.executable), os.environ["PATH"]])
+    scanners.DEFAULT_BACKEND = scanners.MasscanBackend.name
+    cwd = os.getcwd()
+    scan_ip_range = pipeline.scan_ip_range
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            prepare(work_dir, shards)
+            expected = load(pipeline.run_masscan_resumable(CHECK_ASN, SCAN_PORTS, 100000, SHARD_SIZE))
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            prepare(work_dir, shards)
+            scanned = []
+            pipeline.scan_ip_range = interrupting_scan(interrupt_at, scanned)
+            try:
+                pipeline.run_masscan_resumable(CHECK_ASN, SCAN_PORTS, 100000, SHARD_SIZE)
+                raise AssertionError("the first run was expected to be interrupted")
+            except KeyboardInterrupt:
+                print(f"Interrupted while scanning shard {interrupt_at}/{shards}.")
+            assert os.path.isdir(checkpoint.CHECKPOINT_DIR)
+
+            resumed = []
+            pipeline.scan_ip_range = interrupting_scan(0, resumed)
+            actual = load(pipeline.run_masscan_resumable(CHECK_ASN, SCAN_PORTS, 100000, SHARD_SIZE))
+            assert len(resumed) == shards - interrupt_at + 1, resumed
+            assert not os.listdir(os.path.join(checkpoint.CHECKPOINT_DIR, CHECK_ASN))
+    finally:
+        pipeline.scan_ip_range = scan_ip_range
+        os.chdir(cwd)
+
+    for name, left, right in zip(("port counts", "ips", "ports"), expected, actual):
+        assert np.array_equal(left, right), f"{name} differ between the uninterrupted and the resumed scan"
+    print(f"Resumed scan rescanned {len(resumed)}/{shards} shards and merged to the same {len(expected[1])} "
+          f"results as the uninterrupted scan.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scheduler
+
+# 检查多 ASN 调度的速率分配: 用 sleep(地址数 / 速率) 模拟扫描, 其中一个 ASN 有速率上限 (自适应速率的校准结果),
+# 检查任何时刻各扫描的速率之和不超过全局速率, 实际的总速率 (总地址数 / 耗时) 接近理论上限,
+# 并与按 lane 负载固定切分速率 (上限省下的速率无人使用) 的耗时对比
+# 用法: python benchmarks/check_scheduler.py [全局速率 pps, 默认 100000]
+
+# 2 条 lane: D 单独一条, 受限的 A 与 B、C 在另一条 (A 最先开始)
+JOBS = [("A", 20000), ("B", 30000), ("C", 70000), ("D", 170000)]
+RATE_CAPS = {"A": 10000}
+WORKERS = 2
+# 允许比理论下限多出的耗时比例 (速率只在 ASN 边界上调整, 以及线程调度的误差)
+TOLERANCE = 0.15
+
+
+# 固定切分时的耗时: 每条 lane 按负载比例分到速率, 受限的 ASN 用不完的部分闲置
+def static_seconds(global_rate):
+    lanes, loads = scheduler.plan_lanes(JOBS, WORKERS)
+    addresses = dict(JOBS)
+    total = sum(loads)
+    return max(sum(addresses[asn_number] / min(global_rate * load / total, RATE_CAPS.get(asn_number, global_rate))
+                   for asn_number in lane) for lane, load in zip(lanes, loads))
+
+
+def main():
+    global_rate = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    addresses = dict(JOBS)
+    active = {}
+    peak = [0]
+    lock = threading.Lock()
+
+    def scan(asn_number, rate):
+        assert rate <= RATE_CAPS.get(asn_number, rate), f"ASN {asn_number} exceeded its cap"
+        with lock:
+            active[asn_number] = rate
+            peak[0] = max(peak[0], sum(active.values()))
+        time.sleep(addresses[asn_number] / rate)
+        with lock:
+            del active[asn_number]
+        return rate
+
+    started = time.perf_counter()
+    rates = scheduler.run_scheduled(JOBS, scan, global_rate, WORKERS, RATE_CAPS)
+    elapsed = time.perf_counter() - started
+
+    total = sum(addresses.values())
+    bound = max(total / global_rate, max(addresses[asn_number] / cap for asn_number, cap in RATE_CAPS.items()))
+    print(f"rates {rates}, peak aggregate {peak[0]} pps")
+    print(f"{total} addresses in {elapsed:.2f}s ({total / elapsed:.0f} pps), lower bound {bound:.2f}s, "
+          f"fixed per-lane rates {static_seconds(global_rate):.2f}s")
+    assert peak[0] <= global_rate, "scans together exceeded the global rate"
+    assert elapsed <= bound * (1 + TOLERANCE), "unused rate budget was not handed to the other lanes"
+
+
+if __name__ == '__main__':
+    main()
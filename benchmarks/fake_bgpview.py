@@ -0,0 +1,89 @@
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 本地模拟的 bgpview 服务, 返回与 https://api.bgpview.io/asn/<n>/prefixes 相同结构的 JSON,
+# 支持 ETag 条件请求, 可以让前若干次请求返回 503 来验证重试; 请求数和 304 次数记录在 Handler.state 中,
+# benchmarks/check_prefix_source.py 用它检查 prefix_source 的重试、TTL、条件请求和旧缓存回退
+# 用法: python benchmarks/fake_bgpview.py [端口, 默认 8765] [每个 ASN 的前缀数, 默认 200]
+
+PATH_PATTERN = re.compile(r"^/asn/(\d+)/prefixes$")
+
+
+# 为每个 ASN 生成确定的、带重叠的前缀列表
+def fake_prefixes(asn_number, count):
+    rng = random.Random(int(asn_number))
+    cidrs = []
+    for _ in range(count):
+        first = rng.randrange(1, 223)
+        second = rng.randrange(0, 256)
+        length = rng.choice((16, 18, 20, 22, 24))
+        third = rng.randrange(0, 256) >> (24 - length) << (24 - length) if length > 16 else 0
+        cidrs.append(f"{first}.{second}.{third}.0/{length}")
+        # 模拟 bgpview 中常见的嵌套前缀
+        if length < 24 and rng.random() < 0.3:
+            cidrs.append(f"{first}.{second}.{third}.0/24")
+    return cidrs
+
+
+def make_handler(prefix_count, fail_first=0):
+    state = {"requests": 0, "failures_left": fail_first, "not_modified": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with lock:
+                state["requests"] += 1
+                fail = state["failures_left"] > 0
+                if fail:
+                    state["failures_left"] -= 1
+            match = PATH_PATTERN.match(self.path)
+            if match is None:
+                self.send_error(404)
+                return
+            if fail:
+                self.send_error(503)
+                return
+            body = json.dumps({
+                "status": "ok",
+                "data": {"ipv4_prefixes": [{"prefix": cidr} for cidr in fake_prefixes(match.group(1), prefix_count)]},
+            }).encode()
+            etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+            if self.headers.get("If-None-Match") == etag:
+                with lock:
+                    state["not_modified"] += 1
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    Handler.state = state
+    return Handler
+
+
+# 在后台线程中启动服务, 返回 (server, base_url)
+def serve(port=0, prefix_count=200, fail_first=0):
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(prefix_count, fail_first))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(count))
+    print(f"Serving fake bgpview on http://127.0.0.1:{port}")
+    server.serve_forever()
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+import result_store
+
+# 可续跑的分片扫描: 地址空间按分片扫描, 每完成一个分片就把分片结果和端口计数
+# 写入检查点, 中断后重新运行会跳过已完成的分片, 全部完成后按分片顺序合并
+
+CHECKPOINT_DIR = "scan_checkpoints"
+# 每个分片的地址数, 13 个端口、20000 pps 时一个分片大约 11 分钟
+DEFAULT_SHARD_SIZE = 1 << 20
+STATE_FILE = "checkpoint.json"
+
+
+def checkpoint_dir(asn_number, scan_ports, checkpoint_root=CHECKPOINT_DIR):
+    return os.path.join(checkpoint_root, str(asn_number), scan_ports)
+
+
+# 前缀和分片参数的摘要, 前缀变化后旧的检查点不再有效
+def scan_digest(cidrs, scan_ports, shard_size):
+    payload = json.dumps({"cidrs": list(cidrs), "scan_ports": scan_ports, "shard_size": shard_size})
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _new_state(asn_number, scan_ports, rate, digest, shard_size, shard_count, directory):
+    return {
+        "asn": str(asn_number),
+        "scan_ports": scan_ports,
+        "rate": rate,
+        "digest": digest,
+        "shard_size": shard_size,
+        "shard_count": shard_count,
+        "start_time": time.time(),
+        "runs": 0,
+        "completed": {},
+        "directory": directory,
+    }
+
+
+# 读取检查点; 不存在或者与当前前缀/分片参数不一致时重新开始
+def load_checkpoint(asn_number, scan_ports, rate, cidrs, shard_size, shard_count, checkpoint_root=CHECKPOINT_DIR):
+    directory = checkpoint_dir(asn_number, scan_ports, checkpoint_root)
+    digest = scan_digest(cidrs, scan_ports, shard_size)
+    state_path = os.path.join(directory, STATE_FILE)
+    state = None
+    if os.path.exists(state_path):
+        with open(state_path, 'r') as file:
+            state = json.load(file)
+        if state.get("digest") != digest or state.get("shard_count") != shard_count:
+            print(f"Checkpoint for ASN {asn_number} is stale (prefixes changed), starting over.")
+            shutil.rmtree(directory, ignore_errors=True)
+            state = None
+    if state is None:
+        os.makedirs(directory, exist_ok=True)
+        state = _new_state(asn_number, scan_ports, rate, digest, shard_size, shard_count, directory)
+    else:
+        print(f"Resuming ASN {asn_number}: {len(state['completed'])}/{shard_count} shards already done.")
+    state["runs"] += 1
+    save_checkpoint(state)
+    return state
+
+
+# 原子写入检查点 (先写临时文件再 rename), 任务被取消时不会留下半个文件
+def save_checkpoint(state):
+    state_path = os.path.join(state["directory"], STATE_FILE)
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(state, file)
+    os.replace(tmp_path, state_path)
+
+
+def is_shard_done(state, index):
+    return str(index) in state["completed"]
+
+
+def shard_store_path(state, index):
+    return os.path.join(state["directory"], f"shard_{index:05d}{result_store.FILE_SUFFIX}")
+
+
+def mark_shard_done(state, index, port_counts, results):
+    state["completed"][str(index)] = {
+        "port_counts": {str(port): count for port, count in port_counts.items()},
+        "results": results,
+        "finished_at": time.time(),
+    }
+    save_checkpoint(state)
+
+
+# 合并所有分片的端口计数
+def merged_port_counts(state):
+    totals = {}
+    for shard in state["completed"].values():
+        for port, count in shard["port_counts"].items():
+            totals[int(port)] = totals.get(int(port), 0) + count
+    return totals
+
+
+# 全部分片完成后按分片顺序拼接结果文件, 与不中断的扫描得到相同的结果;
+# 合并后的端口计数与检查点中记录的各分片计数一致时才删除检查点, 否则保留检查点以便排查或重新合并
+def finish(state, store_path, **extra):
+    missing = [index for index in range(state["shard_count"]) if not is_shard_done(state, index)]
+    if missing:
+        raise RuntimeError(f"Cannot merge ASN {state['asn']}: shards {missing} are not finished")
+    os.makedirs(os.path.dirname(store_path), exist_ok=True)
+    writer = result_store.ResultWriter(store_path, state["asn"], state["scan_ports"], state["rate"],
+                                       state["start_time"], shards=state["shard_count"], runs=state["runs"], **extra)
+    for index in range(state["shard_count"]):
+        _, columns = result_store.open_results(shard_store_path(state, index))
+        writer.append(columns["ports"], columns["ips"], columns["timestamps"])
+    writer.close()
+    histogram = result_store.load_port_histogram(store_path)
+    merged = {int(port): int(histogram[port]) for port in np.flatnonzero(histogram)}
+    if merged != merged_port_counts(state):
+        os.remove(store_path)
+        raise RuntimeError(f"Merged result of ASN {state['asn']} does not match the checkpointed shard counts")
+    shutil.rmtree(state["directory"], ignore_errors=True)
+    return store_path
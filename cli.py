@@ -0,0 +1,295 @@
+import argparse
+import json
+import sys
+
+import metrics
+import scheduler
+
+# 命令行入口, 取代修改 multi_port.py / one_port.py 的 main() 来切换 ASN 和端口:
+#   scan    扫描 ASN 并生成统计、图表、密度、排名和 README
+#   render  用已保存的扫描结果重新绘图, 不重新扫描
+#   readme  根据结果清单重新生成 README
+#   rank    在终端输出跨 ASN 的端口排名 (text / json / csv), --publish 时同时写出排名文件和热力图
+#   shard   多节点分片扫描 (见 distributed.py): plan 生成计划, scan 在节点上扫描一个分片, merge 合并各节点的结果,
+#           local 在本机用 N 个进程完成全部步骤
+# 扫描流水线在 pipeline.py 中; 各子命令执行时才导入需要的模块, readme 和 rank 不会加载 matplotlib 和 requests
+
+DEFAULT_ASNS = ["906"]
+RANK_FORMATS = ("text", "json", "csv")
+PORTS_HELP = ("port profile name (see port_profiles.PORT_PROFILES) or masscan port spec such as 80,443 or 0-65535; "
+              "repeat to scan several profiles in one pass")
+
+
+# "all" 展开为 ASN_Map 中的全部 ASN, 去掉重复
+def expand_asns(values):
+    asns = []
+    for value in values:
+        for asn_number in scheduler.resolve_asns("all") if value == "all" else [value]:
+            if asn_number not in asns:
+                asns.append(asn_number)
+    return asns
+
+
+# 解析 ASN 参数: "906"、"all" 或 "906:full" (只对该 ASN 使用指定的端口组合),
+# 返回 (asns, requests): 全部是普通 ASN 时 requests 为 None, 否则为 [(asn, 组合), ...]
+def parse_asn_args(values, profiles):
+    asns, requests = [], []
+    for value in values:
+        asn_number, _, profile = value.partition(":")
+        for item in expand_asns([asn_number]):
+            if item not in asns:
+                asns.append(item)
+            requests.extend((item, spec) for spec in ([profile] if profile else profiles))
+    if not any(":" in value for value in values):
+        return asns, None
+    return asns, requests
+
+
+# 端口组合和结果目录的默认值在执行时才读取, 只查看帮助时不导入 numpy
+def _profiles(args):
+    import port_profiles
+    return args.ports or [port_profiles.DEFAULT_PROFILE]
+
+
+def _results_dir(args):
+    import render
+    return args.results_dir or render.RESULTS_DIR
+
+
+def run_scan(args):
+    import pipeline
+    import scanners
+    if args.backend:
+        scanners.DEFAULT_BACKEND = args.backend
+    profiles = _profiles(args)
+    asns, requests = parse_asn_args(args.asns, profiles)
+    options = {
+        "global_rate": args.rate, "max_workers": args.workers, "streaming": args.streaming,
+        "shard_size": args.shard_size, "incremental_scan": args.incremental, "sample": args.sample,
+        "enrich_services": args.enrich, "enrich_max_per_port": args.enrich_max_per_port,
+        "adaptive_rate": args.adaptive_rate, "render_workers": args.render_workers,
+    }
+    if requests is None:
+        pipeline.scan_asns(asns, profiles, **options)
+    else:
+        pipeline.scan_batches(requests, **options)
+    if not args.no_readme:
+        pipeline.refresh_markdown(_results_dir(args))
+    if not args.keep_raw:
+        # 删除 masscan 文本结果的目录
+        with metrics.phase("cleanup"):
+            pipeline.clear_folder("masscan_results")
+    return 0
+
+
+def run_render(args):
+    import pipeline
+    import port_profiles
+    for spec in dict.fromkeys(port_profiles.resolve_profiles(_profiles(args)).values()):
+        pipeline.replot_from_store(expand_asns(args.asns), spec, args.workers, args.force)
+    if not args.no_readme:
+        pipeline.refresh_markdown(_results_dir(args))
+    return 0
+
+
+def run_readme(args):
+    import manifest
+    manifest.bootstrap(_results_dir(args))
+    manifest.refresh_readme()
+    return 0
+
+
+def run_rank(args):
+    import port_profiles
+    import ranking
+    profile = args.ports or port_profiles.DEFAULT_PROFILE
+    scan_ports = port_profiles.resolve_profiles(profile)[profile]
+    top_n = args.top or ranking.DEFAULT_TOP_N
+    ranked = ranking.load_ranking(scan_ports, top_n)
+    if ranked is None:
+        print(f"No scanned ASNs with ports {scan_ports} to rank.", file=sys.stderr)
+        return 1
+    result, table = ranked
+    if args.format == "json":
+        sys.stdout.write(json.dumps(table, indent=1) + "\n")
+    elif args.format == "csv":
+        sys.stdout.write(ranking.ranking_csv(result))
+    else:
+        sys.stdout.write(ranking.ranking_text(table))
+    if args.publish:
+        import manifest
+        ranking.publish_ranking(scan_ports, top_n)
+        manifest.refresh_readme()
+    return 0
+
+
+def run_shard_plan(args):
+    import distributed
+    distributed.make_plan(expand_asns(args.asns), _profiles(args), args.shards, args.rate, args.plan)
+    return 0
+
+
+def run_shard_scan(args):
+    import distributed
+    import scanners
+    if args.backend:
+        scanners.DEFAULT_BACKEND = args.backend
+    distributed.scan_shard(distributed.load_plan(args.plan), args.index, args.output, args.rate, args.workers)
+    return 0
+
+
+def _merge(args, directories):
+    import distributed
+    import pipeline
+    distributed.merge(distributed.load_plan(args.plan), directories, args.enrich, args.enrich_max_per_port,
+                      args.render_workers)
+    if not args.no_readme:
+        pipeline.refresh_markdown(_results_dir(args))
+    return 0
+
+
+def run_shard_merge(args):
+    import distributed
+    return _merge(args, args.partials or distributed.partial_dirs())
+
+
+def run_shard_local(args):
+    import distributed
+    distributed.make_plan(expand_asns(args.asns), _profiles(args), args.shards, args.rate, args.plan)
+    node_args = ["--workers", str(args.workers)] + (["--backend", args.backend] if args.backend else [])
+    return _merge(args, distributed.run_local(args.plan, args.shards, args.partial_root, node_args))
+
+
+def _add_metrics_options(parser):
+    parser.add_argument("--report-dir", default=metrics.REPORT_DIR, help="directory for the JSON run report")
+    parser.add_argument("--prometheus-file", default=None,
+                        help=f"also write a Prometheus textfile (default: ${metrics.PROMETHEUS_ENV})")
+
+
+def _add_target_options(parser):
+    parser.add_argument("asns", nargs="*", default=DEFAULT_ASNS,
+                        help="ASN numbers or 'all' for every ASN in asn.ASN_Map (default: %(default)s)")
+    parser.add_argument("-p", "--ports", action="append", help=PORTS_HELP)
+
+
+def _add_enrich_options(parser):
+    parser.add_argument("--enrich", action="store_true", help="grab banners, HTTP headers and TLS certificates")
+    parser.add_argument("--enrich-max-per-port", type=int, default=None,
+                        help="enrich at most this many hosts per port")
+    parser.add_argument("--render-workers", type=int, default=None, help="chart processes (default: CPU count)")
+
+
+def _add_output_options(parser):
+    parser.add_argument("--results-dir", default=None, help="chart directory used for the README")
+    parser.add_argument("--no-readme", action="store_true", help="do not regenerate README.md")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="Scan ASNs for open ports and rank them.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scan = commands.add_parser("scan", help="scan ASNs and publish statistics, charts, density and rankings")
+    scan.add_argument("asns", nargs="*", default=DEFAULT_ASNS,
+                      help="ASN numbers, 'all' for every ASN in asn.ASN_Map, or ASN:PROFILE to scan one ASN with "
+                           "its own profile (default: %(default)s)")
+    scan.add_argument("-p", "--ports", action="append", help=PORTS_HELP)
+    scan.add_argument("--rate", type=int, default=scheduler.DEFAULT_GLOBAL_RATE,
+                      help="global packet rate shared by all ASNs (pps, default: %(default)s)")
+    scan.add_argument("--workers", type=int, default=scheduler.DEFAULT_MAX_WORKERS,
+                      help="ASNs scanned in parallel (default: %(default)s)")
+    scan.add_argument("--backend", default=None, help="scanner backend: masscan or connect (default: auto)")
+    scan.add_argument("--streaming", action="store_true", help="count results while masscan is running")
+    scan.add_argument("--shard-size", type=int, default=None, help="scan in resumable shards of this many addresses")
+    scan.add_argument("--incremental", action="store_true", help="only rescan prefixes that changed")
+    scan.add_argument("--sample", action="store_true", help="estimate counts from a stratified sample")
+    scan.add_argument("--adaptive-rate", action="store_true",
+                      help="calibrate the highest loss-free rate per ASN, --rate is the upper bound")
+    _add_enrich_options(scan)
+    scan.add_argument("--keep-raw", action="store_true", help="keep masscan text output in masscan_results/")
+    _add_output_options(scan)
+    _add_metrics_options(scan)
+    scan.set_defaults(handler=run_scan, metrics=True)
+
+    render = commands.add_parser("render", help="redraw charts from stored scan results without scanning")
+    _add_target_options(render)
+    render.add_argument("--workers", type=int, default=None, help="chart processes (default: CPU count)")
+    render.add_argument("--force", action="store_true", help="redraw charts even if their input is unchanged")
+    _add_output_options(render)
+    _add_metrics_options(render)
+    render.set_defaults(handler=run_render, metrics=True)
+
+    readme = commands.add_parser("readme", help="regenerate README.md from the results manifest")
+    readme.add_argument("--results-dir", default=None, help="chart directory used for the README")
+    readme.set_defaults(handler=run_readme, metrics=False)
+
+    rank = commands.add_parser("rank", help="print the cross-ASN port ranking from the results manifest")
+    rank.add_argument("-p", "--ports", default=None, help="port profile name or masscan port spec")
+    rank.add_argument("--top", type=int, default=None, help="top ports per ASN and overall")
+    rank.add_argument("--format", choices=RANK_FORMATS, default="text", help="output format")
+    rank.add_argument("--publish", action="store_true",
+                      help="also write the ranking JSON / CSV and heatmap and update the README")
+    rank.set_defaults(handler=run_rank, metrics=False)
+
+    shard = commands.add_parser("shard", help="split a scan across several runners and merge their results")
+    steps = shard.add_subparsers(dest="step", required=True)
+    plan = steps.add_parser("plan", help="freeze the prefixes of the selected ASNs into a shard plan")
+    _add_target_options(plan)
+    _add_plan_options(plan)
+    plan.set_defaults(handler=run_shard_plan, metrics=False)
+
+    node = steps.add_parser("scan", help="scan one shard of a plan and write a partial result directory")
+    node.add_argument("--plan", default="shard_plan.json", help="shard plan file (default: %(default)s)")
+    node.add_argument("--index", type=int, required=True, help="shard to scan, 0 to shards - 1")
+    node.add_argument("--output", default=None, help="partial result directory (default: shard_partials/shard_NNN)")
+    node.add_argument("--rate", type=int, default=None, help="packet rate of this node (default: the plan's rate)")
+    _add_node_options(node)
+    _add_metrics_options(node)
+    node.set_defaults(handler=run_shard_scan, metrics=True, run_label="shard_{index}")
+
+    merge = steps.add_parser("merge", help="merge partial results and publish statistics, charts and rankings")
+    merge.add_argument("partials", nargs="*", help="partial result directories (default: shard_partials/*)")
+    merge.add_argument("--plan", default="shard_plan.json", help="shard plan file (default: %(default)s)")
+    _add_enrich_options(merge)
+    _add_output_options(merge)
+    _add_metrics_options(merge)
+    merge.set_defaults(handler=run_shard_merge, metrics=True, run_label="shard_merge")
+
+    local = steps.add_parser("local", help="plan, scan every shard in its own process on this machine, then merge")
+    _add_target_options(local)
+    _add_plan_options(local)
+    local.add_argument("--partial-root", default="shard_partials", help="directory for the partial results")
+    _add_node_options(local)
+    _add_enrich_options(local)
+    _add_output_options(local)
+    _add_metrics_options(local)
+    local.set_defaults(handler=run_shard_local, metrics=True, run_label="shard_local")
+    return parser
+
+
+def _add_plan_options(parser):
+    parser.add_argument("--shards", type=int, required=True, help="number of shards (runners)")
+    parser.add_argument("--rate", type=int, default=scheduler.DEFAULT_GLOBAL_RATE,
+                        help="packet rate of each runner (pps, default: %(default)s)")
+    parser.add_argument("--plan", default="shard_plan.json", help="shard plan file (default: %(default)s)")
+
+
+def _add_node_options(parser):
+    parser.add_argument("--workers", type=int, default=scheduler.DEFAULT_MAX_WORKERS,
+                        help="ASNs scanned in parallel on each runner (default: %(default)s)")
+    parser.add_argument("--backend", default=None, help="scanner backend: masscan or connect (default: auto)")
+
+
+# run_name 为运行报告的名称, 默认为子命令名; 同时运行的多个分片节点按分片编号区分报告
+def main(argv=None, run_name=None):
+    args = build_parser().parse_args(argv)
+    if not args.metrics:
+        return args.handler(args)
+    metrics.start_run(run_name or getattr(args, "run_label", args.command).format(**vars(args)))
+    try:
+        return args.handler(args)
+    finally:
+        metrics.finish_run(args.report_dir, args.prometheus_file)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
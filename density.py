@@ -0,0 +1,164 @@
+import csv
+import io
+import os
+
+import numpy as np
+
+import manifest
+import masscan_parser
+import prefixes
+import render
+import result_store
+
+# 密度分析: 用有序数组二分查找把每个开放的 IP 映射回归一化后的前缀和所在的 /24,
+# 统计每个前缀、每个 /24 (按端口) 的开放主机数和密度, 用来把复查集中在热点前缀上、跳过没有服务的前缀
+
+BLOCK_BITS = 8
+# 端口列在键中占的位数
+PORT_BITS = 16
+
+
+def density_path(asn_number, scan_ports, results_dir=render.RESULTS_DIR):
+    return os.path.join(results_dir, str(asn_number), f'prefix_density_asn{asn_number}_{scan_ports}.csv')
+
+
+# 合并扫描的结果文件按端口组合拆分时, 每个组合的 /24 明细单独保存
+def blocks_path(store_path, scan_ports=None):
+    suffix = f".{scan_ports}" if scan_ports else ""
+    return store_path[:-len(result_store.FILE_SUFFIX)] + suffix + ".blocks.npz"
+
+
+# 前缀索引: 按起点排序的 (起点, 终点) 数组, 归一化后的前缀互不重叠
+def prefix_index(cidrs):
+    intervals = sorted(prefixes.cidr_to_interval(cidr) for cidr in cidrs)
+    starts = np.array([start for start, _ in intervals], dtype=np.int64)
+    ends = np.array([end for _, end in intervals], dtype=np.int64)
+    return starts, ends
+
+
+# 每个 IP 所在前缀的下标, 不属于任何前缀时为 -1
+def assign_prefixes(starts, ends, ips):
+    ips = np.asarray(ips, dtype=np.int64)
+    position = np.searchsorted(starts, ips, side='right') - 1
+    inside = (position >= 0) & (ips <= ends[np.maximum(position, 0)])
+    return np.where(inside, position, -1)
+
+
+def _count_keys(keys):
+    keys = np.sort(keys)
+    boundaries = np.flatnonzero(np.diff(keys)) + 1
+    starts = np.concatenate(([0], boundaries)) if keys.size else boundaries
+    return keys[starts], np.diff(np.append(starts, keys.size))
+
+
+# 按前缀和 /24 统计, 返回
+#   prefix:  每个前缀的地址数、开放主机数 (任意端口) 以及每个 (前缀, 端口) 的结果数
+#   blocks:  每个 (/24, 端口) 的结果数, 以及每个 /24 的开放主机数
+def compute_density(cidrs, ips, ports):
+    starts, ends = prefix_index(cidrs)
+    ips = np.asarray(ips, dtype=np.int64)
+    ports = np.asarray(ports, dtype=np.int64)
+    # 同一个 (ip, port) 只计一次; 排序后去掉相邻重复 (比 np.unique 的哈希实现快得多)
+    unique_keys = np.sort(ips << PORT_BITS | ports)
+    if unique_keys.size:
+        unique_keys = unique_keys[np.concatenate(([True], unique_keys[1:] != unique_keys[:-1]))]
+    ips = unique_keys >> PORT_BITS
+    ports = unique_keys & ((1 << PORT_BITS) - 1)
+
+    index = assign_prefixes(starts, ends, ips)
+    inside = index >= 0
+    ips, ports, index = ips[inside], ports[inside], index[inside]
+
+    # unique_keys 已按 ip 排序, 相邻比较即可得到不同的主机
+    host_first = np.ones(ips.size, dtype=bool)
+    host_first[1:] = ips[1:] != ips[:-1]
+    prefix_hosts = np.bincount(index[host_first], minlength=starts.size)
+    prefix_port_keys, prefix_port_counts = _count_keys(index << PORT_BITS | ports)
+
+    blocks = ips >> BLOCK_BITS
+    block_port_keys, block_port_counts = _count_keys(blocks << PORT_BITS | ports)
+    block_ids, block_hosts = _count_keys(blocks[host_first])
+    return {
+        "starts": starts,
+        "ends": ends,
+        "prefix_addresses": ends - starts + 1,
+        "prefix_hosts": prefix_hosts,
+        "prefix_port_index": prefix_port_keys >> PORT_BITS,
+        "prefix_port": prefix_port_keys & ((1 << PORT_BITS) - 1),
+        "prefix_port_count": prefix_port_counts,
+        "block": block_ids,
+        "block_hosts": block_hosts,
+        "block_port_block": block_port_keys >> PORT_BITS,
+        "block_port": block_port_keys & ((1 << PORT_BITS) - 1),
+        "block_port_count": block_port_counts,
+    }
+
+
+# ports 不为空时只统计这些端口 (合并扫描的结果文件按端口组合拆分)
+def density_from_store(store_path, ports=None):
+    header, columns = result_store.open_results(store_path)
+    cidrs = header.get("cidrs")
+    if cidrs is None:
+        return header, None
+    ips, store_ports = columns["ips"], columns["ports"]
+    if ports is not None:
+        keep = np.isin(store_ports, np.asarray(ports, dtype=store_ports.dtype))
+        ips, store_ports = ips[keep], store_ports[keep]
+    return header, compute_density(cidrs, ips, store_ports)
+
+
+def _cidr(start, end):
+    return prefixes.intervals_to_cidrs([(start, end)])[0]
+
+
+# 每个前缀一行 (port 为 "all" 表示任意端口的开放主机) 加上每个 (前缀, 端口) 一行
+def density_csv(result):
+    starts, ends = result["starts"].tolist(), result["ends"].tolist()
+    addresses = result["prefix_addresses"]
+    with io.StringIO(newline='') as file:
+        writer = csv.writer(file, lineterminator='\n')
+        writer.writerow(["prefix", "addresses", "port", "open", "density"])
+        for index in np.argsort(-result["prefix_hosts"] / addresses, kind='stable').tolist():
+            writer.writerow([_cidr(starts[index], ends[index]), int(addresses[index]), "all",
+                             int(result["prefix_hosts"][index]),
+                             round(float(result["prefix_hosts"][index] / addresses[index]), 6)])
+        order = np.lexsort((result["prefix_port"], result["prefix_port_index"]))
+        rows = result["prefix_port_index"][order]
+        densities = np.round(result["prefix_port_count"][order] / addresses[rows], 6)
+        writer.writerows(zip(
+            (_cidr(starts[row], ends[row]) for row in rows.tolist()),
+            addresses[rows].tolist(),
+            result["prefix_port"][order].tolist(),
+            result["prefix_port_count"][order].tolist(),
+            densities.tolist()))
+        return file.getvalue()
+
+
+# 热点前缀 (开放主机密度不低于 min_density) 和没有任何开放主机的前缀, 可用于定向复查
+def hot_prefixes(result, min_density):
+    density = result["prefix_hosts"] / result["prefix_addresses"]
+    selected = np.flatnonzero(density >= min_density)
+    return [_cidr(int(result["starts"][i]), int(result["ends"][i])) for i in selected.tolist()]
+
+
+def dead_prefixes(result):
+    selected = np.flatnonzero(result["prefix_hosts"] == 0)
+    return [_cidr(int(result["starts"][i]), int(result["ends"][i])) for i in selected.tolist()]
+
+
+# 写出前缀密度表 (提交到仓库) 和 /24 明细 (放在结果文件旁边的 npz 中), 返回前缀密度表路径
+def publish_density(asn_number, scan_ports, store_path, results_dir=render.RESULTS_DIR):
+    split = result_store.read_header(store_path)["scan_ports"] != scan_ports
+    header, result = density_from_store(store_path, masscan_parser.parse_port_spec(scan_ports) if split else None)
+    if result is None:
+        print(f"Scan results of ASN {asn_number} have no prefix data, skipping density breakdown.")
+        return None
+    path = density_path(asn_number, scan_ports, results_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    manifest.write_if_changed(path, density_csv(result))
+    np.savez_compressed(blocks_path(store_path, scan_ports if split else None), **{name: result[name] for name in (
+        "block", "block_hosts", "block_port_block", "block_port", "block_port_count")})
+    active = int((result["prefix_hosts"] > 0).sum())
+    print(f"ASN {asn_number}: {active}/{result['starts'].size} prefixes and {result['block'].size} /24 blocks "
+          f"have open hosts, density table saved to {path}")
+    return path
@@ -0,0 +1,222 @@
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+import metrics
+import pipeline
+import port_profiles
+import prefix_source
+import prefixes
+import result_store
+import scheduler
+
+# 多节点分片扫描: 所选 ASN 的归一化地址空间按地址数确定性地均分为 N 份 (类似 masscan 的 --shard),
+# 每个节点 (例如 GitHub Actions matrix 中的一个 runner) 只扫描自己的一份, 输出部分结果目录
+# (每个 ASN 一个列式结果文件, 最后写 partial.json 表示完成); 合并步骤按分片顺序拼接各节点的结果,
+# 之后的统计、图表、密度和排名与单节点扫描完全相同.
+# 所有节点读取同一份扫描计划 (前缀固定在计划中), 扫描期间前缀数据更新也不会让各节点的分片错位
+
+PLAN_VERSION = 1
+PLAN_FILE = "shard_plan.json"
+PARTIAL_ROOT = "shard_partials"
+PARTIAL_FILE = "partial.json"
+# masscan -oL 文本结果的目录, 与单节点扫描相同, 节点之间用分片编号区分文件名
+TEXT_DIR = "masscan_results"
+CLI_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cli.py")
+
+
+def _write_json(path, data):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(data, file, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+# 计划内容的摘要, 部分结果中记录这个值, 合并时据此拒绝来自其他计划的结果
+def plan_digest(plan):
+    body = json.dumps({key: value for key, value in plan.items() if key != "digest"}, sort_keys=True)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+# 生成扫描计划: 获取各 ASN 的前缀 (归一化后写入计划), 端口取各组合的并集, rate 为每个节点的发包速率
+def make_plan(asns, scan_ports, shard_count, rate=scheduler.DEFAULT_GLOBAL_RATE, path=PLAN_FILE):
+    if shard_count < 1:
+        raise ValueError(f"Shard count must be at least 1, got {shard_count}")
+    asns = scheduler.resolve_asns(asns)
+    specs = list(dict.fromkeys(port_profiles.resolve_profiles(scan_ports).values()))
+    with metrics.phase("prefix_caches") as counts:
+        prefix_source.get_prefix_caches(asns)
+        counts["asns"] = len(asns)
+    plan = {
+        "version": PLAN_VERSION,
+        "scan_ports": port_profiles.union_spec(specs),
+        "specs": specs,
+        "shards": shard_count,
+        "rate": rate,
+        "created_at": time.time(),
+        "asns": {str(asn_number): pipeline.get_cidr_ips(asn_number) for asn_number in asns},
+    }
+    plan["digest"] = plan_digest(plan)
+    _write_json(path, plan)
+    addresses = sum(prefixes.count_addresses(prefixes.cidrs_to_intervals(cidrs)) for cidrs in plan["asns"].values())
+    print(f"Shard plan saved to {path}: {len(asns)} ASNs, {addresses} addresses, ports {plan['scan_ports']}, "
+          f"{shard_count} shards of ~{addresses // shard_count} addresses at {rate} pps each")
+    return plan
+
+
+def load_plan(path=PLAN_FILE):
+    plan = _read_json(path)
+    if plan.get("version") != PLAN_VERSION:
+        raise ValueError(f"Unsupported shard plan version {plan.get('version')} in {path}")
+    if plan.get("digest") != plan_digest(plan):
+        raise ValueError(f"Shard plan {path} was modified after it was created")
+    return plan
+
+
+# 某个 ASN 在第 index 个分片中的前缀
+def shard_cidrs(plan, asn_number, index):
+    intervals = prefixes.cidrs_to_intervals(plan["asns"][asn_number])
+    return prefixes.intervals_to_cidrs(prefixes.shard_intervals(intervals, plan["shards"], index))
+
+
+def partial_dir(index, partial_root=PARTIAL_ROOT):
+    return os.path.join(partial_root, f"shard_{index:03d}")
+
+
+# 节点扫描: 扫描计划中第 index 个分片, 各 ASN 在节点内按 lane 并行并共享 rate (默认为计划中的速率);
+# 任一 ASN 扫描失败时抛出 RuntimeError 且不写 partial.json, 重新运行该节点即可
+def scan_shard(plan, index, output_dir=None, rate=None, max_workers=scheduler.DEFAULT_MAX_WORKERS):
+    if not 0 <= index < plan["shards"]:
+        raise ValueError(f"Shard index {index} is out of range for {plan['shards']} shards")
+    output_dir = output_dir or partial_dir(index)
+    os.makedirs(output_dir, exist_ok=True)
+    rate = rate or plan["rate"]
+    scan_ports = plan["scan_ports"]
+    started_at = time.time()
+    targets = {asn_number: shard_cidrs(plan, asn_number, index) for asn_number in plan["asns"]}
+    jobs = [(asn_number, prefixes.count_addresses(prefixes.cidrs_to_intervals(cidrs)))
+            for asn_number, cidrs in targets.items() if cidrs]
+    print(f"Shard {index + 1}/{plan['shards']}: {sum(addresses for _, addresses in jobs)} addresses "
+          f"in {len(jobs)} ASNs")
+
+    def run(asn_number, scan_ports, asn_rate):
+        output_file = os.path.join(TEXT_DIR, asn_number, f"shard_node_{index:03d}.txt")
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        start_time = time.time()
+        if not pipeline.scan_ip_range(" ".join(targets[asn_number]), output_file, scan_ports, asn_rate):
+            return None
+        store_path = pipeline.store_scan_output(
+            asn_number, scan_ports, asn_rate, output_file, start_time, time.time(),
+            os.path.join(output_dir, f"{asn_number}{result_store.FILE_SUFFIX}"), cidrs=targets[asn_number],
+            shard=index, shards=plan["shards"], plan=plan["digest"])
+        os.remove(output_file)
+        return store_path
+
+    run_scan = pipeline.timed_scan(run)
+    store_paths = scheduler.run_scheduled(jobs, lambda asn_number, asn_rate: run_scan(asn_number, scan_ports, asn_rate),
+                                          rate, max_workers)
+    failed = [asn_number for asn_number, store_path in store_paths.items() if store_path is None]
+    if failed:
+        raise RuntimeError(f"Shard {index}: scans of ASNs {failed} failed, rerun this shard")
+    partial = {
+        "plan": plan["digest"],
+        "shard": index,
+        "shards": plan["shards"],
+        "scan_ports": scan_ports,
+        "rate": rate,
+        "started_at": started_at,
+        "finished_at": time.time(),
+        "stores": {asn_number: os.path.basename(store_path) for asn_number, store_path in store_paths.items()},
+        "counts": {asn_number: result_store.read_header(store_path)["count"]
+                   for asn_number, store_path in store_paths.items()},
+    }
+    _write_json(os.path.join(output_dir, PARTIAL_FILE), partial)
+    print(f"Shard {index} finished: {sum(partial['counts'].values())} results saved to {output_dir}")
+    return partial
+
+
+# 读取各节点的部分结果, 返回按分片编号排列的列表; 来自其他计划的结果、缺少的分片都会报错,
+# 同一分片出现多次 (例如节点重跑) 时使用先出现的一份
+def load_partials(plan, directories):
+    partials = {}
+    for directory in sorted(directories):
+        path = os.path.join(directory, PARTIAL_FILE)
+        if not os.path.exists(path):
+            print(f"{directory} has no {PARTIAL_FILE} (unfinished shard), skipping.")
+            continue
+        partial = _read_json(path)
+        if partial["plan"] != plan["digest"]:
+            raise ValueError(f"{directory} belongs to a different shard plan")
+        if partial["shard"] in partials:
+            print(f"Shard {partial['shard']} found again in {directory}, keeping "
+                  f"{partials[partial['shard']]['directory']}.")
+            continue
+        partials[partial["shard"]] = dict(partial, directory=directory)
+    missing = [index for index in range(plan["shards"]) if index not in partials]
+    if missing:
+        raise RuntimeError(f"Cannot merge: shards {missing} of {plan['shards']} are missing")
+    return [partials[index] for index in range(plan["shards"])]
+
+
+# 按分片顺序拼接每个 ASN 的结果, 写入 scan_store/, 结果与节点结果的到达顺序无关; 返回 {asn: 结果文件}
+def merge_partials(plan, partials, store_dir=result_store.STORE_DIR):
+    start_time = min(partial["started_at"] for partial in partials)
+    end_time = max(partial["finished_at"] for partial in partials)
+    store_paths = {}
+    for asn_number, cidrs in plan["asns"].items():
+        store_path = result_store.result_path(asn_number, plan["scan_ports"], start_time, store_dir)
+        os.makedirs(os.path.dirname(store_path), exist_ok=True)
+        writer = result_store.ResultWriter(store_path, asn_number, plan["scan_ports"], plan["rate"], start_time,
+                                           cidrs=cidrs, shards=plan["shards"], plan=plan["digest"])
+        for partial in partials:
+            name = partial["stores"].get(asn_number)
+            if name is None:
+                continue
+            _, columns = result_store.open_results(os.path.join(partial["directory"], name))
+            writer.append(columns["ports"], columns["ips"], columns["timestamps"])
+        store_paths[asn_number] = writer.close(end_time)
+        print(f"ASN {asn_number}: merged {writer.header['count']} results from {len(partials)} shards")
+    return store_paths
+
+
+# 合并步骤: 合并各节点的部分结果, 然后生成与单节点扫描相同的统计、图表、密度和排名
+def merge(plan, directories, enrich_services=False, enrich_max_per_port=None, render_workers=None):
+    with metrics.phase("merge") as counts:
+        partials = load_partials(plan, directories)
+        store_paths = merge_partials(plan, partials)
+        counts["results"] = sum(sum(partial["counts"].values()) for partial in partials)
+    pipeline.publish_scan(list(plan["asns"]), plan["specs"], plan["scan_ports"], store_paths, enrich_services,
+                          enrich_max_per_port, render_workers)
+    return store_paths
+
+
+def partial_dirs(partial_root=PARTIAL_ROOT):
+    return sorted(path for path in glob.glob(os.path.join(partial_root, "*")) if os.path.isdir(path))
+
+
+# 在本机用 N 个进程模拟 N 个节点: 每个进程运行 cli.py shard scan 扫描一个分片, 全部成功后返回部分结果目录;
+# 每个进程都使用计划中的速率, 本机总速率为 rate * N
+def run_local(plan_path, shard_count, partial_root=PARTIAL_ROOT, node_args=()):
+    processes = []
+    for index in range(shard_count):
+        command = [sys.executable, CLI_PATH, "shard", "scan", "--plan", plan_path, "--index", str(index),
+                   "--output", partial_dir(index, partial_root), *node_args]
+        processes.append(subprocess.Popen(command))
+    failed = [index for index, process in enumerate(processes) if process.wait() != 0]
+    if failed:
+        raise RuntimeError(f"Local shard processes {failed} failed")
+    return [partial_dir(index, partial_root) for index in range(shard_count)]
@@ -0,0 +1,381 @@
+import asyncio
+import hashlib
+import json
+import os
+import ssl
+import sys
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+
+import manifest
+import render
+import result_store
+import scanners
+
+# 扫描后的服务识别: 对开放的 (ip, port) 抓取 banner、HTTP 状态码和 Server 头以及 TLS 证书信息,
+# asyncio 并发 + 连接数限制, 逐条结果写入结果文件旁边的 jsonl, 按 ASN 和端口汇总服务类型
+
+DEFAULT_CONCURRENCY = 500
+# 连接 (含 TLS 握手)、等待服务端先发 banner、读取响应的超时 (秒)
+CONNECT_TIMEOUT = 3.0
+BANNER_WAIT = 1.0
+READ_TIMEOUT = 3.0
+# 每个目标的总超时, 不小于 TLS 和明文两次尝试各阶段超时之和
+TARGET_TIMEOUT = 2 * CONNECT_TIMEOUT + BANNER_WAIT + 2 * READ_TIMEOUT + 1.0
+BANNER_BYTES = 2048
+# 先尝试 TLS 的端口, 以及直接发送 HTTP 请求 (不等待 banner) 的端口
+TLS_PORTS = {443, 465, 636, 993, 995, 2053, 2083, 2087, 2096, 8443}
+HTTP_PORTS = {80, 2052, 2082, 2086, 2095, 8000, 8080, 8880}
+# 汇总表中每个端口保留的 Server 头和证书签发者数量
+SUMMARY_TOP_N = 10
+HTTP_REQUEST = "GET / HTTP/1.0\r\nHost: {host}\r\nUser-Agent: open-port-ranks\r\nAccept: */*\r\nConnection: close\r\n\r\n"
+
+OID_NAMES = {"2.5.4.3": "cn", "2.5.4.10": "o"}
+OID_SUBJECT_ALT_NAME = "2.5.29.17"
+
+
+def services_path(asn_number, scan_ports, results_dir=render.RESULTS_DIR):
+    return os.path.join(results_dir, str(asn_number), f'services_asn{asn_number}_{scan_ports}.json')
+
+
+def records_path(store_path):
+    return store_path[:-len(result_store.FILE_SUFFIX)] + ".services.jsonl"
+
+
+# 最小的 DER 解析, 只取证书里需要的字段: 返回 (tag, 内容起点, 内容终点)
+def _der_read(data, offset):
+    tag = data[offset]
+    length = data[offset + 1]
+    offset += 2
+    if length & 0x80:
+        size = length & 0x7F
+        length = int.from_bytes(data[offset:offset + size], 'big')
+        offset += size
+    if offset + length > len(data):
+        raise ValueError("truncated DER")
+    return tag, offset, offset + length
+
+
+def _der_children(data, start, end):
+    while start < end:
+        tag, content_start, content_end = _der_read(data, start)
+        yield tag, content_start, content_end
+        start = content_end
+
+
+def _der_oid(data):
+    arcs = [data[0] // 40, data[0] % 40]
+    value = 0
+    for byte in data[1:]:
+        value = value << 7 | byte & 0x7F
+        if not byte & 0x80:
+            arcs.append(value)
+            value = 0
+    return ".".join(map(str, arcs))
+
+
+def _der_name(data, start, end):
+    name = {}
+    for _, set_start, set_end in _der_children(data, start, end):
+        for _, attribute_start, attribute_end in _der_children(data, set_start, set_end):
+            (_, oid_start, oid_end), (_, value_start, value_end) = list(
+                _der_children(data, attribute_start, attribute_end))[:2]
+            key = OID_NAMES.get(_der_oid(data[oid_start:oid_end]))
+            if key and key not in name:
+                name[key] = data[value_start:value_end].decode('utf-8', 'replace')
+    return name
+
+
+def _der_time(tag, value):
+    text = value.decode('ascii')
+    # UTCTime 两位年份, GeneralizedTime 四位年份
+    if tag == 0x17:
+        text = ("19" if int(text[:2]) >= 50 else "20") + text
+    return f"{text[0:4]}-{text[4:6]}-{text[6:8]}"
+
+
+def _der_alt_names(data, start, end):
+    _, sequence_start, sequence_end = _der_read(data, start)
+    return [data[name_start:name_end].decode('ascii', 'replace')
+            for tag, name_start, name_end in _der_children(data, sequence_start, sequence_end) if tag == 0x82]
+
+
+# 解析 X.509 证书 (DER), 返回签发者、主体、过期日期、SAN 和 SHA-256 指纹; 解析失败时只返回指纹
+def parse_certificate(der):
+    certificate = {"sha256": hashlib.sha256(der).hexdigest()}
+    try:
+        _, cert_start, cert_end = _der_read(der, 0)
+        _, tbs_start, tbs_end = _der_read(der, cert_start)
+        fields = list(_der_children(der, tbs_start, tbs_end))
+        # 可选的 [0] 版本号
+        if fields[0][0] == 0xA0:
+            fields = fields[1:]
+        _, issuer, validity, subject = fields[1:5]
+        issuer_name = _der_name(der, issuer[1], issuer[2])
+        subject_name = _der_name(der, subject[1], subject[2])
+        not_after_tag, not_after_start, not_after_end = list(_der_children(der, validity[1], validity[2]))[1]
+        certificate.update({
+            "issuer_cn": issuer_name.get("cn"),
+            "issuer_o": issuer_name.get("o"),
+            "subject_cn": subject_name.get("cn"),
+            "not_after": _der_time(not_after_tag, der[not_after_start:not_after_end]),
+            "self_signed": issuer_name == subject_name,
+        })
+        for tag, start, end in fields[6:]:
+            if tag != 0xA3:
+                continue
+            _, extensions_start, extensions_end = _der_read(der, start)
+            for _, extension_start, extension_end in _der_children(der, extensions_start, extensions_end):
+                parts = list(_der_children(der, extension_start, extension_end))
+                if _der_oid(der[parts[0][1]:parts[0][2]]) == OID_SUBJECT_ALT_NAME:
+                    certificate["san"] = _der_alt_names(der, parts[-1][1], parts[-1][2])[:SUMMARY_TOP_N]
+    except (IndexError, ValueError, UnicodeDecodeError):
+        pass
+    return certificate
+
+
+# 按服务端先发的 banner 识别协议
+def classify_banner(data):
+    if data.startswith(b"HTTP/"):
+        return "http"
+    if data.startswith(b"SSH-"):
+        return "ssh"
+    if data.startswith(b"220"):
+        return "smtp" if b"SMTP" in data[:128].upper() else "ftp"
+    if data.startswith(b"+OK"):
+        return "pop3"
+    if data.startswith(b"* OK"):
+        return "imap"
+    if data[:1] in (b"\x15", b"\x16"):
+        return "tls"
+    return "banner"
+
+
+def parse_http(data):
+    head = data.split(b"\r\n\r\n", 1)[0].decode('latin-1').split("\r\n")
+    parts = head[0].split(" ", 2)
+    result = {"status": int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else None}
+    for line in head[1:]:
+        key, _, value = line.partition(":")
+        if key.strip().lower() == "server":
+            result["server"] = value.strip()[:64]
+            break
+    return result
+
+
+async def _read(reader, timeout):
+    data = b""
+    try:
+        while len(data) < BANNER_BYTES and b"\r\n\r\n" not in data:
+            chunk = await asyncio.wait_for(reader.read(BANNER_BYTES - len(data)), timeout)
+            if not chunk:
+                break
+            data += chunk
+    except (OSError, asyncio.TimeoutError):
+        pass
+    return data
+
+
+def _close(writer):
+    # 直接中断连接, 不等待 TLS 关闭握手
+    writer.transport.abort()
+
+
+def _tls_context():
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    try:
+        # 允许老旧服务器使用的协议和套件, 只是为了拿到证书
+        context.minimum_version = ssl.TLSVersion.MINIMUM_SUPPORTED
+        context.set_ciphers("ALL:@SECLEVEL=0")
+    except (ValueError, ssl.SSLError):
+        pass
+    return context
+
+
+# 明文探测: 等待 banner, 没有 banner 时发送 HTTP 请求; 无法识别时返回 None, 连接失败抛出 OSError
+async def probe_plain(ip, port, wait_banner=True):
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), CONNECT_TIMEOUT)
+    try:
+        data = await _read(reader, BANNER_WAIT) if wait_banner else b""
+        if data:
+            service = classify_banner(data)
+            if service == "tls":
+                return None
+            result = {"service": service, "banner": data[:128].decode('latin-1').strip()}
+            if service == "http":
+                result.update(parse_http(data))
+            return result
+        writer.write(HTTP_REQUEST.format(host=ip).encode())
+        data = await _read(reader, READ_TIMEOUT)
+        if data.startswith(b"HTTP/"):
+            return {"service": "http", **parse_http(data)}
+        if data and classify_banner(data) != "tls":
+            return {"service": "banner", "banner": data[:128].decode('latin-1').strip()}
+        return None
+    finally:
+        _close(writer)
+
+
+# TLS 探测: 握手拿到证书, 再在 TLS 上发送 HTTP 请求; 握手失败返回 None, 连接失败抛出 OSError
+async def probe_tls(ip, port, context):
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(ip, port, ssl=context, ssl_handshake_timeout=CONNECT_TIMEOUT), CONNECT_TIMEOUT)
+    except (ssl.SSLError, ConnectionResetError, asyncio.IncompleteReadError):
+        return None
+    try:
+        ssl_object = writer.get_extra_info('ssl_object')
+        result = {"service": "tls", "tls_version": ssl_object.version()}
+        der = ssl_object.getpeercert(binary_form=True)
+        if der:
+            result["certificate"] = parse_certificate(der)
+        writer.write(HTTP_REQUEST.format(host=ip).encode())
+        data = await _read(reader, READ_TIMEOUT)
+        if data.startswith(b"HTTP/"):
+            result.update(service="https", **parse_http(data))
+        return result
+    finally:
+        _close(writer)
+
+
+# 识别单个目标: TLS 端口先试 TLS, 其他端口先试明文; 都连不上为 closed, 连上但无法识别为 silent
+async def identify(ip, port, context):
+    attempts = [True, False] if port in TLS_PORTS else [False, True]
+    connected = False
+    for use_tls in attempts:
+        try:
+            if use_tls:
+                result = await probe_tls(ip, port, context)
+            else:
+                result = await probe_plain(ip, port, wait_banner=port not in HTTP_PORTS)
+            connected = True
+        except (OSError, asyncio.TimeoutError):
+            continue
+        if result is not None:
+            return result
+    return {"service": "silent" if connected else "closed"}
+
+
+# 每个端口的服务类型、HTTP 状态码、Server 头、TLS 版本和证书签发者计数
+class ServiceSummary:
+    def __init__(self):
+        self.ports = defaultdict(lambda: defaultdict(Counter))
+        self.targets = Counter()
+
+    def add(self, port, result):
+        counters = self.ports[port]
+        self.targets[port] += 1
+        counters["services"][result["service"]] += 1
+        if result.get("status") is not None:
+            counters["statuses"][str(result["status"])] += 1
+        if result.get("server"):
+            counters["servers"][result["server"]] += 1
+        if result.get("tls_version"):
+            counters["tls_versions"][result["tls_version"]] += 1
+        certificate = result.get("certificate")
+        if certificate:
+            issuer = certificate.get("issuer_o") or certificate.get("issuer_cn") or "unknown"
+            counters["issuers"]["self-signed" if certificate.get("self_signed") else issuer] += 1
+
+    def to_dict(self, top_n=SUMMARY_TOP_N):
+        return {str(port): {"targets": self.targets[port],
+                            **{name: dict(counter.most_common(top_n if name in ("servers", "issuers") else None))
+                               for name, counter in sorted(self.ports[port].items())}}
+                for port in sorted(self.ports)}
+
+
+# 从结果文件取出不重复的 (ip, port), max_per_port 不为空时每个端口最多随机取这么多个
+def load_targets(store_path, max_per_port=None, seed=0):
+    _, columns = result_store.open_results(store_path)
+    keys = np.sort(np.asarray(columns["ips"], dtype=np.int64) << 16 | np.asarray(columns["ports"], dtype=np.int64))
+    if keys.size:
+        keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+    if max_per_port is not None:
+        rng = np.random.default_rng(seed)
+        ports = keys & 0xFFFF
+        selected = [rng.permutation(np.flatnonzero(ports == port))[:max_per_port] for port in np.unique(ports)]
+        keys = keys[np.sort(np.concatenate(selected))] if selected else keys
+    return keys >> 16, keys & 0xFFFF
+
+
+async def _enrich(ips, ports, concurrency, rate, on_result):
+    concurrency = scanners.raise_fd_limit(concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    bucket = scanners.TokenBucket(rate) if rate else None
+    context = _tls_context()
+    loop = asyncio.get_running_loop()
+    tasks = set()
+
+    async def run(ip, port):
+        try:
+            try:
+                result = await asyncio.wait_for(identify(ip, port, context), TARGET_TIMEOUT)
+            except asyncio.TimeoutError:
+                result = {"service": "timeout"}
+            on_result(ip, port, result)
+        finally:
+            semaphore.release()
+
+    # 逐个创建任务, 同时存在的任务数不超过并发数, 目标再多内存也不会增长
+    for ip, port in zip(ips, ports):
+        if bucket is not None:
+            await bucket.acquire()
+        await semaphore.acquire()
+        task = loop.create_task(run(result_store.int_to_ip(ip), port))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks)
+
+
+# 识别一批目标, 逐条结果写入 records_file (jsonl), 返回 ServiceSummary
+def enrich_targets(ips, ports, records_file=None, concurrency=DEFAULT_CONCURRENCY, rate=None):
+    summary = ServiceSummary()
+    file = open(records_file, 'w') if records_file else None
+    try:
+        def on_result(ip, port, result):
+            summary.add(port, result)
+            if file is not None:
+                file.write(json.dumps({"ip": ip, "port": port, **result}) + "\n")
+
+        asyncio.run(_enrich(np.asarray(ips).tolist(), np.asarray(ports).tolist(), concurrency, rate, on_result))
+    finally:
+        if file is not None:
+            file.close()
+    return summary
+
+
+# 对一个 ASN 的扫描结果做服务识别, 汇总表提交到仓库, 逐条结果放在结果文件旁边; 返回汇总表路径
+def publish_services(asn_number, scan_ports, store_path, max_per_port=None, concurrency=DEFAULT_CONCURRENCY,
+                     rate=None, results_dir=render.RESULTS_DIR):
+    ips, ports = load_targets(store_path, max_per_port)
+    print(f"Identifying services on {ips.size} open ports of ASN {asn_number}...")
+    start = time.time()
+    summary = enrich_targets(ips, ports, records_path(store_path), concurrency, rate)
+    path = services_path(asn_number, scan_ports, results_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = {"asn": str(asn_number), "scan_ports": scan_ports, "targets": int(ips.size), "ports": summary.to_dict()}
+    manifest.write_if_changed(path, json.dumps(table, indent=1) + "\n")
+    print(f"Identified {ips.size} targets in {time.time() - start:.1f}s, service summary saved to {path}")
+    return path
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: python enrich.py <asn> <scan ports> [max targets per port]")
+        sys.exit(1)
+    asn_number, scan_ports = sys.argv[1], sys.argv[2]
+    max_per_port = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    store_path = result_store.latest_result(asn_number, scan_ports)
+    if store_path is None:
+        print(f"No scan results for ASN {asn_number} with ports {scan_ports}.")
+        sys.exit(1)
+    publish_services(asn_number, scan_ports, store_path, max_per_port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import numpy as np
+
+import masscan_parser
+import prefixes
+import result_store
+
+# 全端口 (0-65535) 扫描模式: 保留精确的 65536 个端口计数, 同时统计有响应的不同主机数;
+# 地址空间不大时用位图精确计数, 超大 ASN 用 HyperLogLog 估算, 内存占用与结果数量无关
+
+FULL_RANGES = ("0-65535", "1-65535")
+# 地址数不超过该值时用位图 (1 << 27 个地址占 16 MiB)
+BITMAP_MAX_ADDRESSES = 1 << 27
+# HyperLogLog 寄存器位数, 2^14 个寄存器, 标准误差约 0.8%
+HLL_PRECISION = 14
+# 从结果文件分块读取的记录数
+CHUNK_RECORDS = 1 << 22
+
+
+def is_full_range(scan_ports):
+    return scan_ports in FULL_RANGES
+
+
+# 64 位整数混合函数 (splitmix64), 让 IP 在寄存器上均匀分布
+def _mix64(values):
+    with np.errstate(over='ignore'):
+        z = values.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+class HyperLogLog:
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, values):
+        hashed = _mix64(np.asarray(values))
+        index = (hashed >> np.uint64(64 - self.precision)).astype(np.int64)
+        rest_bits = 64 - self.precision
+        rest = hashed & np.uint64((1 << rest_bits) - 1)
+        # 剩余位中第一个 1 的位置 (从高位数, 1 开始), 全 0 时为 rest_bits + 1
+        _, exponent = np.frexp(rest.astype(np.float64))
+        rank = np.where(rest == 0, rest_bits + 1, rest_bits - exponent + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def count(self):
+        m = self.registers.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        # 小基数时用线性计数修正
+        if estimate <= 2.5 * m and zeros:
+            return m * np.log(m / zeros)
+        return float(estimate)
+
+
+# 位图精确计数: 把 IP 映射到归一化前缀拼接后的连续偏移, 每个地址占 1 位
+class HostBitmap:
+    def __init__(self, intervals):
+        self.starts = np.array([start for start, _ in intervals], dtype=np.int64)
+        self.ends = np.array([end for _, end in intervals], dtype=np.int64)
+        sizes = self.ends - self.starts + 1
+        self.offsets = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.int64)
+        self.bits = np.zeros((int(sizes.sum()) + 7) // 8, dtype=np.uint8)
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.int64)
+        position = np.searchsorted(self.starts, values, side='right') - 1
+        inside = (position >= 0) & (values <= self.ends[np.maximum(position, 0)])
+        offsets = values[inside] - self.starts[position[inside]] + self.offsets[position[inside]]
+        np.bitwise_or.at(self.bits, offsets >> 3, (1 << (offsets & 7)).astype(np.uint8))
+
+    def count(self):
+        return int(np.unpackbits(self.bits).sum())
+
+
+# 流式累加器: 每次追加一批 (ports, ips), 内存只有端口计数数组和主机计数结构
+class FullRangeCounter:
+    def __init__(self, intervals=None, bitmap_max=BITMAP_MAX_ADDRESSES):
+        self.counts = np.zeros(masscan_parser.PORT_SLOTS, dtype=np.int64)
+        self.records = 0
+        if intervals is not None and prefixes.count_addresses(intervals) <= bitmap_max:
+            self.hosts = HostBitmap(intervals)
+            self.method = "bitmap"
+        else:
+            self.hosts = HyperLogLog()
+            self.method = "hyperloglog"
+
+    def add(self, ports, ips):
+        self.counts += np.bincount(np.asarray(ports, dtype=np.int64), minlength=masscan_parser.PORT_SLOTS)
+        self.hosts.add(ips)
+        self.records += len(ports)
+
+    def summary(self):
+        return {"counts": self.counts, "hosts": self.hosts.count(), "method": self.method,
+                "records": self.records}
+
+
+# 分块读取结果文件, 内存占用不随结果数量增长
+def count_store(store_path, bitmap_max=BITMAP_MAX_ADDRESSES):
+    header, columns = result_store.open_results(store_path)
+    cidrs = header.get("cidrs")
+    counter = FullRangeCounter(prefixes.cidrs_to_intervals(cidrs) if cidrs else None, bitmap_max)
+    for start in range(0, header["count"], CHUNK_RECORDS):
+        stop = start + CHUNK_RECORDS
+        counter.add(columns["ports"][start:stop], columns["ips"][start:stop])
+    return counter.summary()
+
@@ -0,0 +1,113 @@
+import json
+import sqlite3
+import time
+from contextlib import closing
+
+# 历史数据: 每次扫描后把每个 ASN 的端口计数追加到 SQLite 文件, 每个 (运行, ASN, 端口) 一行,
+# 用于绘制最近 N 次运行的趋势图, 不需要保留原始扫描结果, 也不需要重新扫描
+
+HISTORY_DB = "history.db"
+DEFAULT_TREND_RUNS = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    asn TEXT NOT NULL,
+    scan_ports TEXT NOT NULL,
+    started_at INTEGER NOT NULL,
+    sampled INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (asn, scan_ports, started_at)
+);
+CREATE TABLE IF NOT EXISTS counts (
+    run_id INTEGER NOT NULL,
+    port INTEGER NOT NULL,
+    count REAL NOT NULL,
+    low REAL,
+    high REAL,
+    PRIMARY KEY (run_id, port)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rate_profiles (
+    asn TEXT PRIMARY KEY,
+    rate INTEGER,
+    wait INTEGER NOT NULL,
+    yield REAL,
+    rtt REAL,
+    max_rate INTEGER NOT NULL,
+    calibrated_at INTEGER NOT NULL,
+    bursts TEXT NOT NULL
+);
+"""
+
+
+def connect(db_path=HISTORY_DB):
+    connection = sqlite3.connect(db_path)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+# 追加一次运行的结果, 只保存非零计数; 同一次运行 (ASN、端口、开始时间相同) 重复写入时忽略, 返回是否写入
+def record_run(asn_number, scan_ports, port_counts, estimates=None, started_at=None, db_path=HISTORY_DB):
+    started_at = int(started_at if started_at is not None else time.time())
+    with closing(connect(db_path)) as connection, connection:
+        cursor = connection.execute(
+            "INSERT OR IGNORE INTO runs (asn, scan_ports, started_at, sampled) VALUES (?, ?, ?, ?)",
+            (str(asn_number), scan_ports, started_at, int(bool(estimates))))
+        if cursor.rowcount == 0:
+            return False
+        run_id = cursor.lastrowid
+        rows = []
+        for port, count in port_counts.items():
+            if not count:
+                continue
+            low, high = (estimates[port][1], estimates[port][2]) if estimates and port in estimates else (None, None)
+            rows.append((run_id, int(port), float(count), low, high))
+        connection.executemany("INSERT INTO counts (run_id, port, count, low, high) VALUES (?, ?, ?, ?, ?)", rows)
+    return True
+
+
+# 最近 limit 次运行的计数, 返回 (开始时间列表, {port: 计数列表}), 某次运行中未出现的端口记为 0
+def recent_counts(asn_number, scan_ports, limit=DEFAULT_TREND_RUNS, db_path=HISTORY_DB):
+    with closing(connect(db_path)) as connection:
+        runs = connection.execute(
+            "SELECT run_id, started_at FROM runs WHERE asn = ? AND scan_ports = ? "
+            "ORDER BY started_at DESC LIMIT ?", (str(asn_number), scan_ports, limit)).fetchall()
+        runs.reverse()
+        if not runs:
+            return [], {}
+        position = {run_id: index for index, (run_id, _) in enumerate(runs)}
+        placeholders = ",".join("?" * len(runs))
+        rows = connection.execute(
+            f"SELECT run_id, port, count FROM counts WHERE run_id IN ({placeholders})",
+            [run_id for run_id, _ in runs]).fetchall()
+    series = {}
+    for run_id, port, count in rows:
+        series.setdefault(port, [0.0] * len(runs))[position[run_id]] = count
+    return [started_at for _, started_at in runs], series
+
+
+# 已记录的 (asn, scan_ports) 组合
+def tracked(db_path=HISTORY_DB):
+    with closing(connect(db_path)) as connection:
+        return connection.execute("SELECT DISTINCT asn, scan_ports FROM runs ORDER BY asn, scan_ports").fetchall()
+
+
+# 保存一个 ASN 的速率校准结果 (自适应速率模式), 每个 ASN 只保留最近一次
+def save_rate_profile(asn_number, profile, db_path=HISTORY_DB):
+    with closing(connect(db_path)) as connection, connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO rate_profiles (asn, rate, wait, yield, rtt, max_rate, calibrated_at, bursts) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (str(asn_number), profile["rate"], profile["wait"], profile["yield"], profile["rtt"], profile["max_rate"],
+             int(profile["calibrated_at"]), json.dumps(profile["bursts"])))
+
+
+def load_rate_profile(asn_number, db_path=HISTORY_DB):
+    with closing(connect(db_path)) as connection:
+        row = connection.execute(
+            "SELECT rate, wait, yield, rtt, max_rate, calibrated_at, bursts FROM rate_profiles WHERE asn = ?",
+            (str(asn_number),)).fetchone()
+    if row is None:
+        return None
+    rate, wait, response_yield, rtt, max_rate, calibrated_at, bursts = row
+    return {"rate": rate, "wait": wait, "yield": response_yield, "rtt": rtt, "max_rate": max_rate,
+            "calibrated_at": calibrated_at, "bursts": json.loads(bursts)}
@@ -0,0 +1,87 @@
+import random
+import time
+
+import numpy as np
+
+import prefixes
+import result_store
+
+# 增量扫描: 与上一次扫描的前缀集合比较, 新增前缀完整扫描, 未变化的前缀只抽样复查,
+# 其余地址沿用上一次的结果, 每天的探测量可以减少一个数量级
+
+DEFAULT_VERIFY_FRACTION = 0.1
+# 抽样复查的地址块大小 (一个 /24)
+SAMPLE_BLOCK_SIZE = 256
+
+
+# 上一次扫描使用的前缀区间, 旧结果文件没有记录前缀时返回 None
+def previous_intervals(store_path):
+    header = result_store.read_header(store_path)
+    cidrs = header.get("cidrs")
+    if cidrs is None:
+        return None
+    return prefixes.cidrs_to_intervals(cidrs)
+
+
+# 计算本次需要扫描的区间: 新增前缀 + 未变化前缀中的抽样地址块
+def plan_incremental(current, previous, verify_fraction=DEFAULT_VERIFY_FRACTION, seed=None):
+    # 默认每天换一批抽样块, 多次运行后可以覆盖全部地址
+    rng = random.Random(seed if seed is not None else int(time.time() // 86400))
+    new = prefixes.subtract_intervals(current, previous)
+    unchanged = prefixes.intersect_intervals(current, previous)
+    verify = prefixes.sample_blocks(unchanged, verify_fraction, SAMPLE_BLOCK_SIZE, rng) if verify_fraction > 0 else []
+    scan = prefixes.merge_intervals(new + verify)
+    return {
+        "new": new,
+        "verify": verify,
+        "scan": scan,
+        "new_addresses": prefixes.count_addresses(new),
+        "verify_addresses": prefixes.count_addresses(verify),
+        "unchanged_addresses": prefixes.count_addresses(unchanged),
+    }
+
+
+def format_plan(asn_number, plan):
+    total = plan["new_addresses"] + plan["unchanged_addresses"]
+    scanned = prefixes.count_addresses(plan["scan"])
+    ratio = scanned / total * 100 if total else 0.0
+    return (f"ASN {asn_number} incremental scan: {plan['new_addresses']} new addresses, "
+            f"{plan['verify_addresses']}/{plan['unchanged_addresses']} unchanged addresses verified, "
+            f"probing {scanned} of {total} ({ratio:.1f}%)")
+
+
+# 复查块内新旧结果的差异, 用来判断沿用旧结果是否可靠
+def verification_report(previous_columns, fresh_columns, verify):
+    old_mask = prefixes.ips_in_intervals(verify, previous_columns["ips"])
+    new_mask = prefixes.ips_in_intervals(verify, fresh_columns["ips"])
+    old_keys = np.unique(previous_columns["ips"][old_mask].astype(np.uint64) << 16
+                         | previous_columns["ports"][old_mask].astype(np.uint64))
+    new_keys = np.unique(fresh_columns["ips"][new_mask].astype(np.uint64) << 16
+                         | fresh_columns["ports"][new_mask].astype(np.uint64))
+    stable = np.intersect1d(old_keys, new_keys).size
+    return {
+        "previous": int(old_keys.size),
+        "current": int(new_keys.size),
+        "stable": stable,
+        "churn": 1 - stable / max(old_keys.size, new_keys.size, 1),
+    }
+
+
+# 合并结果: 上一次的记录去掉已不属于本 ASN 的地址和本次重新扫描的地址, 再加上本次的新结果
+def write_merged(store_path, previous_path, current, plan, fresh_columns, asn_number, scan_ports, rate,
+                 start_time, end_time, cidrs):
+    _, previous_columns = result_store.open_results(previous_path)
+    keep = prefixes.ips_in_intervals(current, previous_columns["ips"])
+    keep &= ~prefixes.ips_in_intervals(plan["scan"], previous_columns["ips"])
+    report = verification_report(previous_columns, fresh_columns, plan["verify"])
+    print(f"Verification of ASN {asn_number}: {report['stable']} stable, {report['previous']} previous, "
+          f"{report['current']} current open ports in sampled blocks (churn {report['churn']:.1%})")
+
+    writer = result_store.ResultWriter(store_path, asn_number, scan_ports, rate, start_time, cidrs=cidrs,
+                                       incremental=True, base=previous_path,
+                                       scanned_addresses=prefixes.count_addresses(plan["scan"]),
+                                       verification=report)
+    writer.append(previous_columns["ports"][keep], previous_columns["ips"][keep],
+                  previous_columns["timestamps"][keep])
+    writer.append(fresh_columns["ports"], fresh_columns["ips"], fresh_columns["timestamps"])
+    return writer.close(end_time)
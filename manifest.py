@@ -0,0 +1,168 @@
+import json
+import os
+
+import asn
+import render
+import scheduler
+
+# 结果清单: 扫描后更新每个 (ASN, 端口) 的计数、时间和图片路径, README 由清单生成,
+# 不再遍历 ports_results 目录; 每个条目缓存自己的 Markdown 片段, 只有变化的条目需要重新生成,
+# README 内容不变时不写文件
+
+MANIFEST_PATH = os.path.join(render.RESULTS_DIR, "manifest.json")
+README_PATH = "README.md"
+# 全端口扫描的条目只保存计数最多的端口, 完整的逐端口计数在 CSV 中 (见 render.full_range_data_path)
+FULL_RANGE_TOP_PORTS = 100
+README_HEADER = '''
+# open-ports-ranks
+scan asn and detect the open port and make a statics with graph
+## Open Ports Result
+
+'''
+
+
+def entry_key(asn_number, scan_ports):
+    return f"{asn_number}_{scan_ports}"
+
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return {"entries": {}}
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+# 内容有变化时才原子写入, 返回是否写入
+def write_if_changed(path, content):
+    if os.path.exists(path):
+        with open(path, 'r') as file:
+            if file.read() == content:
+                return False
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as file:
+        file.write(content)
+    os.replace(tmp_path, path)
+    return True
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    return write_if_changed(path, json.dumps(manifest, indent=1, sort_keys=True) + "\n")
+
+
+def _section(entry):
+    image = entry["image"]
+    name = asn.ASN_Map.get(entry["asn"], "UnknownASN")
+    section = (f'## {name}\n### {os.path.basename(image).replace("port_distribution_", "")}\n'
+               f'![{os.path.basename(image)}]({image})')
+    if entry.get("trend"):
+        section += f'\n![{os.path.basename(entry["trend"])}]({entry["trend"]})'
+    if entry.get("data"):
+        section += f'\n\nPer-port counts: [{os.path.basename(entry["data"])}]({entry["data"]})'
+    return section
+
+
+def _make_entry(asn_number, scan_ports, port_counts=None, started_at=None, sampled=False,
+                results_dir=render.RESULTS_DIR):
+    image = render.chart_path(asn_number, scan_ports, results_dir)
+    trend = render.trend_path(asn_number, scan_ports, results_dir)
+    data = render.full_range_data_path(asn_number, scan_ports, results_dir)
+    # numpy 标量转为 Python 数值后才能写入 JSON
+    counts = {str(port): getattr(count, "item", lambda: count)() for port, count in sorted((port_counts or {}).items())
+              if count}
+    total = sum(counts.values()) if port_counts is not None else None
+    open_ports = len(counts)
+    has_data = os.path.exists(data)
+    if has_data:
+        top = sorted(counts, key=lambda port: (-counts[port], int(port)))[:FULL_RANGE_TOP_PORTS]
+        counts = {port: counts[port] for port in sorted(top, key=int)}
+    entry = {
+        "asn": str(asn_number),
+        "scan_ports": scan_ports,
+        "counts": counts,
+        "total": total,
+        "open_ports": open_ports,
+        "addresses": scheduler.asn_address_count(asn_number),
+        "started_at": started_at,
+        "sampled": bool(sampled),
+        "image": image.replace(os.sep, "/"),
+        "trend": trend.replace(os.sep, "/") if os.path.exists(trend) else None,
+        "data": data.replace(os.sep, "/") if has_data else None,
+    }
+    entry["section"] = _section(entry)
+    return entry
+
+
+# 条目的完整端口计数: 全端口扫描的条目从 CSV 读取, 其余直接使用清单中的计数
+def entry_counts(entry):
+    data = entry.get("data")
+    if not data or not os.path.exists(data):
+        return entry.get("counts") or {}
+    with open(data, 'r') as file:
+        next(file)
+        return {port: int(count) for port, count in (line.strip().split(",") for line in file if line.strip())}
+
+
+# 用本次统计的结果更新清单条目, jobs 与 publish_statistics 的任务相同
+def update_entries(jobs, path=MANIFEST_PATH, results_dir=render.RESULTS_DIR):
+    manifest = load_manifest(path)
+    for job in jobs:
+        if not job["port_counts"]:
+            continue
+        entry = _make_entry(job["asn"], job["scan_ports"], job["port_counts"], job.get("started_at"),
+                            bool(job.get("estimates")), results_dir)
+        manifest["entries"][entry_key(job["asn"], job["scan_ports"])] = entry
+    save_manifest(manifest, path)
+    return manifest
+
+
+# 记录跨 ASN 排名的输出文件, README 中展示热力图和排名表
+def update_ranking(scan_ports, paths, path=MANIFEST_PATH):
+    manifest = load_manifest(path)
+    manifest.setdefault("rankings", {})[scan_ports] = paths
+    save_manifest(manifest, path)
+    return manifest
+
+
+# 旧版本没有清单, 第一次运行时根据已有的图片建立条目 (计数未知)
+def bootstrap(results_dir=render.RESULTS_DIR, path=MANIFEST_PATH):
+    manifest = load_manifest(path)
+    if manifest["entries"] or not os.path.isdir(results_dir):
+        return manifest
+    for asn_number in sorted(os.listdir(results_dir)):
+        directory = os.path.join(results_dir, asn_number)
+        if not os.path.isdir(directory):
+            continue
+        prefix = f"port_distribution_asn{asn_number}_"
+        for file_name in sorted(os.listdir(directory)):
+            if file_name.startswith(prefix) and file_name.endswith(".png"):
+                scan_ports = file_name[len(prefix):-len(".png")]
+                manifest["entries"][entry_key(asn_number, scan_ports)] = _make_entry(
+                    asn_number, scan_ports, results_dir=results_dir)
+    save_manifest(manifest, path)
+    return manifest
+
+
+# 稳定排序: 开放端口总数从多到少, 然后按 ASN 地址数从多到少, 最后按 ASN 和端口
+def _sort_key(entry):
+    total = entry.get("total")
+    addresses = entry.get("addresses")
+    return (total is None, -(total or 0), addresses is None, -(addresses or 0), entry["asn"], entry["scan_ports"])
+
+
+def render_readme(manifest):
+    entries = sorted(manifest["entries"].values(), key=_sort_key)
+    sections = [f'## Port Ranking ({scan_ports})\n![{os.path.basename(paths["heatmap"])}]({paths["heatmap"]})\n'
+                f'[ranking table]({paths["json"]}) / [csv]({paths["csv"]})'
+                for scan_ports, paths in sorted(manifest.get("rankings", {}).items())]
+    sections.extend(entry["section"] for entry in entries)
+    return README_HEADER + "\n".join(sections)
+
+
+# 根据清单生成 README, 内容不变时不写文件, 返回是否写入
+def refresh_readme(path=MANIFEST_PATH, readme_path=README_PATH):
+    written = write_if_changed(readme_path, render_readme(load_manifest(path)))
+    print(f"README {'updated' if written else 'unchanged'}.")
+    return written
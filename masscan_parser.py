@@ -0,0 +1,156 @@
+import mmap
+import os
+from collections import defaultdict
+
+import numpy as np
+
+# 批量解析 masscan -oL 输出: 按大块 (mmap) 读取文件, 用 NumPy 一次性提取
+# 端口 / IP / 时间戳三列, 再用 bincount 统计端口分布, 避免逐行 split + int
+
+CHUNK_SIZE = 8 * 1024 * 1024
+PORT_SLOTS = 65536
+# 每条记录 "open tcp <port> <a.b.c.d> <timestamp>" 去掉非数字字符后正好是 6 个整数
+FIELDS_PER_RECORD = 6
+# 把所有非数字字节替换为空格的转换表
+_DIGITS_ONLY = bytes(c if 48 <= c <= 57 else 32 for c in range(256))
+
+
+# 按块读取文件, 每块都在换行处截断, 保证不会把一行拆开
+def iter_chunks(file_path, chunk_size=CHUNK_SIZE):
+    size = os.path.getsize(file_path)
+    if size == 0:
+        return
+    with open(file_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        while start < size:
+            end = min(start + chunk_size, size)
+            if end < size:
+                cut = mm.rfind(b'\n', start, end)
+                if cut == -1:
+                    # 单行超过块大小, 延伸到下一个换行
+                    cut = mm.find(b'\n', end)
+                end = size if cut == -1 else cut + 1
+            yield mm[start:end]
+            start = end
+
+
+# 只保留 open 记录行; 绝大多数块全部是记录, 走快速路径不做拆分
+def _record_lines(chunk):
+    if not chunk:
+        return chunk
+    if not chunk.endswith(b'\n'):
+        chunk += b'\n'
+    extra_lines = chunk.count(b'\n') - chunk.count(b'open ')
+    if extra_lines == 0:
+        return chunk
+    # 文件头 "#masscan" 和结尾 "# end <ts>" 只出现在首尾两块, 直接切掉这些注释行
+    if extra_lines == chunk.count(b'#'):
+        parts = []
+        start = 0
+        while (pos := chunk.find(b'#', start)) != -1:
+            if pos > 0 and chunk[pos - 1] != 10:
+                break
+            parts.append(chunk[start:pos])
+            start = chunk.find(b'\n', pos) + 1
+        else:
+            parts.append(chunk[start:])
+            return b''.join(parts)
+    lines = [line for line in chunk.split(b'\n') if line.startswith(b'open ')]
+    return b'\n'.join(lines) + b'\n' if lines else b''
+
+
+# 通用路径: 去掉所有非数字字符后由 NumPy 一次性解析为整数
+def _parse_generic(text):
+    values = np.fromstring(text.translate(_DIGITS_ONLY), dtype=np.int64, sep=' ')
+    if values.size % FIELDS_PER_RECORD != 0:
+        raise ValueError(f"Malformed masscan list output: {values.size} numeric fields")
+    values = values.reshape(-1, FIELDS_PER_RECORD)
+    ips = (values[:, 1] << 24) | (values[:, 2] << 16) | (values[:, 3] << 8) | values[:, 4]
+    return values[:, 0], ips, values[:, 5]
+
+
+# 解析一块文本, 返回 (ports uint16, ips uint32, timestamps uint32)
+def parse_chunk(chunk):
+    ports, ips, timestamps = _parse_generic(_record_lines(chunk))
+    return ports.astype(np.uint16), ips.astype(np.uint32), timestamps.astype(np.uint32)
+
+
+# 只解析端口列: 每行 "open tcp <port> <ip> <ts>" 正好 4 个空格, 端口位于第 2、3 个空格之间,
+# 按分隔符位置逐位 (最多 5 位) 向量化计算, 不需要解析 IP 和时间戳
+def parse_ports_chunk(chunk):
+    text = _record_lines(chunk)
+    data = np.frombuffer(text, dtype=np.uint8)
+    lines = text.count(b'\n')
+    spaces = np.flatnonzero(data == 32)
+    if spaces.size != 4 * lines:
+        return _parse_generic(text)[0].astype(np.uint16)
+    spaces = spaces.reshape(-1, 4)
+    start = spaces[:, 1] + 1
+    end = spaces[:, 2]
+    ports = np.zeros(lines, dtype=np.int32)
+    for offset in range(5):
+        position = start + offset
+        valid = position < end
+        digit = data[np.where(valid, position, 0)].astype(np.int32) - 48
+        ports = np.where(valid, ports * 10 + digit, ports)
+    return ports.astype(np.uint16)
+
+
+# 生成器: 逐块产出三列数组, 内存占用只和块大小有关
+def iter_columns(file_path, chunk_size=CHUNK_SIZE):
+    for chunk in iter_chunks(file_path, chunk_size):
+        columns = parse_chunk(chunk)
+        if columns[0].size:
+            yield columns
+
+
+# 读取整个结果文件的三列数组
+def load_columns(file_path, chunk_size=CHUNK_SIZE):
+    ports, ips, timestamps = [], [], []
+    for chunk_ports, chunk_ips, chunk_timestamps in iter_columns(file_path, chunk_size):
+        ports.append(chunk_ports)
+        ips.append(chunk_ips)
+        timestamps.append(chunk_timestamps)
+    if not ports:
+        return np.empty(0, np.uint16), np.empty(0, np.uint32), np.empty(0, np.uint32)
+    return np.concatenate(ports), np.concatenate(ips), np.concatenate(timestamps)
+
+
+# 端口直方图: 长度为 65536 的计数数组
+def port_histogram(ports):
+    return np.bincount(ports, minlength=PORT_SLOTS).astype(np.int64)
+
+
+# 按块统计整个文件的端口直方图
+def count_ports(file_path, chunk_size=CHUNK_SIZE):
+    histogram = np.zeros(PORT_SLOTS, dtype=np.int64)
+    for chunk in iter_chunks(file_path, chunk_size):
+        histogram += port_histogram(parse_ports_chunk(chunk))
+    return histogram
+
+
+# 端口分组直方图: 第 i 组为 [start_port + i * step, start_port + (i + 1) * step)
+def group_histogram(histogram, start_port, step, num_groups):
+    groups = (np.arange(PORT_SLOTS) - start_port) // step
+    mask = (groups >= 0) & (groups < num_groups)
+    return np.bincount(groups[mask], weights=histogram[mask], minlength=num_groups).astype(np.int64)
+
+
+# 转换为 {port: count}, 只保留非零项, 兼容原来的 defaultdict 结果
+def histogram_to_dict(histogram):
+    return defaultdict(int, {int(index): int(histogram[index]) for index in np.flatnonzero(histogram)})
+
+
+# 解析 masscan 的端口参数, 例如 "80,443,8000-8100", 返回有序端口列表
+def parse_port_spec(scan_ports):
+    ports = set()
+    for part in str(scan_ports).split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.split('-', 1)
+            ports.update(range(int(start), int(end) + 1))
+        else:
+            ports.add(int(part))
+    return sorted(ports)
@@ -0,0 +1,153 @@
+import re
+import subprocess
+import threading
+import time
+from collections import defaultdict
+
+# 流式读取 masscan 结果: masscan 通过 -oL - 把结果写到管道, 边扫描边解析计数,
+# 内存占用只与端口数量有关, 与结果条数无关
+
+# masscan 写到 stderr 的状态行, 例如:
+# rate:  19.98-kpps, 42.17% done,   0:01:23 remaining, found=1234
+STATUS_PATTERN = re.compile(r"rate:\s*([\d.]+)-kpps,\s*([\d.]+)% done(?:,\s*([\d:]+) remaining)?.*?found=(\d+)")
+
+
+# 解析 -oL 格式的一行: open tcp <port> <ip> <timestamp>
+def parse_record(line):
+    parts = line.split()
+    if len(parts) >= 5 and parts[0] == 'open':
+        return int(parts[2]), parts[3], int(parts[4])
+    return None
+
+
+# 生成器: 逐行过滤出开放端口记录 (忽略注释行和 "Discovered open port" 之类的提示)
+def iter_records(lines):
+    for line in lines:
+        if line.startswith('open'):
+            record = parse_record(line)
+            if record is not None:
+                yield record
+
+
+# 生成器: 把 stderr 按 \r 或 \n 切分为状态行 (read1 有多少读多少, 不会等满缓冲区)
+def iter_status_lines(stream):
+    buffer = ''
+    while True:
+        chunk = stream.read1(4096)
+        if not chunk:
+            break
+        buffer += chunk.decode('utf-8', 'replace')
+        parts = re.split(r'[\r\n]', buffer)
+        buffer = parts.pop()
+        for part in parts:
+            if part.strip():
+                yield part
+    if buffer.strip():
+        yield buffer
+
+
+# 扫描过程中的实时统计, 可以在其他线程中调用 snapshot() 读取
+class ScanProgress:
+    def __init__(self, label=""):
+        self.label = label
+        self.port_counts = defaultdict(int)
+        self.results = 0
+        self.percent_done = 0.0
+        self.kpps = 0.0
+        self.remaining = None
+        self.masscan_found = 0
+        # 扫描器的退出状态, 扫描结束前为 None, 0 表示扫描完整结束
+        self.returncode = None
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        port = record[0]
+        with self._lock:
+            self.port_counts[port] += 1
+            self.results += 1
+
+    def update_status(self, line):
+        match = STATUS_PATTERN.search(line)
+        if match is None:
+            return
+        self.set_status(float(match.group(1)), float(match.group(2)), match.group(3), int(match.group(4)))
+
+    # 其他扫描后端 (见 scanners.py) 直接更新状态
+    def set_status(self, kpps, percent_done, remaining, found):
+        with self._lock:
+            self.kpps = kpps
+            self.percent_done = percent_done
+            self.remaining = remaining
+            self.masscan_found = found
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = time.time() - self.started_at
+            return {
+                "label": self.label,
+                "elapsed": elapsed,
+                "results": self.results,
+                "results_per_second": self.results / elapsed if elapsed > 0 else 0.0,
+                "percent_done": self.percent_done,
+                "kpps": self.kpps,
+                "remaining": self.remaining,
+                "port_counts": dict(self.port_counts),
+            }
+
+    def format(self):
+        snap = self.snapshot()
+        top = sorted(snap["port_counts"].items(), key=lambda item: item[1], reverse=True)[:5]
+        top_str = ", ".join(f"{port}:{count}" for port, count in top)
+        return (f"[{snap['label']}] {snap['percent_done']:.2f}% done, {snap['kpps']:.2f} kpps, "
+                f"remaining {snap['remaining'] or '?'}, {snap['results']} results "
+                f"({snap['results_per_second']:.1f}/s), top ports: {top_str}")
+
+
+# 以流式模式运行 masscan, 返回 ScanProgress (returncode 为 masscan 的退出状态); on_record 可用于把记录继续传给下游;
+# 目标很多时 (例如校准用的抽样地址) 通过 include_file 用 -iL 从文件读取, 不放在命令行上
+def stream_scan(cidr, scan_ports, rate, progress=None, on_record=None, report_interval=10, wait=5, include_file=None):
+    progress = progress or ScanProgress()
+    target_args = ["-iL", include_file] if include_file else [cidr]
+    options = [f"-p{scan_ports}", f"--rate={rate}", f"--wait={wait}", "-oL", "-"]
+    cmd = ["masscan", *target_args, *options]
+    # 只打印目标数量, 不打印全部目标, 避免日志中出现很长的命令行
+    targets = f"-iL {include_file}" if include_file else f"<{len(cidr.split())} targets>"
+    print(f"Executing command: masscan {targets} {' '.join(options)}")
+
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stderr_lines = []
+
+    def consume_stderr():
+        # masscan 大约每秒输出一次状态, 在这里定期打印进度, 即使暂时没有结果也能看到
+        last_report = time.time()
+        for line in iter_status_lines(process.stderr):
+            if STATUS_PATTERN.search(line) is None:
+                # 只保留少量非状态输出, 用于报错
+                stderr_lines.append(line)
+                del stderr_lines[:-20]
+                continue
+            progress.update_status(line)
+            if time.time() - last_report >= report_interval:
+                print(progress.format())
+                last_report = time.time()
+
+    stderr_thread = threading.Thread(target=consume_stderr, daemon=True)
+    stderr_thread.start()
+
+    lines = (line.decode('ascii', 'replace') for line in process.stdout)
+    for record in iter_records(lines):
+        progress.add(record)
+        if on_record is not None:
+            on_record(record)
+
+    returncode = process.wait()
+    stderr_thread.join()
+    progress.returncode = returncode
+    if returncode != 0:
+        print(f"Error executing masscan, exit status: {returncode}")
+        print("Standard error: " + "\n".join(stderr_lines))
+    else:
+        print("Scan completed successfully.")
+    print(progress.format())
+    return progress
@@ -0,0 +1,187 @@
+import contextlib
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+# 运行指标: 每个阶段 (前缀获取、扫描、统计、绘图、README ...) 的墙钟时间和 CPU 时间,
+# 地址数 / 探测数 / 结果数及其每秒速率, 以及峰值内存; 每次运行写一份 JSON 报告,
+# 可选再写一份 Prometheus textfile (node_exporter 的 textfile collector 读取), 用来定位瓶颈和对比每日运行
+
+REPORT_DIR = "run_reports"
+# 设置后额外写出 Prometheus textfile, 例如 /var/lib/node_exporter/textfile/open_port_ranks.prom
+PROMETHEUS_ENV = "OPEN_PORT_RANKS_PROM_FILE"
+METRIC_PREFIX = "open_port_ranks"
+# 会换算成每秒速率的计数
+RATE_COUNTS = ("addresses", "probes", "results")
+# Linux 的 ru_maxrss 单位是 KiB, macOS 是字节
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def _usage():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own, children
+
+
+class RunMetrics:
+    def __init__(self, name):
+        self.name = name
+        self.started_at = time.time()
+        self.run_id = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime(self.started_at))
+        self._start = time.perf_counter()
+        own, children = _usage()
+        self._start_cpu = own.ru_utime + own.ru_stime
+        self._start_children_cpu = children.ru_utime + children.ru_stime
+        self.phases = []
+        self._lock = threading.Lock()
+
+    # 记录一个阶段; 阶段内可以往返回的字典里写入 addresses / probes / results 等计数
+    # cpu 为当前线程的 CPU 时间 (扫描在多个线程中并发进行), children_cpu 为阶段内结束的子进程 (masscan、绘图进程池)
+    @contextlib.contextmanager
+    def phase(self, name, **labels):
+        counts = {}
+        start = time.perf_counter()
+        start_cpu = time.thread_time()
+        start_children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        try:
+            yield counts
+        finally:
+            wall = time.perf_counter() - start
+            children = resource.getrusage(resource.RUSAGE_CHILDREN)
+            record = {
+                "phase": name,
+                **{key: str(value) for key, value in labels.items()},
+                "wall": round(wall, 4),
+                "cpu": round(time.thread_time() - start_cpu, 4),
+                "children_cpu": round(children.ru_utime + children.ru_stime
+                                      - start_children.ru_utime - start_children.ru_stime, 4),
+                **counts,
+            }
+            # 阶段内已经给出速率时 (例如按扫描器自身的耗时计算) 不再覆盖
+            for key in RATE_COUNTS:
+                if key in counts and wall > 0:
+                    record.setdefault(f"{key}_per_second", round(counts[key] / wall, 2))
+            with self._lock:
+                self.phases.append(record)
+
+    def report(self):
+        own, children = _usage()
+        with self._lock:
+            phases = list(self.phases)
+        totals = {}
+        for record in phases:
+            total = totals.setdefault(record["phase"], {"count": 0, "wall": 0.0, "cpu": 0.0})
+            total["count"] += 1
+            total["wall"] = round(total["wall"] + record["wall"], 4)
+            total["cpu"] = round(total["cpu"] + record["cpu"], 4)
+        return {
+            "name": self.name,
+            "run_id": self.run_id,
+            "started_at": int(self.started_at),
+            "wall": round(time.perf_counter() - self._start, 4),
+            "cpu": round(own.ru_utime + own.ru_stime - self._start_cpu, 4),
+            "children_cpu": round(children.ru_utime + children.ru_stime - self._start_children_cpu, 4),
+            "peak_rss_bytes": own.ru_maxrss * RSS_UNIT,
+            "children_peak_rss_bytes": children.ru_maxrss * RSS_UNIT,
+            "totals": totals,
+            "phases": phases,
+        }
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+# Prometheus 文本格式, 每个阶段 (带 asn 等标签) 一组 gauge
+def prometheus_text(report):
+    run_labels = {"run": report["name"]}
+    metrics = [
+        ("run_timestamp_seconds", "Start time of the last run", [(run_labels, report["started_at"])]),
+        ("run_wall_seconds", "Wall time of the last run", [(run_labels, report["wall"])]),
+        ("run_cpu_seconds", "CPU time of the last run, own process and children",
+         [({**run_labels, "process": "self"}, report["cpu"]),
+          ({**run_labels, "process": "children"}, report["children_cpu"])]),
+        ("run_peak_rss_bytes", "Peak resident set size of the last run",
+         [({**run_labels, "process": "self"}, report["peak_rss_bytes"]),
+          ({**run_labels, "process": "children"}, report["children_peak_rss_bytes"])]),
+        ("phase_wall_seconds", "Wall time per phase", []),
+        ("phase_cpu_seconds", "Thread CPU time per phase", []),
+        ("phase_rate_per_second", "Addresses, probes or results per second per phase", []),
+        ("phase_count", "Addresses, probes or results per phase", []),
+    ]
+    samples = {name: values for name, _, values in metrics}
+    for record in report["phases"]:
+        labels = {**run_labels, **{key: value for key, value in record.items()
+                                   if isinstance(value, str)}}
+        samples["phase_wall_seconds"].append((labels, record["wall"]))
+        samples["phase_cpu_seconds"].append((labels, record["cpu"]))
+        for key in RATE_COUNTS:
+            if key in record:
+                samples["phase_count"].append(({**labels, "kind": key}, record[key]))
+            if f"{key}_per_second" in record:
+                samples["phase_rate_per_second"].append(({**labels, "kind": key}, record[f"{key}_per_second"]))
+    lines = []
+    for name, help_text, _ in metrics:
+        # 同名同标签的阶段只保留最后一次
+        values = dict((_labels(labels), value) for labels, value in samples[name])
+        if not values:
+            continue
+        lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+        lines.extend(f"{METRIC_PREFIX}_{name}{labels} {value}" for labels, value in values.items())
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path, content):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as file:
+        file.write(content)
+    os.replace(tmp_path, path)
+
+
+_current = None
+_current_lock = threading.Lock()
+
+
+def start_run(name):
+    global _current
+    with _current_lock:
+        _current = RunMetrics(name)
+    return _current
+
+
+def current():
+    global _current
+    with _current_lock:
+        if _current is None:
+            _current = RunMetrics(os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0])
+        return _current
+
+
+def phase(name, **labels):
+    return current().phase(name, **labels)
+
+
+# 写出运行报告 run_reports/<名称>_<开始时间>.json, 设置了 Prometheus 文件时一并写出; 返回报告路径
+def finish_run(report_dir=REPORT_DIR, prometheus_path=None):
+    report = current().report()
+    path = os.path.join(report_dir, f"{report['name']}_{report['run_id']}.json")
+    _write_atomic(path, json.dumps(report, indent=1) + "\n")
+    prometheus_path = prometheus_path or os.environ.get(PROMETHEUS_ENV)
+    if prometheus_path:
+        _write_atomic(prometheus_path, prometheus_text(report))
+    slowest = sorted(report["totals"].items(), key=lambda item: -item[1]["wall"])[:5]
+    slowest = ", ".join(f"{name} {total['wall']:.1f}s" for name, total in slowest)
+    print(f"Run {report['name']} took {report['wall']:.1f}s, peak RSS {report['peak_rss_bytes'] / 2 ** 20:.0f} MiB, "
+          f"slowest phases: {slowest}; report saved to {path}")
+    return path
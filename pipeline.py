@@ -0,0 +1,479 @@
+import os
+import shutil
+import time
+from collections import defaultdict
+import numpy as np
+
+import checkpoint
+import density
+import enrich
+import fullrange
+import history
+import incremental
+import manifest
+import masscan_parser
+import masscan_stream
+import metrics
+import port_profiles
+import prefix_source
+import prefixes
+import ranking
+import ratecontrol
+import render
+import result_store
+import sampling
+import scanners
+import scheduler
+
+# 扫描流水线: 获取前缀、扫描 (一次性 / 流式 / 分片续跑 / 增量 / 抽样)、统计、绘图、密度分析、排名和 README;
+# 命令行入口见 cli.py, multi_port.py 和 one_port.py 只保留为旧的入口
+
+
+# Step 1: 获取 ASN 的 CIDR IP 段 (asn/<n> 缓存过期后会自动刷新)
+def get_cidr_ips(asn):
+    with metrics.phase("prefixes", asn=asn) as counts:
+        cache = prefix_source.get_prefix_cache(asn)
+        counts["addresses"] = cache["unique_addresses"]
+    # 合并重叠/重复的前缀, 避免重复探测和重复计数
+    print(prefixes.format_normalize_report(asn, cache["raw"], cache))
+    return cache["normalized"]
+
+
+# 没有任何前缀的 ASN (例如 bgpview 和离线索引都没有数据) 跳过扫描, 不影响同一批的其他 ASN
+def has_targets(asn_number, cidrs):
+    if not cidrs:
+        print(f"No prefixes for ASN {asn_number}, skipping scan.")
+        return False
+    return True
+
+
+# Step 2: 扫描所有 IP 的端口, 默认用 masscan, 没有 masscan 或没有 root 权限时用 asyncio connect 扫描
+def scan_ip_range(cidr, output_file, scan_ports="443", rate=scheduler.DEFAULT_GLOBAL_RATE, include_file=None,
+                  backend=None, wait=scanners.DEFAULT_WAIT):
+    return scanners.get_backend(backend).scan(cidr, output_file, scan_ports, rate, include_file, wait)
+
+
+# 步骤 3: 解析 Nmap 输出并统计端口
+def parse_masscan_output(file_path):
+    # 按块批量解析, 用 bincount 统计每个端口的数量
+    return masscan_parser.histogram_to_dict(masscan_parser.count_ports(file_path))
+
+
+# 执行单个 ASN 的 masscan 扫描, 结果转存到列式结果文件, 返回结果文件路径
+def run_masscan(asn_number, scan_ports, rate=scheduler.DEFAULT_GLOBAL_RATE):
+    asn = asn_number
+    cidrs = get_cidr_ips(asn)
+    if not has_targets(asn, cidrs):
+        return None
+
+    # 创建一个目录来存储扫描结果
+    output_dir = f"masscan_results/{asn}"
+    os.makedirs(output_dir, exist_ok=True)
+
+    output_file = os.path.join(output_dir, "scan_result.txt")
+    print(f"Scanning {cidrs[0]}...")
+    cidrs_str = " ".join(cidrs)
+    start_time = time.time()
+    scan_ip_range(cidrs_str, output_file, scan_ports, rate, wait=ratecontrol.scan_wait(asn))
+    return store_scan_output(asn, scan_ports, rate, output_file, start_time, time.time(), cidrs=cidrs)
+
+
+# 把 masscan 的 -oL 文本结果转换为列式结果文件, 文本文件不存在时返回 None
+def store_scan_output(asn_number, scan_ports, rate, output_file, start_time, end_time, store_path=None, **extra):
+    if not os.path.exists(output_file):
+        print(f"Scan result file not found for ASN {asn_number}. Skipping...")
+        return None
+    store_path = store_path or result_store.result_path(asn_number, scan_ports, start_time)
+    os.makedirs(os.path.dirname(store_path), exist_ok=True)
+    with metrics.phase("parse", asn=asn_number, ports=scan_ports) as counts:
+        writer = result_store.ResultWriter(store_path, asn_number, scan_ports, rate, start_time, **extra)
+        for ports, ips, timestamps in masscan_parser.iter_columns(output_file):
+            writer.append(ports, ips, timestamps)
+        writer.close(end_time)
+        counts["results"] = writer.header["count"]
+    print(f"Saved {writer.header['count']} results to {store_path} "
+          f"({os.path.getsize(store_path)} bytes, text {os.path.getsize(output_file)} bytes)")
+    return store_path
+
+
+# 以流式模式执行 masscan, 扫描过程中实时统计, 记录直接写入列式结果文件
+def run_masscan_streaming(asn_number, scan_ports, rate=scheduler.DEFAULT_GLOBAL_RATE):
+    cidrs = get_cidr_ips(asn_number)
+    if not has_targets(asn_number, cidrs):
+        return None
+    print(f"Scanning {cidrs[0]}...")
+    start_time = time.time()
+    store_path = result_store.result_path(asn_number, scan_ports, start_time)
+    os.makedirs(os.path.dirname(store_path), exist_ok=True)
+    writer = result_store.ResultWriter(store_path, asn_number, scan_ports, rate, start_time, cidrs=cidrs)
+    progress = masscan_stream.ScanProgress(label=f"ASN {asn_number}")
+    scanners.get_backend().stream(" ".join(cidrs), scan_ports, rate, progress, on_record=writer.add,
+                                  wait=ratecontrol.scan_wait(asn_number))
+    # 扫描失败或被终止时结果不完整, 不保存结果文件, 也不写入历史、排名和增量扫描的基准
+    if progress.returncode != 0:
+        print(f"Streaming scan of ASN {asn_number} did not complete (exit status {progress.returncode}), "
+              f"discarding {progress.results} partial results.")
+        writer.discard()
+        return None
+    return writer.close()
+
+
+# 按地址分片扫描并记录检查点, 中断后再次运行会从未完成的分片继续
+def run_masscan_resumable(asn_number, scan_ports, rate=scheduler.DEFAULT_GLOBAL_RATE,
+                          shard_size=checkpoint.DEFAULT_SHARD_SIZE):
+    cidrs = get_cidr_ips(asn_number)
+    if not has_targets(asn_number, cidrs):
+        return None
+    shards = prefixes.split_intervals(prefixes.cidrs_to_intervals(cidrs), shard_size)
+    state = checkpoint.load_checkpoint(asn_number, scan_ports, rate, cidrs, shard_size, len(shards))
+
+    output_dir = f"masscan_results/{asn_number}"
+    os.makedirs(output_dir, exist_ok=True)
+    for index, shard in enumerate(shards):
+        if checkpoint.is_shard_done(state, index):
+            continue
+        print(f"Scanning ASN {asn_number} shard {index + 1}/{len(shards)} "
+              f"({prefixes.count_addresses(shard)} addresses)...")
+        output_file = os.path.join(output_dir, f"shard_{index:05d}.txt")
+        # 上次中断时可能留下了不完整的结果文件
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        start_time = time.time()
+        if not scan_ip_range(" ".join(prefixes.intervals_to_cidrs(shard)), output_file, scan_ports, rate,
+                             wait=ratecontrol.scan_wait(asn_number)):
+            print(f"Shard {index} of ASN {asn_number} failed, rerun to resume from the checkpoint.")
+            return None
+        shard_store = store_scan_output(asn_number, scan_ports, rate, output_file, start_time, time.time(),
+                                        checkpoint.shard_store_path(state, index))
+        if shard_store is None:
+            return None
+        shard_counts = masscan_parser.histogram_to_dict(result_store.load_port_histogram(shard_store))
+        checkpoint.mark_shard_done(state, index, shard_counts, sum(shard_counts.values()))
+        os.remove(output_file)
+
+    return checkpoint.finish(state, result_store.result_path(asn_number, scan_ports, state["start_time"]),
+                             cidrs=cidrs)
+
+
+# 增量扫描: 只完整扫描新增前缀, 未变化的前缀抽样复查, 其余沿用上一次的结果
+def run_masscan_incremental(asn_number, scan_ports, rate=scheduler.DEFAULT_GLOBAL_RATE,
+                            verify_fraction=incremental.DEFAULT_VERIFY_FRACTION):
+    cidrs = get_cidr_ips(asn_number)
+    if not has_targets(asn_number, cidrs):
+        return None
+    previous_path = result_store.latest_result(asn_number, scan_ports)
+    previous = incremental.previous_intervals(previous_path) if previous_path else None
+    if previous is None:
+        print(f"No previous scan with prefix data for ASN {asn_number}, running a full scan.")
+        return run_masscan(asn_number, scan_ports, rate)
+
+    current = prefixes.cidrs_to_intervals(cidrs)
+    plan = incremental.plan_incremental(current, previous, verify_fraction)
+    print(incremental.format_plan(asn_number, plan))
+
+    output_dir = f"masscan_results/{asn_number}"
+    os.makedirs(output_dir, exist_ok=True)
+    output_file = os.path.join(output_dir, "scan_result.txt")
+    if os.path.exists(output_file):
+        os.remove(output_file)
+    start_time = time.time()
+    if plan["scan"]:
+        if not scan_ip_range(" ".join(prefixes.intervals_to_cidrs(plan["scan"])), output_file, scan_ports, rate,
+                             wait=ratecontrol.scan_wait(asn_number)):
+            return None
+    else:
+        # 前缀没有变化且不复查时不需要运行 masscan
+        open(output_file, 'w').close()
+    ports, ips, timestamps = masscan_parser.load_columns(output_file)
+    fresh_columns = {"ports": ports, "ips": ips, "timestamps": timestamps}
+    return incremental.write_merged(result_store.result_path(asn_number, scan_ports, start_time), previous_path,
+                                    current, plan, fresh_columns, asn_number, scan_ports, rate, start_time,
+                                    time.time(), cidrs)
+
+
+# 抽样扫描: 分层随机抽取地址, 样本量逐轮翻倍直到端口排名稳定, 结果文件头中保存估计值和置信区间
+def run_masscan_sampled(asn_number, scan_ports, rate=scheduler.DEFAULT_GLOBAL_RATE,
+                        initial_sample=sampling.DEFAULT_INITIAL_SAMPLE, max_fraction=sampling.DEFAULT_MAX_FRACTION,
+                        max_rounds=sampling.DEFAULT_MAX_ROUNDS):
+    cidrs = get_cidr_ips(asn_number)
+    if not has_targets(asn_number, cidrs):
+        return None
+    sampler = sampling.StratifiedSampler(prefixes.cidrs_to_intervals(cidrs))
+    port_list = masscan_parser.parse_port_spec(scan_ports)
+    max_sample = max(initial_sample, int(sampler.population * max_fraction))
+
+    output_dir = f"masscan_results/{asn_number}"
+    os.makedirs(output_dir, exist_ok=True)
+    targets_file = os.path.join(output_dir, "sample_targets.txt")
+    output_file = os.path.join(output_dir, "scan_result.txt")
+    start_time = time.time()
+    store_path = result_store.result_path(asn_number, scan_ports, start_time)
+    os.makedirs(os.path.dirname(store_path), exist_ok=True)
+    writer = result_store.ResultWriter(store_path, asn_number, scan_ports, rate, start_time, cidrs=cidrs)
+
+    all_ports, all_ips = [], []
+    estimates, previous_ranking = {}, None
+    target_size = min(initial_sample, sampler.population)
+    for round_index in range(max_rounds):
+        addresses = sampler.draw(target_size - sampler.size)
+        with open(targets_file, 'w') as file:
+            file.writelines(f"{result_store.int_to_ip(address)}\n" for address in addresses)
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        print(f"Sampling round {round_index + 1} for ASN {asn_number}: {len(addresses)} new addresses...")
+        if not scan_ip_range(None, output_file, scan_ports, rate, include_file=targets_file,
+                             wait=ratecontrol.scan_wait(asn_number)):
+            return None
+        ports, ips, timestamps = masscan_parser.load_columns(output_file)
+        writer.append(ports, ips, timestamps)
+        all_ports.append(ports)
+        all_ips.append(ips)
+
+        estimates = sampling.estimate(sampler, np.concatenate(all_ips), np.concatenate(all_ports), port_list)
+        print(sampling.format_estimates(asn_number, sampler, estimates))
+        current_ranking = sampling.ranking(estimates)
+        if current_ranking == previous_ranking or sampler.size >= min(max_sample, sampler.population):
+            break
+        previous_ranking = current_ranking
+        target_size = min(target_size * 2, max_sample, sampler.population)
+
+    # 只保存有命中的端口, 避免全端口扫描时文件头过大
+    saved = {str(port): value for port, value in estimates.items() if value[0] > 0}
+    return writer.close(sampled=True, sample_size=sampler.size, population=sampler.population,
+                        rank_stable=current_ranking == previous_ranking, estimates=saved)
+
+
+# 根据参数选择扫描方式: 抽样、增量、流式、分片可续跑或者一次性扫描
+# 给扫描函数加上 "scan" 阶段的计时, 地址数、探测数和结果数取自结果文件头
+def timed_scan(run_scan):
+    def run(asn_number, scan_ports, rate):
+        with metrics.phase("scan", asn=asn_number, ports=scan_ports) as counts:
+            store_path = run_scan(asn_number, scan_ports, rate)
+            if store_path is not None:
+                header = result_store.read_header(store_path)
+                if header.get("sampled"):
+                    addresses = header["sample_size"]
+                else:
+                    addresses = prefixes.count_addresses(prefixes.cidrs_to_intervals(header.get("cidrs") or []))
+                counts.update(addresses=addresses,
+                              probes=addresses * len(masscan_parser.parse_port_spec(scan_ports)),
+                              results=header["count"])
+                # 扫描器实际运行的时间 (不含前缀获取), 探测速率即实际达到的发包速率
+                scanner_seconds = (header.get("end_time") or 0) - (header.get("start_time") or 0)
+                if scanner_seconds > 0:
+                    counts["scanner_seconds"] = round(scanner_seconds, 4)
+                    for key in metrics.RATE_COUNTS:
+                        counts[f"{key}_per_second"] = round(counts[key] / scanner_seconds, 2)
+        return store_path
+    return run
+
+
+def select_scan_runner(streaming=False, shard_size=None, incremental_scan=False, sample=False):
+    if sample:
+        return run_masscan_sampled
+    if incremental_scan:
+        return run_masscan_incremental
+    if shard_size:
+        return lambda asn_number, scan_ports, rate: run_masscan_resumable(asn_number, scan_ports, rate, shard_size)
+    return run_masscan_streaming if streaming else run_masscan
+
+
+# 从列式结果文件统计端口, 抽样扫描的结果使用文件头中的估计值, 返回绘图任务
+# 结果文件可以是多个端口组合合并扫描的结果, 这里只统计 scan_ports 中的端口
+def collect_statistics(asn_number, scan_ports, store_path):
+    port_counts = defaultdict(int)
+    estimates = None
+    started_at = None
+    hosts = None
+    if store_path is not None:
+        header = result_store.read_header(store_path)
+        started_at = header["start_time"]
+        mask = None
+        if header["scan_ports"] != scan_ports:
+            mask = np.zeros(masscan_parser.PORT_SLOTS, dtype=bool)
+            mask[masscan_parser.parse_port_spec(scan_ports)] = True
+        with metrics.phase("statistics", asn=asn_number, ports=scan_ports) as counts:
+            counts["results"] = header["count"]
+            if header.get("sampled"):
+                estimates = {int(port): tuple(value) for port, value in header["estimates"].items()
+                             if mask is None or mask[int(port)]}
+                port_counts = defaultdict(int, {port: value[0] for port, value in estimates.items()})
+            elif fullrange.is_full_range(scan_ports):
+                # 全端口扫描: 精确的 65536 个端口计数以及不同主机数
+                summary = fullrange.count_store(store_path)
+                histogram = summary["counts"] if mask is None else np.where(mask, summary["counts"], 0)
+                port_counts = masscan_parser.histogram_to_dict(histogram)
+                hosts = {"count": round(summary["hosts"]), "method": summary["method"]}
+            else:
+                histogram = result_store.load_port_histogram(store_path)
+                port_counts = masscan_parser.histogram_to_dict(histogram if mask is None else
+                                                               np.where(mask, histogram, 0))
+    return {"asn": asn_number, "scan_ports": scan_ports, "port_counts": port_counts, "estimates": estimates,
+            "started_at": started_at, "hosts": hosts}
+
+
+def gen_statistics(asn_number, scan_ports, store_path):
+    publish_statistics([collect_statistics(asn_number, scan_ports, store_path)])
+
+
+# 把结果追加到历史数据, 然后在进程池中并行绘制一批 ASN 的分布图和最近 trend_runs 次运行的趋势图, 最后更新结果清单;
+# force=True 时即使输入没有变化也重新绘制
+def publish_statistics(jobs, max_workers=None, trend_runs=history.DEFAULT_TREND_RUNS, force=False):
+    trends = []
+    with metrics.phase("history"):
+        for job in jobs:
+            if not job["port_counts"]:
+                print(f"No successful scans to plot for ASN {job['asn']}.")
+                continue
+            if job.get("started_at") is not None:
+                history.record_run(job["asn"], job["scan_ports"], job["port_counts"], job["estimates"],
+                                   job["started_at"])
+            timestamps, series = history.recent_counts(job["asn"], job["scan_ports"], trend_runs)
+            trends.append({"kind": "trend", "asn": job["asn"], "scan_ports": job["scan_ports"],
+                           "timestamps": timestamps, "series": series})
+    with metrics.phase("render") as counts:
+        paths = render.render_charts(jobs + trends, max_workers, force)
+        counts["results"] = len(paths)
+    with metrics.phase("manifest"):
+        manifest.update_entries(jobs)
+    return paths
+
+
+# 最近一次包含 scan_ports 全部端口的结果文件; 没有同名的结果时, 可以是多个端口组合合并扫描的结果
+def latest_covering_result(asn_number, scan_ports):
+    store_path = result_store.latest_result(asn_number, scan_ports)
+    if store_path is not None:
+        return store_path
+    wanted = set(masscan_parser.parse_port_spec(scan_ports))
+    for path in reversed(result_store.list_results(asn_number)):
+        if wanted <= set(masscan_parser.parse_port_spec(result_store.read_header(path)["scan_ports"])):
+            return path
+    return None
+
+
+# 使用已保存的最近一次扫描结果重新绘图, 不需要重新扫描
+def replot_from_store(asn_numbers, scan_ports, max_workers=None, force=False):
+    jobs = []
+    for asn_number in scheduler.resolve_asns(asn_numbers):
+        store_path = latest_covering_result(asn_number, scan_ports)
+        if store_path is None:
+            print(f"No stored scan results for ASN {asn_number} with ports {scan_ports}. Skipping...")
+            continue
+        jobs.append(collect_statistics(asn_number, scan_ports, store_path))
+    return publish_statistics(jobs, max_workers, force=force)
+
+
+# 主函数, streaming=True 时边扫描边统计, 不再落地 -oL 文本文件;
+# shard_size 指定时按分片扫描, 可以在中断后续跑; incremental_scan=True 时只扫描变化的部分;
+# sample=True 时只扫描分层抽样的地址, 图表中的数值为估计值;
+# adaptive_rate=True 时先做速率校准, 以 rate 为上限选择不丢结果的最高速率, 并按 RTT 调整 --wait;
+# scan_ports 可以是端口参数、端口组合名或它们的列表, 多个组合合并成一次扫描后再分别统计;
+# render_workers 为绘图进程数, 默认为 CPU 核数
+def scan_and_genstatistics(asn_number, scan_ports, rate=scheduler.DEFAULT_GLOBAL_RATE, streaming=False,
+                           shard_size=None, incremental_scan=False, sample=False, adaptive_rate=False,
+                           render_workers=None):
+    specs = list(dict.fromkeys(port_profiles.resolve_profiles(scan_ports).values()))
+    scan_ports = port_profiles.union_spec(specs)
+    if adaptive_rate:
+        with metrics.phase("calibration", asn=asn_number):
+            profile = ratecontrol.rate_profile(asn_number, get_cidr_ips(asn_number), scan_ports, rate)
+        rate = min(rate, profile["rate"] or rate)
+    run_scan = timed_scan(select_scan_runner(streaming, shard_size, incremental_scan, sample))
+    store_path = run_scan(asn_number, scan_ports, rate)
+    publish_statistics([collect_statistics(asn_number, spec, store_path) for spec in specs], render_workers)
+
+
+# 并行扫描多个 ASN ("all" 表示 ASN_Map 中全部), 共享全局发包速率;
+# scan_ports 可以是端口参数、端口组合名或它们的列表: 端口取并集只扫描一遍, 统计、图表、密度和排名按组合分别生成
+def scan_asns(asns, scan_ports, global_rate=scheduler.DEFAULT_GLOBAL_RATE,
+              max_workers=scheduler.DEFAULT_MAX_WORKERS, streaming=False, shard_size=None,
+              incremental_scan=False, sample=False, enrich_services=False, enrich_max_per_port=None,
+              adaptive_rate=False, render_workers=None):
+    asns = scheduler.resolve_asns(asns)
+    profiles = port_profiles.resolve_profiles(scan_ports)
+    specs = list(dict.fromkeys(profiles.values()))
+    scan_ports = port_profiles.union_spec(specs)
+    if len(specs) > 1:
+        print(f"Scanning port profiles {', '.join(profiles)} in one pass with ports {scan_ports}")
+    # 先并发刷新所有 ASN 的前缀缓存
+    with metrics.phase("prefix_caches") as counts:
+        prefix_source.get_prefix_caches(asns)
+        counts["asns"] = len(asns)
+    jobs = []
+    for asn_number in asns:
+        addresses = scheduler.asn_address_count(asn_number)
+        if addresses is None:
+            # 不在 ASN_Map 中的 ASN 使用归一化后的前缀地址数
+            addresses = prefixes.count_addresses(prefixes.cidrs_to_intervals(get_cidr_ips(asn_number)))
+        jobs.append((asn_number, addresses))
+
+    # 自适应速率: 逐个校准, 每个 ASN 的速率不超过校准得到的速率, 全局速率可以放心调高
+    caps = None
+    if adaptive_rate:
+        with metrics.phase("calibration") as counts:
+            caps = ratecontrol.rate_caps({asn_number: get_cidr_ips(asn_number) for asn_number in asns}, scan_ports,
+                                         global_rate)
+            counts["asns"] = len(asns)
+
+    run_scan = timed_scan(select_scan_runner(streaming, shard_size, incremental_scan, sample))
+    store_paths = scheduler.run_scheduled(
+        jobs, lambda asn_number, rate: run_scan(asn_number, scan_ports, rate), global_rate, max_workers, caps)
+    publish_scan(asns, specs, scan_ports, store_paths, enrich_services, enrich_max_per_port, render_workers)
+
+
+# 扫描完成后的发布步骤: store_paths 为 {asn: 结果文件}, 结果文件按 scan_ports (各组合的并集) 扫描,
+# 按 specs 中的每个端口组合分别生成统计、图表和密度, 最后更新跨 ASN 排名; 多节点分片扫描合并后也走这里
+def publish_scan(asns, specs, scan_ports, store_paths, enrich_services=False, enrich_max_per_port=None,
+                 render_workers=None):
+    # 统计在主线程中完成, 绘图交给进程池
+    publish_statistics([collect_statistics(asn_number, spec, store_paths[asn_number])
+                        for spec in specs for asn_number in asns], render_workers)
+    # 每个前缀、每个 /24 的开放主机密度 (抽样结果不做)
+    for asn_number in asns:
+        store_path = store_paths[asn_number]
+        if store_path is not None and not result_store.read_header(store_path).get("sampled"):
+            for spec in specs:
+                with metrics.phase("density", asn=asn_number, ports=spec):
+                    density.publish_density(asn_number, spec, store_path)
+    # 可选: 对开放端口抓取 banner / HTTP 头 / TLS 证书, 按端口汇总服务类型
+    if enrich_services:
+        for asn_number in asns:
+            if store_paths[asn_number] is not None:
+                with metrics.phase("enrich", asn=asn_number):
+                    enrich.publish_services(asn_number, scan_ports, store_paths[asn_number], enrich_max_per_port)
+    # 所有已扫描 ASN 的跨 ASN 排名
+    for spec in specs:
+        with metrics.phase("ranking", ports=spec):
+            ranking.publish_ranking(spec)
+
+
+# 按 ASN 请求不同的端口组合: requests 为 [(asn, 组合名或端口参数), ...],
+# 请求相同组合集合的 ASN 作为一批调用 scan_asns, 每个 ASN 只扫描一遍
+def scan_batches(requests, **options):
+    for batch in port_profiles.plan_batches(requests):
+        print(f"Batch: ASNs {batch['asns']}, profiles {', '.join(batch['profiles'])}, ports {batch['scan_ports']}")
+        scan_asns(batch["asns"], list(batch["profiles"].values()), **options)
+
+
+# 根据结果清单生成 README, 不再遍历图片目录; 内容不变时不重写
+def refresh_markdown(results_dir: str):
+    with metrics.phase("readme"):
+        manifest.bootstrap(results_dir)
+        manifest.refresh_readme()
+
+
+def clear_folder(folder_path):
+    # 确保文件夹存在
+    if os.path.exists(folder_path):
+        # 遍历文件夹中的所有内容
+        for filename in os.listdir(folder_path):
+            file_path = os.path.join(folder_path, filename)
+            try:
+                # 如果是文件夹，则递归删除
+                if os.path.isdir(file_path):
+                    shutil.rmtree(file_path)
+                # 如果是文件，则直接删除
+                else:
+                    os.remove(file_path)
+            except Exception as e:
+                print(f'Error: {e}')
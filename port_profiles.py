@@ -0,0 +1,71 @@
+import fullrange
+import masscan_parser
+
+# 命名的端口组合, 以及批量扫描规划: 同一 ASN 请求的多个端口组合合并成一次扫描 (端口取并集),
+# 扫描后再按组合拆分统计和图表, 每个地址在一次运行中只探测一遍
+
+PORT_PROFILES = {
+    # Cloudflare 支持的 HTTP / HTTPS 端口
+    "cloudflare": "80,443,2052,2053,2082,2083,2086,2087,2095,2096,8080,8443,8880",
+    "web": "80,443,8000,8080,8443,8888",
+    "remote": "22,23,3389,5900",
+    "mail": "25,110,143,465,587,993,995",
+    "full": "0-65535",
+}
+DEFAULT_PROFILE = "cloudflare"
+
+
+# 组合名或端口参数 (可以是列表), 返回 {名称: 端口参数}; 不是已知名称的按端口参数处理, 名称即端口参数
+def resolve_profiles(profiles):
+    if isinstance(profiles, str):
+        profiles = [profiles]
+    resolved = {}
+    for profile in profiles:
+        resolved[profile] = PORT_PROFILES.get(profile, profile)
+    return resolved
+
+
+# 把端口列表压缩为 masscan 的端口参数, 连续端口写成区间
+def compact_spec(ports):
+    ports = sorted(set(ports))
+    parts = []
+    start = previous = None
+    for port in ports:
+        if previous is not None and port == previous + 1:
+            previous = port
+            continue
+        if start is not None:
+            parts.append(str(start) if start == previous else f"{start}-{previous}")
+        start = previous = port
+    if start is not None:
+        parts.append(str(start) if start == previous else f"{start}-{previous}")
+    return ",".join(parts)
+
+
+# 多个端口参数的并集; 只有一个不同的参数时原样返回, 结果文件、图表和历史数据的名称保持不变
+def union_spec(specs):
+    specs = list(dict.fromkeys(specs))
+    if len(specs) == 1:
+        return specs[0]
+    if any(fullrange.is_full_range(spec) for spec in specs):
+        ports = set(range(masscan_parser.PORT_SLOTS))
+        if not any(spec == fullrange.FULL_RANGES[0] for spec in specs) and all(
+                0 not in masscan_parser.parse_port_spec(spec) for spec in specs):
+            ports.discard(0)
+        return compact_spec(ports)
+    return compact_spec(port for spec in specs for port in masscan_parser.parse_port_spec(spec))
+
+
+# 批量规划: requests 为 [(asn, 组合名或端口参数), ...], 请求相同组合集合的 ASN 归为一批,
+# 返回 [{"scan_ports": 并集, "profiles": {名称: 端口参数}, "asns": [...]}, ...]
+def plan_batches(requests):
+    by_asn = {}
+    for asn_number, profile in requests:
+        by_asn.setdefault(str(asn_number), {}).update(resolve_profiles(profile))
+    batches = {}
+    for asn_number, profiles in by_asn.items():
+        key = tuple(sorted(profiles.items()))
+        batch = batches.setdefault(key, {"scan_ports": union_spec(profiles.values()), "profiles": profiles,
+                                         "asns": []})
+        batch["asns"].append(asn_number)
+    return list(batches.values())
@@ -0,0 +1,290 @@
+import gzip
+import ipaddress
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+
+import prefixes
+
+# 离线前缀索引: 从本地路由表导出文件 (CAIDA pfx2as 文本、bgpdump -m 文本或 MRT TABLE_DUMP_V2 RIB)
+# 构建 前缀 -> 起源 ASN 的有序区间索引, 保存为可 mmap 的文件,
+# 支持 "ASN X 的全部前缀" 和 "IP Y 属于哪个 ASN" 两种二分查找, 不需要逐个请求 bgpview
+
+MAGIC = b'OPRI'
+VERSION = 1
+PREAMBLE = struct.Struct('<4sII')
+HEADER_ALIGN = 16
+DEFAULT_INDEX_PATH = "asn/prefix_index.opri"
+# 索引中的数组, 依次写入文件
+ARRAYS = (
+    # 按 (asn, start) 排序的前缀表, 用于按 ASN 查前缀
+    ("prefix_asn", np.uint32),
+    ("prefix_start", np.uint32),
+    ("prefix_length", np.uint8),
+    # 按地址排序、互不重叠的基本区间, 每段记录最长匹配前缀的 ASN, 用于按 IP 查 ASN
+    ("segment_start", np.uint32),
+    ("segment_end", np.uint32),
+    ("segment_asn", np.uint32),
+)
+
+# MRT 类型常量
+MRT_TABLE_DUMP_V2 = 13
+RIB_IPV4_UNICAST = 2
+ATTR_AS_PATH = 2
+AS_SEQUENCE = 2
+
+
+def _open_text(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, 'rt')
+    return open(path, 'r')
+
+
+def _origin(as_path_field):
+    # AS 集合 {a,b} 取第一个, 路径取最后一个
+    origin = as_path_field.split()[-1] if as_path_field.split() else ""
+    origin = origin.strip("{}").split(",")[0].split("_")[0]
+    return int(origin) if origin.isdigit() else None
+
+
+# 解析 CAIDA pfx2as 格式 "1.0.0.0\t24\t13335" 或 bgpdump -m 格式
+# "TABLE_DUMP2|ts|B|peer_ip|peer_as|prefix|as_path|..."
+def iter_text_routes(path):
+    with _open_text(path) as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if '|' in line:
+                fields = line.split('|')
+                if len(fields) < 7 or ':' in fields[5]:
+                    continue
+                network, length = fields[5].split('/')
+                origin = _origin(fields[6])
+            else:
+                fields = line.split()
+                if len(fields) < 3 or ':' in fields[0]:
+                    continue
+                network, length = fields[0], fields[1]
+                origin = _origin(fields[2])
+            if origin is not None:
+                yield network, int(length), origin
+
+
+def _as_path_origin(attributes, as4):
+    offset = 0
+    while offset + 3 <= len(attributes):
+        flags, attr_type = attributes[offset], attributes[offset + 1]
+        if flags & 0x10:
+            length = struct.unpack_from('>H', attributes, offset + 2)[0]
+            offset += 4
+        else:
+            length = attributes[offset + 2]
+            offset += 3
+        value = attributes[offset:offset + length]
+        offset += length
+        if attr_type != ATTR_AS_PATH:
+            continue
+        origin = None
+        width = 4 if as4 else 2
+        position = 0
+        while position + 2 <= len(value):
+            segment_type, count = value[position], value[position + 1]
+            position += 2
+            numbers = [int.from_bytes(value[position + i * width:position + (i + 1) * width], 'big')
+                       for i in range(count)]
+            position += count * width
+            if numbers:
+                origin = numbers[-1] if segment_type == AS_SEQUENCE else numbers[0]
+        return origin
+    return None
+
+
+# 解析 MRT TABLE_DUMP_V2 的 RIB_IPV4_UNICAST 记录 (RFC 6396), 每个前缀取第一条路由的起源 ASN
+def iter_mrt_routes(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    header = struct.Struct('>IHHI')
+    with opener(path, 'rb') as file:
+        while True:
+            raw = file.read(header.size)
+            if len(raw) < header.size:
+                break
+            _, mrt_type, subtype, length = header.unpack(raw)
+            body = file.read(length)
+            if mrt_type != MRT_TABLE_DUMP_V2 or subtype != RIB_IPV4_UNICAST:
+                continue
+            prefix_length = body[4]
+            prefix_bytes = (prefix_length + 7) // 8
+            network = ipaddress.IPv4Address(body[5:5 + prefix_bytes].ljust(4, b'\0'))
+            offset = 5 + prefix_bytes
+            entry_count = struct.unpack_from('>H', body, offset)[0]
+            offset += 2
+            if entry_count == 0:
+                continue
+            # 第一条 RIB entry: peer index(2) + originated time(4) + attribute length(2) + attributes
+            attribute_length = struct.unpack_from('>H', body, offset + 6)[0]
+            attributes = body[offset + 8:offset + 8 + attribute_length]
+            origin = _as_path_origin(attributes, as4=True)
+            if origin is not None:
+                yield str(network), prefix_length, origin
+
+
+# MRT 文件头: timestamp(4) type(2) subtype(2) length(4)
+def _is_mrt(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, 'rb') as file:
+        head = file.read(12)
+    return len(head) == 12 and struct.unpack('>IHH', head[:8])[1] == MRT_TABLE_DUMP_V2
+
+
+def iter_routes(path):
+    return iter_mrt_routes(path) if _is_mrt(path) else iter_text_routes(path)
+
+
+# 把有序前缀区间压平成互不重叠的基本区间, 每段归属于覆盖它的最长 (最具体) 前缀
+def _flatten(starts, ends, asns):
+    order = np.lexsort((-ends, starts))
+    segment_start, segment_end, segment_asn = [], [], []
+    stack = []  # (end, asn)
+    cursor = None
+
+    def emit(until):
+        nonlocal cursor
+        while stack and cursor is not None and cursor <= until:
+            end, asn_number = stack[-1]
+            stop = min(end, until)
+            if cursor <= stop:
+                segment_start.append(cursor)
+                segment_end.append(stop)
+                segment_asn.append(asn_number)
+                cursor = stop + 1
+            if cursor > end:
+                stack.pop()
+
+    for index in order.tolist():
+        start, end, asn_number = int(starts[index]), int(ends[index]), int(asns[index])
+        if cursor is not None:
+            emit(start - 1)
+        while stack and stack[-1][0] < start:
+            stack.pop()
+        stack.append((end, asn_number))
+        cursor = start
+    if stack:
+        emit(stack[0][0])
+    return segment_start, segment_end, segment_asn
+
+
+def build_index(routes):
+    seen = {}
+    for network, length, origin in routes:
+        start, _ = prefixes.cidr_to_interval(f"{network}/{length}")
+        seen[(start, length)] = origin
+    keys = sorted(seen)
+    starts = np.array([start for start, _ in keys], dtype=np.int64)
+    lengths = np.array([length for _, length in keys], dtype=np.int64)
+    asns = np.array([seen[key] for key in keys], dtype=np.int64)
+    ends = starts + (1 << (32 - lengths)) - 1
+
+    by_asn = np.lexsort((starts, asns))
+    segment_start, segment_end, segment_asn = _flatten(starts, ends, asns)
+    return {
+        "prefix_asn": asns[by_asn],
+        "prefix_start": starts[by_asn],
+        "prefix_length": lengths[by_asn],
+        "segment_start": np.array(segment_start, dtype=np.int64),
+        "segment_end": np.array(segment_end, dtype=np.int64),
+        "segment_asn": np.array(segment_asn, dtype=np.int64),
+    }
+
+
+def save_index(path, index, source=None):
+    header = {"source": source, "counts": {name: int(len(index[name])) for name, _ in ARRAYS}}
+    body = json.dumps(header, sort_keys=True).encode()
+    body += b' ' * (-(PREAMBLE.size + len(body)) % HEADER_ALIGN)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as file:
+        file.write(PREAMBLE.pack(MAGIC, VERSION, len(body)))
+        file.write(body)
+        for name, dtype in ARRAYS:
+            data = np.asarray(index[name], dtype=dtype).tobytes()
+            file.write(data)
+            # 每个数组按 4 字节对齐, 便于 memmap
+            file.write(b'\0' * (-len(data) % 4))
+    os.replace(tmp_path, path)
+    return path
+
+
+# 以只读 mmap 方式加载索引, 不会把整个文件读入内存
+class PrefixIndex:
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        with open(path, 'rb') as file:
+            magic, version, header_len = PREAMBLE.unpack(file.read(PREAMBLE.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a prefix index file")
+            self.header = json.loads(file.read(header_len))
+        offset = PREAMBLE.size + header_len
+        self.path = path
+        for name, dtype in ARRAYS:
+            count = self.header["counts"][name]
+            # 转成普通 ndarray 视图, 避免 memmap 子类在单次查询时的额外开销
+            array = np.asarray(np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(count,))) if count \
+                else np.empty(0, dtype=dtype)
+            setattr(self, name, array)
+            size = count * np.dtype(dtype).itemsize
+            offset += size + (-size % 4)
+
+    # ASN 的全部前缀 (二分查找 prefix_asn 得到连续区段)
+    def prefixes_for(self, asn_number):
+        # 查询值与数组同为 uint32, 否则 searchsorted 会先把整个数组转换类型
+        asn_number = np.uint32(asn_number)
+        left = np.searchsorted(self.prefix_asn, asn_number, side='left')
+        right = np.searchsorted(self.prefix_asn, asn_number, side='right')
+        return [f"{ipaddress.IPv4Address(int(start))}/{int(length)}"
+                for start, length in zip(self.prefix_start[left:right], self.prefix_length[left:right])]
+
+    # IP 所属的 ASN (最长前缀匹配), 没有路由时返回 None
+    def asn_for(self, ip):
+        value = np.uint32(int(ipaddress.IPv4Address(ip)))
+        position = np.searchsorted(self.segment_start, value, side='right') - 1
+        if position < 0 or value > self.segment_end[position]:
+            return None
+        return int(self.segment_asn[position])
+
+    # 批量查询 uint32 IP 数组, 没有路由的位置为 0
+    def asns_for(self, ips):
+        ips = np.asarray(ips, dtype=np.uint32)
+        position = np.searchsorted(self.segment_start, ips, side='right') - 1
+        clipped = np.maximum(position, 0)
+        found = (position >= 0) & (ips <= self.segment_end[clipped])
+        return np.where(found, self.segment_asn[clipped], 0)
+
+    def asns(self):
+        return np.unique(self.prefix_asn).tolist()
+
+
+# 按 asn/<n> 缓存的格式返回前缀, 供 get_cidr_ips 使用
+def prefix_cache_from_index(asn_number, index_path=DEFAULT_INDEX_PATH):
+    raw = PrefixIndex(index_path).prefixes_for(asn_number)
+    cache = {"raw": raw}
+    cache.update(prefixes.normalize_cidrs(raw))
+    cache["meta"] = {"source": index_path}
+    return cache
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python prefix_index.py <pfx2as|bgpdump -m|MRT RIB file> [index path]")
+        sys.exit(1)
+    source = sys.argv[1]
+    path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_INDEX_PATH
+    index = build_index(iter_routes(source))
+    save_index(path, index, source)
+    print(f"Built prefix index {path}: {len(index['prefix_asn'])} prefixes, "
+          f"{len(np.unique(index['prefix_asn']))} ASNs, {len(index['segment_start'])} segments")
+
+
+if __name__ == "__main__":
+    main()
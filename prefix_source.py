@@ -0,0 +1,173 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import prefix_index
+import prefixes
+
+# ASN 前缀数据源: 通过连接池并发获取多个 ASN 的前缀, 失败自动重试 (指数退避),
+# asn/<n> 缓存带有过期时间和获取信息, 过期后用 ETag / Last-Modified 做条件请求;
+# 存在本地离线索引 (见 prefix_index.py) 时优先从索引读取, 索引中没有的 ASN 仍请求 bgpview;
+# requests 在第一次需要联网时才导入, 缓存有效或使用离线索引时不加载
+
+BGPVIEW_URL = "https://api.bgpview.io"
+ASN_DIR = "asn"
+# 缓存有效期 7 天
+DEFAULT_TTL = 7 * 24 * 3600
+# 刷新失败后旧缓存的有效期 1 小时: 同一次运行中后续的读取 (扫描、校准、分片计划) 不再重复请求和退避
+FAILED_REFRESH_TTL = 3600
+DEFAULT_MAX_WORKERS = 8
+# (连接超时, 读取超时)
+REQUEST_TIMEOUT = (5, 30)
+HEADERS = {
+    "User-Agent": "curl/7.68.0"
+}
+
+
+# 带连接池和重试的 Session, 429/5xx 会按 Retry-After 或指数退避重试
+def make_session(pool_size=DEFAULT_MAX_WORKERS, retries=5, backoff_factor=1.0):
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=("GET",), respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def cache_path(asn_number, asn_dir=ASN_DIR):
+    return os.path.join(asn_dir, f"{asn_number}")
+
+
+# 缓存是否在有效期内; 没有获取信息的旧缓存视为过期
+def is_fresh(cache, ttl=DEFAULT_TTL, now=None):
+    meta = cache.get("meta")
+    if not meta:
+        return False
+    now = now if now is not None else time.time()
+    return now - meta.get("checked_at", meta.get("fetched_at", 0)) < meta.get("ttl", ttl)
+
+
+def load_cached(asn_number, asn_dir=ASN_DIR):
+    file_path = cache_path(asn_number, asn_dir)
+    if not os.path.exists(file_path):
+        return None
+    return prefixes.read_prefix_cache(file_path)
+
+
+# 请求一个 ASN 的前缀; 已有缓存时带上条件请求头, 304 时只刷新检查时间
+def fetch_prefixes(session, asn_number, cache=None, base_url=BGPVIEW_URL, ttl=DEFAULT_TTL, asn_dir=ASN_DIR):
+    url = f"{base_url}/asn/{asn_number}/prefixes"
+    headers = {}
+    meta = (cache or {}).get("meta") or {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    response = session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+    now = time.time()
+    file_path = cache_path(asn_number, asn_dir)
+    if response.status_code == 304 and cache is not None:
+        cache["meta"] = dict(meta, checked_at=now, ttl=ttl)
+        prefixes.save_prefix_cache(file_path, cache)
+        print(f"CIDR data for ASN {asn_number} not modified, cache refreshed.")
+        return cache
+
+    response.raise_for_status()
+    data = response.json()
+    cidrs = [prefix['prefix'] for prefix in data['data']['ipv4_prefixes']]
+    new_meta = {
+        "source": url,
+        "fetched_at": now,
+        "checked_at": now,
+        "ttl": ttl,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+    cache = prefixes.write_prefix_cache(file_path, cidrs, new_meta)
+    print(f"CIDR data for ASN {asn_number} fetched from API and saved to file.")
+    return cache
+
+
+# 使用离线索引: 显式传入的路径, 或者默认位置存在索引文件时
+def resolve_index_path(index_path=None):
+    if index_path:
+        return index_path
+    return prefix_index.DEFAULT_INDEX_PATH if os.path.exists(prefix_index.DEFAULT_INDEX_PATH) else None
+
+
+# 从离线索引读取前缀并写入 asn/<n> 缓存 (内容不变时不重写), 之后的流程与 API 获取的一致;
+# 索引中没有该 ASN 的前缀时返回 None, 由调用方改用 API 或已有缓存
+def load_from_index(asn_number, index_path, asn_dir=ASN_DIR):
+    cache = prefix_index.prefix_cache_from_index(asn_number, index_path)
+    if not cache["raw"]:
+        print(f"ASN {asn_number} has no prefixes in offline index {index_path}, falling back to bgpview.")
+        return None
+    cache["meta"]["fetched_at"] = cache["meta"]["checked_at"] = os.path.getmtime(index_path)
+    if load_cached(asn_number, asn_dir) != cache:
+        prefixes.save_prefix_cache(cache_path(asn_number, asn_dir), cache)
+    print(f"CIDR data for ASN {asn_number} loaded from offline index {index_path}.")
+    return cache
+
+
+# 通过 bgpview 获取单个 ASN 的前缀: 缓存有效时直接使用, 过期则刷新, 刷新失败时退回旧缓存,
+# 并把旧缓存标记为在 FAILED_REFRESH_TTL 内有效, 避免每次读取都重新经历重试退避
+def get_api_prefix_cache(asn_number, session=None, base_url=BGPVIEW_URL, ttl=DEFAULT_TTL, asn_dir=ASN_DIR,
+                         force=False):
+    cache = load_cached(asn_number, asn_dir)
+    if cache is not None and not force and is_fresh(cache, ttl):
+        print(f"CIDR data for ASN {asn_number} loaded from file.")
+        return cache
+    import requests
+    session = session or make_session(pool_size=1)
+    try:
+        return fetch_prefixes(session, asn_number, cache, base_url, ttl, asn_dir)
+    except (requests.RequestException, KeyError, ValueError) as e:
+        if cache is None:
+            raise
+        print(f"Refreshing CIDR data for ASN {asn_number} failed ({e}), using cached data.")
+        cache["meta"] = dict(cache.get("meta") or {}, checked_at=time.time(), ttl=FAILED_REFRESH_TTL,
+                             refresh_error=str(e))
+        prefixes.save_prefix_cache(cache_path(asn_number, asn_dir), cache)
+        return cache
+
+
+# 获取单个 ASN 的前缀: 优先使用离线索引, 索引中没有该 ASN 时走 bgpview / 缓存
+def get_prefix_cache(asn_number, session=None, base_url=BGPVIEW_URL, ttl=DEFAULT_TTL, asn_dir=ASN_DIR,
+                     force=False, index_path=None):
+    os.makedirs(asn_dir, exist_ok=True)
+    index_path = resolve_index_path(index_path)
+    cache = load_from_index(asn_number, index_path, asn_dir) if index_path else None
+    if cache is not None:
+        return cache
+    return get_api_prefix_cache(asn_number, session, base_url, ttl, asn_dir, force)
+
+
+# 并发获取多个 ASN 的前缀, 离线索引中没有的 ASN 共用一个连接池请求 bgpview, 返回 {asn: cache}
+def get_prefix_caches(asns, base_url=BGPVIEW_URL, ttl=DEFAULT_TTL, asn_dir=ASN_DIR,
+                      max_workers=DEFAULT_MAX_WORKERS, force=False, index_path=None):
+    asns = list(asns)
+    if not asns:
+        return {}
+    os.makedirs(asn_dir, exist_ok=True)
+    caches = {}
+    index_path = resolve_index_path(index_path)
+    if index_path:
+        for asn_number in asns:
+            cache = load_from_index(asn_number, index_path, asn_dir)
+            if cache is not None:
+                caches[asn_number] = cache
+    missing = [asn_number for asn_number in asns if asn_number not in caches]
+    if missing:
+        session = make_session(pool_size=max_workers)
+        with session, ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as executor:
+            futures = {asn_number: executor.submit(get_api_prefix_cache, asn_number, session, base_url, ttl, asn_dir,
+                                                   force)
+                       for asn_number in missing}
+            caches.update((asn_number, future.result()) for asn_number, future in futures.items())
+    return {asn_number: caches[asn_number] for asn_number in asns}
@@ -0,0 +1,193 @@
+import bisect
+import ipaddress
+import json
+import os
+
+import numpy as np
+
+
+# CIDR 前缀归一化: 把 bgpview 返回的前缀列表转换为有序、不重叠的整数区间,
+# 再还原成最小覆盖的 CIDR 集合, 避免 masscan 重复探测同一地址
+
+
+# 将单个 CIDR 转换为闭区间 (start, end)
+def cidr_to_interval(cidr):
+    network = ipaddress.ip_network(cidr, strict=False)
+    return int(network.network_address), int(network.broadcast_address)
+
+
+# 排序并合并重叠或相邻的区间, 返回不重叠的有序区间列表
+def merge_intervals(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+# 将区间还原为最少数量的 CIDR
+def intervals_to_cidrs(intervals):
+    cidrs = []
+    for start, end in intervals:
+        networks = ipaddress.summarize_address_range(ipaddress.IPv4Address(start), ipaddress.IPv4Address(end))
+        cidrs.extend(str(network) for network in networks)
+    return cidrs
+
+
+def cidrs_to_intervals(cidrs):
+    return merge_intervals(cidr_to_interval(cidr) for cidr in cidrs)
+
+
+def count_addresses(intervals):
+    return sum(end - start + 1 for start, end in intervals)
+
+
+# 归一化前缀列表, 同时统计请求地址数与去重后的地址数
+def normalize_cidrs(cidrs):
+    raw_intervals = [cidr_to_interval(cidr) for cidr in cidrs]
+    intervals = merge_intervals(raw_intervals)
+    return {
+        "normalized": intervals_to_cidrs(intervals),
+        "requested_addresses": count_addresses(raw_intervals),
+        "unique_addresses": count_addresses(intervals),
+    }
+
+
+def format_normalize_report(asn, raw_cidrs, prefix_info):
+    requested = prefix_info["requested_addresses"]
+    unique = prefix_info["unique_addresses"]
+    duplicated = requested - unique
+    ratio = duplicated / requested * 100 if requested else 0.0
+    return (f"ASN {asn}: {len(raw_cidrs)} prefixes -> {len(prefix_info['normalized'])} normalized, "
+            f"requested {requested} addresses, unique {unique} ({duplicated} duplicated, {ratio:.1f}%)")
+
+
+# 写入 asn/<n> 缓存文件: 同时保存原始前缀、归一化后的前缀和获取信息 (meta)
+def write_prefix_cache(file_path, raw_cidrs, meta=None):
+    prefix_info = normalize_cidrs(raw_cidrs)
+    cache = {"raw": raw_cidrs}
+    cache.update(prefix_info)
+    if meta is not None:
+        cache["meta"] = meta
+    save_prefix_cache(file_path, cache)
+    return cache
+
+
+# 先写临时文件再替换, 并发刷新时不会读到写了一半的缓存
+def save_prefix_cache(file_path, cache):
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(cache, file)
+    os.replace(tmp_path, file_path)
+
+
+# 读取 asn/<n> 缓存文件, 旧格式 (纯列表) 会被转换为新格式并回写
+def read_prefix_cache(file_path):
+    with open(file_path, 'r') as file:
+        cache = json.load(file)
+    if isinstance(cache, list):
+        cache = write_prefix_cache(file_path, cache)
+    return cache
+
+
+# 把有序区间按地址数切分为若干分片, 每个分片最多 shard_size 个地址, 分片顺序固定
+def split_intervals(intervals, shard_size):
+    shards = []
+    current = []
+    current_size = 0
+    for start, end in intervals:
+        while start <= end:
+            take = min(end - start + 1, shard_size - current_size)
+            current.append((start, start + take - 1))
+            current_size += take
+            start += take
+            if current_size == shard_size:
+                shards.append(current)
+                current = []
+                current_size = 0
+    if current:
+        shards.append(current)
+    return shards
+
+
+# 把有序区间按地址数均分为 shard_count 份, 返回第 index 份 (从 0 开始); 只由区间决定,
+# 各份互不重叠、合起来正好覆盖全部地址, 地址数最多相差 1
+def shard_intervals(intervals, shard_count, index):
+    total = count_addresses(intervals)
+    low = total * index // shard_count
+    high = total * (index + 1) // shard_count
+    shard = []
+    offset = 0
+    for start, end in intervals:
+        size = end - start + 1
+        first = max(low, offset)
+        last = min(high, offset + size)
+        if first < last:
+            shard.append((start + first - offset, start + last - offset - 1))
+        offset += size
+        if offset >= high:
+            break
+    return shard
+
+
+# 区间差集: a 中不被 b 覆盖的部分 (a、b 都是有序不重叠区间)
+def subtract_intervals(a, b):
+    result = []
+    j = 0
+    for start, end in a:
+        while j < len(b) and b[j][1] < start:
+            j += 1
+        k = j
+        while start <= end and k < len(b) and b[k][0] <= end:
+            if b[k][0] > start:
+                result.append((start, b[k][0] - 1))
+            start = max(start, b[k][1] + 1)
+            k += 1
+        if start <= end:
+            result.append((start, end))
+    return result
+
+
+# 区间交集
+def intersect_intervals(a, b):
+    result = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        start = max(a[i][0], b[j][0])
+        end = min(a[i][1], b[j][1])
+        if start <= end:
+            result.append((start, end))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+# 向量化判断一组 uint32 IP 是否落在区间内 (二分查找)
+def ips_in_intervals(intervals, ips):
+    if not intervals:
+        return np.zeros(len(ips), dtype=bool)
+    starts = np.array([start for start, _ in intervals], dtype=np.int64)
+    ends = np.array([end for _, end in intervals], dtype=np.int64)
+    index = np.searchsorted(starts, ips, side='right') - 1
+    return (index >= 0) & (ips <= ends[np.maximum(index, 0)])
+
+
+# 从区间中随机抽取一部分地址块 (每块 block_size 个地址), 返回合并后的区间
+def sample_blocks(intervals, fraction, block_size, rng):
+    block_counts = [(end - start) // block_size + 1 for start, end in intervals]
+    offsets = [0]
+    for count in block_counts:
+        offsets.append(offsets[-1] + count)
+    total = offsets[-1]
+    picks = rng.sample(range(total), min(total, max(1, round(total * fraction)))) if total else []
+    blocks = []
+    for pick in picks:
+        index = bisect.bisect_right(offsets, pick) - 1
+        start = intervals[index][0] + (pick - offsets[index]) * block_size
+        blocks.append((start, min(start + block_size - 1, intervals[index][1])))
+    return merge_intervals(blocks)
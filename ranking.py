@@ -0,0 +1,216 @@
+import csv
+import io
+import json
+import os
+import sys
+
+import numpy as np
+
+import asn
+import manifest
+import prefix_source
+import render
+import scheduler
+
+# 跨 ASN 端口排名: 把所有已扫描 ASN 的端口计数放进一个 ASN × 端口 矩阵,
+# 按 ASN 的地址数归一化 (每个 /24 的开放数), 计算排名、每个 ASN 和全局的前 N 个端口,
+# 输出热力图以及 JSON / CSV 排名表; 全部计算都是矩阵运算, 没有逐格的 Python 循环
+
+RANKING_DIR = os.path.join(render.RESULTS_DIR, "ranking")
+DEFAULT_TOP_N = 10
+# 热力图中展示的全局端口数
+HEATMAP_PORTS = 30
+
+
+def ranking_paths(scan_ports, ranking_dir=RANKING_DIR):
+    return {
+        "json": os.path.join(ranking_dir, f"ranking_{scan_ports}.json"),
+        "csv": os.path.join(ranking_dir, f"ranking_{scan_ports}.csv"),
+        "heatmap": os.path.join(ranking_dir, f"heatmap_{scan_ports}.png"),
+    }
+
+
+def asn_name(asn_number):
+    value = asn.ASN_Map.get(str(asn_number))
+    return value.rsplit(',', 1)[0] if value else f"AS{asn_number}"
+
+
+# ASN 的地址数: 取归一化后的前缀缓存 (asn/<n>) 中的去重地址数, 不在 ASN_Map 中的 ASN (例如来自离线索引) 也有;
+# 没有前缀缓存时退回 ASN_Map 中记录的地址数, 都没有时返回 None
+def address_count(asn_number):
+    cache = prefix_source.load_cached(asn_number)
+    if cache is not None and cache.get("unique_addresses"):
+        return cache["unique_addresses"]
+    return scheduler.asn_address_count(asn_number)
+
+
+# 从结果清单读取同一端口参数的所有 ASN, 返回 (asns, ports, counts 矩阵, 地址数)
+# 矩阵只包含至少在一个 ASN 中出现过的端口列, 全端口扫描时也不会分配 ASN × 65536 的稠密矩阵;
+# 无法得到地址数的 ASN 不能归一化, 输出警告后不参与排名
+def load_matrix(scan_ports, manifest_path=manifest.MANIFEST_PATH):
+    entries = []
+    address_counts = []
+    for entry in manifest.load_manifest(manifest_path)["entries"].values():
+        if entry["scan_ports"] != scan_ports or not entry.get("counts"):
+            continue
+        count = address_count(entry["asn"])
+        if not count:
+            print(f"Warning: no address count for ASN {entry['asn']} (no prefix cache in {prefix_source.ASN_DIR}/ "
+                  f"and not in ASN_Map), left out of the {scan_ports} ranking.", file=sys.stderr)
+            continue
+        entries.append(entry)
+        address_counts.append(count)
+    order = sorted(range(len(entries)), key=lambda index: entries[index]["asn"])
+    entries = [entries[index] for index in order]
+    asns = [entry["asn"] for entry in entries]
+    addresses = np.array([address_counts[index] for index in order], dtype=np.float64)
+    if not entries:
+        return asns, np.zeros(0, dtype=np.int64), np.zeros((0, 0)), addresses
+
+    # 全端口扫描的条目在清单中只有前若干个端口, 完整计数从 CSV 读取
+    entry_counts = [manifest.entry_counts(entry) for entry in entries]
+    lengths = [len(port_counts) for port_counts in entry_counts]
+    rows = np.repeat(np.arange(len(entries)), lengths)
+    cell_ports = np.fromiter((int(port) for port_counts in entry_counts for port in port_counts), dtype=np.int64,
+                             count=sum(lengths))
+    values = np.fromiter((count for port_counts in entry_counts for count in port_counts.values()),
+                         dtype=np.float64, count=sum(lengths))
+    ports, columns = np.unique(cell_ports, return_inverse=True)
+    counts = np.zeros((len(entries), ports.size), dtype=np.float64)
+    counts[rows, columns] = values
+    return asns, ports, counts, addresses
+
+
+# 每行按值从大到小排名 (1 开始, 相同值按列顺序)
+def _ranks(values, axis):
+    order = np.argsort(-values, axis=axis, kind='stable')
+    ranks = np.empty_like(order)
+    shape = [1, 1]
+    shape[axis] = values.shape[axis]
+    np.put_along_axis(ranks, order, np.arange(1, values.shape[axis] + 1).reshape(shape), axis=axis)
+    return ranks
+
+
+def _top(values, top_n):
+    # 每行前 top_n 个列下标, argpartition 后只对这 top_n 个排序
+    top_n = min(top_n, values.shape[1])
+    if top_n == 0:
+        return np.zeros((values.shape[0], 0), dtype=np.int64)
+    part = np.argpartition(-values, top_n - 1, axis=1)[:, :top_n]
+    order = np.argsort(-np.take_along_axis(values, part, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(part, order, axis=1)
+
+
+def compute_ranking(asns, ports, counts, addresses, top_n=DEFAULT_TOP_N):
+    blocks = addresses / 256
+    # 每个 /24 的开放端口数
+    rate = counts / blocks[:, None]
+    totals = counts.sum(axis=1)
+    port_totals = counts.sum(axis=0)
+    global_rate = port_totals / blocks.sum()
+    port_rank_in_asn = _ranks(counts, axis=1)
+    asn_rank_for_port = _ranks(rate, axis=0)
+    asn_order = np.argsort(-(totals / blocks), kind='stable')
+    top_in_asn = _top(counts, top_n)
+    top_global = _top(global_rate[None, :], top_n)[0]
+    return {
+        "asns": asns, "ports": ports, "counts": counts, "addresses": addresses, "rate": rate,
+        "totals": totals, "port_totals": port_totals, "global_rate": global_rate,
+        "port_rank_in_asn": port_rank_in_asn, "asn_rank_for_port": asn_rank_for_port,
+        "asn_order": asn_order, "top_in_asn": top_in_asn, "top_global": top_global,
+    }
+
+
+def ranking_table(result, scan_ports):
+    asns, ports, counts, rate = result["asns"], result["ports"], result["counts"], result["rate"]
+    blocks = result["addresses"] / 256
+    asn_rows = []
+    for position, row in enumerate(result["asn_order"].tolist()):
+        asn_rows.append({
+            "rank": position + 1,
+            "asn": asns[row],
+            "name": asn_name(asns[row]),
+            "addresses": int(result["addresses"][row]),
+            "total": float(result["totals"][row]),
+            "per_24": float(result["totals"][row] / blocks[row]),
+            "top_ports": [{"port": int(ports[column]), "count": float(counts[row, column]),
+                           "per_24": float(rate[row, column])}
+                          for column in result["top_in_asn"][row].tolist() if counts[row, column] > 0],
+        })
+    present = (counts > 0).sum(axis=0)
+    global_rows = [{"rank": position + 1, "port": int(ports[column]), "count": float(result["port_totals"][column]),
+                    "per_24": float(result["global_rate"][column]), "asns": int(present[column])}
+                   for position, column in enumerate(result["top_global"].tolist())]
+    return {"scan_ports": scan_ports, "asns": asn_rows, "global": global_rows}
+
+
+def ranking_csv(result):
+    asns, ports = result["asns"], result["ports"]
+    rows, columns = np.nonzero(result["counts"])
+    with io.StringIO(newline='') as file:
+        writer = csv.writer(file, lineterminator='\n')
+        writer.writerow(["asn", "name", "addresses", "port", "count", "per_24", "port_rank_in_asn",
+                         "asn_rank_for_port"])
+        names = [asn_name(asn_number) for asn_number in asns]
+        writer.writerows(zip(
+            (asns[row] for row in rows.tolist()),
+            (names[row] for row in rows.tolist()),
+            result["addresses"][rows].astype(np.int64).tolist(),
+            ports[columns].tolist(),
+            result["counts"][rows, columns].tolist(),
+            np.round(result["rate"][rows, columns], 6).tolist(),
+            result["port_rank_in_asn"][rows, columns].tolist(),
+            result["asn_rank_for_port"][rows, columns].tolist()))
+        return file.getvalue()
+
+
+def write_csv(path, result):
+    return manifest.write_if_changed(path, ranking_csv(result))
+
+
+# 终端输出的排名表: ASN 排名 (每个 /24 的开放数) 和全局前 N 个端口
+def ranking_text(table):
+    lines = [f"Ports {table['scan_ports']}: {len(table['asns'])} ASNs", "",
+             f"{'rank':>4}  {'asn':<8} {'name':<32} {'addresses':>12} {'total':>12} {'per /24':>9}  top ports"]
+    for row in table["asns"]:
+        top_ports = ", ".join(f"{item['port']}({item['count']:.0f})" for item in row["top_ports"])
+        lines.append(f"{row['rank']:>4}  {row['asn']:<8} {row['name'][:32]:<32} {row['addresses']:>12} "
+                     f"{row['total']:>12.0f} {row['per_24']:>9.3f}  {top_ports}")
+    lines += ["", f"{'rank':>4}  {'port':>5} {'count':>12} {'per /24':>9} {'asns':>5}"]
+    lines.extend(f"{row['rank']:>4}  {row['port']:>5} {row['count']:>12.0f} {row['per_24']:>9.3f} {row['asns']:>5}"
+                 for row in table["global"])
+    return "\n".join(lines) + "\n"
+
+
+# 从结果清单计算排名, 返回 (矩阵运算结果, 排名表), 没有可排名的 ASN 时返回 None
+def load_ranking(scan_ports, top_n=DEFAULT_TOP_N, manifest_path=manifest.MANIFEST_PATH):
+    asns, ports, counts, addresses = load_matrix(scan_ports, manifest_path)
+    if not asns:
+        return None
+    result = compute_ranking(asns, ports, counts, addresses, top_n)
+    return result, ranking_table(result, scan_ports)
+
+
+# 生成排名表和热力图, 返回输出文件路径
+def publish_ranking(scan_ports, top_n=DEFAULT_TOP_N, heatmap_ports=HEATMAP_PORTS,
+                    manifest_path=manifest.MANIFEST_PATH, ranking_dir=RANKING_DIR):
+    ranked = load_ranking(scan_ports, top_n, manifest_path)
+    if ranked is None:
+        print(f"No scanned ASNs with ports {scan_ports} to rank.")
+        return None
+    result, table = ranked
+    asns, ports = result["asns"], result["ports"]
+    paths = ranking_paths(scan_ports, ranking_dir)
+    os.makedirs(ranking_dir, exist_ok=True)
+    manifest.write_if_changed(paths["json"], json.dumps(table, indent=1) + "\n")
+    write_csv(paths["csv"], result)
+
+    columns = _top(result["global_rate"][None, :], heatmap_ports)[0]
+    rows = result["asn_order"]
+    render.plot_heatmap(result["rate"][np.ix_(rows, columns)], [asn_name(asns[row]).split(' ')[0] for row in rows],
+                        ports[columns].tolist(), scan_ports, paths["heatmap"])
+    manifest.update_ranking(scan_ports, {name: path.replace(os.sep, "/") for name, path in paths.items()},
+                            manifest_path)
+    print(f"Ranked {len(asns)} ASNs x {ports.size} ports, top ports: "
+          f"{', '.join(str(row['port']) for row in table['global'][:top_n])}")
+    return paths
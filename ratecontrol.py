@@ -0,0 +1,207 @@
+import asyncio
+import math
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+import history
+import masscan_parser
+import masscan_stream
+import prefixes
+import result_store
+import scanners
+
+# 自适应发包速率: 对每个 ASN 的固定抽样地址按从低到高的速率做几次短促的校准扫描,
+# 观察响应率 (结果数 / 探测数) 和 masscan 报告的实际速率, 选择响应率没有下降的最高速率;
+# 用校准时发现的开放端口测量 RTT, 据此调整 --wait. 结果保存在 history.db 中, 有效期内直接复用
+
+# 从低到高尝试的速率 (pps), 最后总会再尝试一次上限速率
+CALIBRATION_RATES = (2500, 5000, 10000, 20000, 40000, 80000, 160000)
+# 每次校准扫描的抽样地址数
+CALIBRATION_ADDRESSES = 4096
+# 最低速率下结果少于该值时没有足够的信号, 不限制速率
+MIN_CALIBRATION_RESULTS = 30
+# 响应率相对最佳值下降超过该比例 (同时超出抽样误差) 即认为开始丢包
+YIELD_TOLERANCE = 0.05
+# masscan 报告的速率低于请求速率的该比例时, 说明本机或链路已到上限
+ACHIEVED_RATE_RATIO = 0.8
+# 校准扫描的 --wait (秒)
+CALIBRATION_WAIT = 3
+# 校准结果的有效期 (秒)
+CALIBRATION_TTL = 7 * 24 * 3600
+# --wait = RTT 的 p95 * RTT_MULTIPLIER + 1, 限制在 [MIN_WAIT, MAX_WAIT]
+RTT_SAMPLES = 32
+RTT_TIMEOUT = 3.0
+RTT_MULTIPLIER = 4
+MIN_WAIT = 2
+MAX_WAIT = 15
+
+# 本次运行中各 ASN 使用的 --wait, 由扫描函数读取
+_waits = {}
+_waits_lock = threading.Lock()
+
+
+# 在归一化后的前缀中不放回地抽取 count 个地址, 同一 seed 每次结果相同
+def calibration_targets(cidrs, count=CALIBRATION_ADDRESSES, seed=0):
+    intervals = prefixes.merge_intervals(prefixes.cidrs_to_intervals(cidrs))
+    starts = np.array([start for start, _ in intervals], dtype=np.int64)
+    sizes = np.array([end - start + 1 for start, end in intervals], dtype=np.int64)
+    offsets_before = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    total = int(sizes.sum())
+    count = min(count, total)
+    rng = np.random.default_rng(seed)
+    offsets = np.unique(rng.integers(0, total, count, dtype=np.int64))
+    while offsets.size < count:
+        offsets = np.unique(np.concatenate((offsets, rng.integers(0, total, count - offsets.size, dtype=np.int64))))
+    position = np.searchsorted(offsets_before, offsets, side='right') - 1
+    return [result_store.int_to_ip(value) for value in (starts[position] + offsets - offsets_before[position]).tolist()]
+
+
+# 以给定速率扫描一次抽样地址, 返回响应率、实际速率以及前 RTT_SAMPLES 个开放的 (ip, port)
+def burst(backend, targets, scan_ports, rate):
+    probes = len(targets) * len(masscan_parser.parse_port_spec(scan_ports))
+    open_ports = []
+
+    def keep(record):
+        if len(open_ports) < RTT_SAMPLES:
+            open_ports.append((record[1], record[0]))
+
+    progress = masscan_stream.ScanProgress(label=f"calibration {rate} pps")
+    started = time.time()
+    # 抽样地址写入临时文件通过 -iL 传给扫描器, 与抽样扫描一样, 命令行和日志不随地址数增长
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        targets_file = os.path.join(tmp_dir, "calibration_targets.txt")
+        with open(targets_file, 'w') as file:
+            file.writelines(f"{ip}\n" for ip in targets)
+        backend.stream(None, scan_ports, rate, progress, on_record=keep, wait=CALIBRATION_WAIT,
+                       include_file=targets_file)
+    return {
+        "rate": rate,
+        "probes": probes,
+        "results": progress.results,
+        "yield": progress.results / probes if probes else 0.0,
+        "achieved": round(progress.kpps * 1000) if progress.kpps else None,
+        "seconds": round(time.time() - started, 2),
+        "open": open_ports,
+    }
+
+
+# 响应率是否与最佳值持平: 容许 YIELD_TOLERANCE 的相对下降, 以及两倍的抽样标准误差
+def keeps_yield(result, best):
+    noise = 2 * math.sqrt(best["results"]) / best["probes"]
+    return result["yield"] >= best["yield"] * (1 - YIELD_TOLERANCE) - noise
+
+
+async def _connect_times(targets):
+    loop = asyncio.get_running_loop()
+
+    async def timed(ip, port):
+        start = time.perf_counter()
+        if await scanners.probe(loop, ip, port, RTT_TIMEOUT):
+            return time.perf_counter() - start
+        return None
+
+    return [value for value in await asyncio.gather(*(timed(ip, port) for ip, port in targets)) if value is not None]
+
+
+# 对已知开放的端口做 TCP 连接, 握手耗时即 RTT, 返回 p95 (秒), 没有样本时返回 None
+def measure_rtt(targets):
+    if not targets:
+        return None
+    times = asyncio.run(_connect_times(targets))
+    return float(np.percentile(times, 95)) if times else None
+
+
+def wait_for_rtt(rtt):
+    if rtt is None:
+        return scanners.DEFAULT_WAIT
+    return int(min(MAX_WAIT, max(MIN_WAIT, math.ceil(rtt * RTT_MULTIPLIER) + 1)))
+
+
+# 校准一个 ASN: 逐级提高速率, 响应率下降或达不到请求速率时停止, 返回速率档案
+def calibrate(asn_number, cidrs, scan_ports, max_rate, backend=None):
+    backend = backend or scanners.get_backend()
+    targets = calibration_targets(cidrs)
+    rates = [rate for rate in CALIBRATION_RATES if rate < max_rate] + [max_rate]
+    print(f"Calibrating scan rate for ASN {asn_number}: {len(targets)} addresses, rates {rates}")
+    bursts = []
+    best = None
+    chosen = None
+    for rate in rates:
+        result = burst(backend, targets, scan_ports, rate)
+        bursts.append(result)
+        print(f"ASN {asn_number} at {rate} pps: {result['results']} results, yield {result['yield']:.5f}, "
+              f"achieved {result['achieved'] or '?'} pps")
+        if best is None:
+            if result["results"] < MIN_CALIBRATION_RESULTS:
+                print(f"ASN {asn_number}: too few results to calibrate, keeping the scheduled rate.")
+                break
+            best = chosen = result
+            continue
+        if not keeps_yield(result, best):
+            break
+        if result["achieved"] and result["achieved"] < rate * ACHIEVED_RATE_RATIO:
+            # 本机或链路跑不到这个速率, 使用实际达到的速率
+            chosen = dict(result, rate=int(result["achieved"]))
+            break
+        chosen = result
+        if result["yield"] > best["yield"]:
+            best = result
+
+    rtt = measure_rtt(bursts[0]["open"]) if bursts else None
+    profile = {
+        "rate": chosen["rate"] if chosen else None,
+        "wait": wait_for_rtt(rtt),
+        "yield": chosen["yield"] if chosen else None,
+        "rtt": rtt,
+        "max_rate": max_rate,
+        "calibrated_at": time.time(),
+        "bursts": [{key: value for key, value in result.items() if key != "open"} for result in bursts],
+    }
+    print(f"ASN {asn_number}: rate {profile['rate'] or 'unchanged'} pps, --wait {profile['wait']}s"
+          + (f" (RTT p95 {rtt * 1000:.0f} ms)" if rtt is not None else ""))
+    return profile
+
+
+# 已保存的档案是否仍可用: 未过期, 且测试过的上限不低于本次上限 (或者已经在上限以下找到了拐点)
+def is_usable(profile, max_rate, ttl=CALIBRATION_TTL, now=None):
+    if profile is None:
+        return False
+    now = now if now is not None else time.time()
+    if now - profile["calibrated_at"] >= ttl:
+        return False
+    return profile["max_rate"] >= max_rate or (profile["rate"] is not None and profile["rate"] < profile["max_rate"])
+
+
+# 取得一个 ASN 的速率档案 (必要时重新校准并保存), 并登记本次运行使用的 --wait
+def rate_profile(asn_number, cidrs, scan_ports, max_rate, ttl=CALIBRATION_TTL, force=False, backend=None,
+                 db_path=history.HISTORY_DB):
+    profile = None if force else history.load_rate_profile(asn_number, db_path)
+    if is_usable(profile, max_rate, ttl):
+        print(f"ASN {asn_number}: using calibrated rate {profile['rate'] or 'unchanged'} pps, "
+              f"--wait {profile['wait']}s")
+    else:
+        profile = calibrate(asn_number, cidrs, scan_ports, max_rate, backend)
+        history.save_rate_profile(asn_number, profile, db_path)
+    with _waits_lock:
+        _waits[str(asn_number)] = profile["wait"]
+    return profile
+
+
+# 本次运行中 ASN 使用的 --wait, 没有校准时为默认值
+def scan_wait(asn_number):
+    with _waits_lock:
+        return _waits.get(str(asn_number), scanners.DEFAULT_WAIT)
+
+
+# 依次校准多个 ASN (校准扫描不并行, 避免互相影响), 返回 {asn: 速率上限}, 没有信号的 ASN 不设上限
+def rate_caps(asn_cidrs, scan_ports, max_rate, ttl=CALIBRATION_TTL, force=False):
+    caps = {}
+    for asn_number, cidrs in asn_cidrs.items():
+        profile = rate_profile(asn_number, cidrs, scan_ports, max_rate, ttl, force)
+        if profile["rate"] is not None:
+            caps[asn_number] = profile["rate"]
+    return caps
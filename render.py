@@ -0,0 +1,398 @@
+import hashlib
+import json
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+import masscan_parser
+
+# 绘图阶段: 一批 ASN 的端口统计在进程池中并行绘制成 PNG, 每张图画完立即释放;
+# 图片的 PNG 文本块中记录输入 (统计数据、端口、样式) 的哈希, 输入不变时跳过绘制, 文件保持不变;
+# 除端口分布图外, 还可以根据历史数据 (history.py) 绘制最近若干次运行的端口趋势图;
+# matplotlib 在第一次绘图时才导入, 只用到路径和哈希的模块 (README、排名表等) 不需要承担它的导入时间
+
+RESULTS_DIR = "ports_results"
+FIGURE_SIZE = (15, 8)
+COLORMAP = "viridis"
+# 每个子进程最多绘制多少张图后退出, 防止 matplotlib 缓存让内存持续增长
+TASKS_PER_WORKER = 32
+# 修改图表样式 (布局、文字等) 时增加版本号, 让已有的图片全部重新绘制
+STYLE_VERSION = 1
+HASH_KEY = "Chart-Hash"
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# 端口范围扫描的趋势图只画最近一次计数最多的若干端口
+TREND_TOP_K = 10
+# 全端口图中单独标注的端口数
+FULL_RANGE_TOP_K = 15
+
+
+def chart_path(asn_number, scan_ports, results_dir=RESULTS_DIR):
+    return os.path.join(results_dir, str(asn_number), f'port_distribution_asn{asn_number}_{scan_ports}.png')
+
+
+def trend_path(asn_number, scan_ports, results_dir=RESULTS_DIR):
+    return os.path.join(results_dir, str(asn_number), f'port_trend_asn{asn_number}_{scan_ports}.png')
+
+
+# 全端口扫描的逐端口计数表, 与 PNG 放在同一目录, 用于在图片之外按任意端口区间查看 (缩放) 计数
+def full_range_data_path(asn_number, scan_ports, results_dir=RESULTS_DIR):
+    return os.path.join(results_dir, str(asn_number), f'port_counts_asn{asn_number}_{scan_ports}.csv')
+
+
+# 无界面的 Agg 后端, 不依赖环境中的 GUI 后端; 只使用面向对象 API, 不经过 pyplot 的全局状态
+def _new_figure(figsize):
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _colormap():
+    from matplotlib import colormaps
+    return colormaps[COLORMAP]
+
+
+def _normalize(low, high):
+    from matplotlib.colors import Normalize
+    return Normalize(low, high)
+
+
+def _digest(payload):
+    payload["style"] = [STYLE_VERSION, FIGURE_SIZE, COLORMAP]
+    # numpy 标量转为 Python 数值, 保证同样的数据得到同样的哈希
+    body = json.dumps(payload, sort_keys=True, default=lambda value: value.item())
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+# 图表输入的哈希: 统计数据、估计值、主机数、端口参数和样式
+def chart_hash(port_counts, scan_ports, estimates=None, hosts=None):
+    return _digest({
+        "counts": sorted((int(port), count) for port, count in port_counts.items()),
+        "estimates": sorted((int(port), list(value)) for port, value in estimates.items()) if estimates else None,
+        "hosts": hosts,
+        "scan_ports": scan_ports,
+    })
+
+
+def trend_hash(timestamps, series, scan_ports):
+    return _digest({
+        "kind": "trend",
+        "timestamps": list(timestamps),
+        "series": sorted((int(port), list(values)) for port, values in series.items()),
+        "scan_ports": scan_ports,
+    })
+
+
+# 读取已有图片中记录的哈希, 只解析 IDAT 之前的文本块, 不解码图像
+def stored_hash(path):
+    try:
+        with open(path, 'rb') as file:
+            if file.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+                return None
+            while True:
+                head = file.read(8)
+                if len(head) < 8:
+                    return None
+                length, chunk_type = struct.unpack('>I4s', head)
+                if chunk_type in (b'IDAT', b'IEND'):
+                    return None
+                data = file.read(length + 4)[:length]
+                if chunk_type == b'tEXt':
+                    key, _, value = data.partition(b'\0')
+                    if key.decode('latin-1') == HASH_KEY:
+                        return value.decode('latin-1')
+    except FileNotFoundError:
+        return None
+
+
+def _job_path(job):
+    path_of = trend_path if job.get("kind") == "trend" else chart_path
+    return path_of(job["asn"], job["scan_ports"], job.get("results_dir", RESULTS_DIR))
+
+
+def _job_hash(job):
+    if job.get("kind") == "trend":
+        return trend_hash(job["timestamps"], job["series"], job["scan_ports"])
+    return chart_hash(job["port_counts"], job["scan_ports"], job.get("estimates"), job.get("hosts"))
+
+
+def _has_data(job):
+    return bool(job["series"] if job.get("kind") == "trend" else job["port_counts"])
+
+
+def is_unchanged(job):
+    if job.get("hosts") is not None and not os.path.exists(
+            full_range_data_path(job["asn"], job["scan_ports"], job.get("results_dir", RESULTS_DIR))):
+        return False
+    return stored_hash(_job_path(job)) == _job_hash(job)
+
+
+def _color_bars(bars, counts, norm):
+    cmap = _colormap()
+    for bar, count in zip(bars, counts):
+        bar.set_color(cmap(norm(count)))
+
+
+# 具体端口列表: 每个端口一根柱, 抽样估计时带置信区间误差线
+def _draw_ports(ax, port_counts, estimates):
+    ports = sorted(port_counts.keys())
+    counts = [port_counts[p] for p in ports]
+    bars = ax.bar(ports, counts)
+    norm = _normalize(0, max(counts))
+    _color_bars(bars, counts, norm)
+
+    ax.set_xlabel('Port')
+    ax.set_xticks(ports)
+    ax.set_xticklabels(ports, rotation=90)
+
+    if estimates:
+        lows = [estimates[p][1] for p in ports]
+        highs = [estimates[p][2] for p in ports]
+        ax.errorbar(ports, counts, yerr=[[c - low for c, low in zip(counts, lows)],
+                                         [high - c for c, high in zip(counts, highs)]],
+                    fmt='none', ecolor='black', capsize=3)
+        text_str = '\n'.join([f'Port {port}: ~{count:.0f} ({low:.0f}-{high:.0f})'
+                              for port, count, low, high in zip(ports, counts, lows, highs)])
+    else:
+        text_str = '\n'.join([f'Port {port}: {count}' for port, count in zip(ports, counts)])
+    return norm, text_str
+
+
+# 端口范围: 按千分组
+def _draw_range(ax, port_counts, scan_ports, estimates):
+    port_ranges = scan_ports.split('-')
+    start_port = int(port_ranges[0])
+    end_port = int(port_ranges[1])
+    num_groups = min(66, (end_port - start_port) // 1000 + 1)
+    step = (end_port - start_port + 1) // num_groups
+    groups = list(range(num_groups))
+    histogram = np.zeros(masscan_parser.PORT_SLOTS, dtype=np.float64 if estimates else np.int64)
+    for port, count in port_counts.items():
+        histogram[port] = count
+    counts = masscan_parser.group_histogram(histogram, start_port, step, num_groups).tolist()
+    if estimates:
+        counts = [round(count) for count in counts]
+
+    bars = ax.bar(groups, counts)
+    norm = _normalize(0, max(counts))
+    _color_bars(bars, counts, norm)
+
+    ax.set_xlabel('Port Range (in thousands)')
+    ax.set_xticks(range(0, num_groups, max(num_groups // 10, 1)))
+    ax.set_xticklabels([f'{i * step}k-{(i + 1) * step}k' for i in range(0, num_groups, max(num_groups // 10, 1))])
+
+    text_str = '\n'.join(
+        [f'Group {group * step}-{(group + 1) * step}k: {count}' for group, count in zip(groups, counts)])
+    return norm, text_str
+
+
+# 绘制单个 ASN 的端口分布图, estimates 为抽样估计的置信区间 {port: (估计值, 下限, 上限)}, 返回图片路径
+def plot_port_statistics(port_counts, asn_number, scan_ports, estimates=None, results_dir=RESULTS_DIR):
+    title_suffix = ' - estimated from sample, 95% CI' if estimates else ''
+    save_path = chart_path(asn_number, scan_ports, results_dir)
+    digest = chart_hash(port_counts, scan_ports, estimates)
+    os.makedirs(os.path.dirname(save_path), exist_ok=True)
+
+    fig = _new_figure(FIGURE_SIZE)
+    try:
+        ax = fig.subplots()
+        # 单个端口 (例如 "80") 和端口列表一样每个端口一根柱, 只有 "起始-结束" 形式的范围按千分组
+        if ',' in scan_ports or '-' not in scan_ports:
+            norm, text_str = _draw_ports(ax, port_counts, estimates)
+        else:
+            norm, text_str = _draw_range(ax, port_counts, scan_ports, estimates)
+        ax.set_ylabel('Number of Open Ports')
+        ax.set_title(f'Distribution of Open Ports (ASN {asn_number}, Ports: {scan_ports}){title_suffix}')
+
+        from matplotlib.cm import ScalarMappable
+        sm = ScalarMappable(cmap=COLORMAP, norm=norm)
+        sm.set_array([])
+        fig.colorbar(sm, ax=ax, label='Relative Frequency')
+
+        # 将注释文本添加到 Y 轴的左侧
+        fig.tight_layout(rect=[0.15, 0, 1, 1])  # 调整布局，留出左侧的空间
+        fig.text(0.02, 0.5, text_str, ha="left", va="center", fontsize=10,
+                 bbox={"facecolor": "white", "alpha": 0.5, "pad": 5})
+
+        # 先写临时文件再替换, 避免中断时留下半张图
+        tmp_path = save_path + ".tmp"
+        fig.savefig(tmp_path, format="png", metadata={HASH_KEY: digest})
+        os.replace(tmp_path, save_path)
+    finally:
+        # 显式释放图形, 批量绘制时内存不随图数增长
+        fig.clear()
+        del fig
+    return save_path
+
+
+# 写出全端口扫描的逐端口计数表 (port,count, 只包含有开放记录的端口, 按端口排序)
+def write_full_range_data(port_counts, asn_number, scan_ports, results_dir=RESULTS_DIR):
+    data_path = full_range_data_path(asn_number, scan_ports, results_dir)
+    tmp_path = data_path + ".tmp"
+    with open(tmp_path, 'w') as file:
+        file.write("port,count\n")
+        file.writelines(f"{port},{int(port_counts[port])}\n" for port in sorted(port_counts) if port_counts[port])
+    os.replace(tmp_path, data_path)
+    return data_path
+
+
+# 全端口扫描: 上图为 65536 个端口的精确计数 (对数坐标) 并标注前 top_k 个端口, 下图为这些端口的计数;
+# 静态 PNG 无法缩放, 同时写出逐端口计数的 CSV (见 full_range_data_path), 需要放大某个端口区间时直接查看或重新绘制;
+# hosts 为 {"count": 不同主机数, "method": "bitmap" 或 "hyperloglog"}
+def plot_full_range(port_counts, asn_number, scan_ports, hosts, results_dir=RESULTS_DIR, top_k=FULL_RANGE_TOP_K):
+    save_path = chart_path(asn_number, scan_ports, results_dir)
+    digest = chart_hash(port_counts, scan_ports, hosts=hosts)
+    os.makedirs(os.path.dirname(save_path), exist_ok=True)
+    write_full_range_data(port_counts, asn_number, scan_ports, results_dir)
+    counts = np.zeros(masscan_parser.PORT_SLOTS, dtype=np.float64)
+    for port, count in port_counts.items():
+        counts[port] = count
+    top = sorted(port_counts, key=lambda port: (-port_counts[port], port))[:top_k]
+    approx = "~" if hosts["method"] == "hyperloglog" else ""
+
+    fig = _new_figure((FIGURE_SIZE[0], FIGURE_SIZE[1] * 1.5))
+    try:
+        ax, top_ax = fig.subplots(2, 1, gridspec_kw={"height_ratios": [3, 2]})
+        # 计数为 0 的端口画在基线上
+        ax.plot(np.arange(masscan_parser.PORT_SLOTS), np.maximum(counts, 0.5), drawstyle='steps-mid', linewidth=0.6,
+                color=_colormap()(0.35))
+        ax.scatter(top, [counts[port] for port in top], s=12, color=_colormap()(0.9), zorder=3)
+        ax.set_yscale('log')
+        ax.set_ylim(bottom=0.5)
+        ax.set_xlim(0, masscan_parser.PORT_SLOTS)
+        ax.set_xlabel('Port')
+        ax.set_ylabel('Number of Open Ports (log)')
+        ax.set_title(f'Distribution of Open Ports (ASN {asn_number}, Ports: {scan_ports}), '
+                     f'{int(counts.sum())} open ports on {approx}{hosts["count"]:.0f} hosts')
+        for rank, port in enumerate(top):
+            ax.annotate(f'{port}', (port + 0.5, counts[port]), xytext=(0, 6 + (rank % 3) * 9),
+                        textcoords='offset points', ha='center', fontsize=8,
+                        arrowprops={"arrowstyle": "-", "lw": 0.5})
+
+        norm = _normalize(0, max(counts[port] for port in top) if top else 1)
+        bars = top_ax.bar(range(len(top)), [counts[port] for port in top])
+        _color_bars(bars, [counts[port] for port in top], norm)
+        top_ax.set_xticks(range(len(top)))
+        top_ax.set_xticklabels([str(port) for port in top])
+        top_ax.set_xlabel(f'Top {len(top)} Ports')
+        top_ax.set_ylabel('Number of Open Ports')
+        for bar, port in zip(bars, top):
+            top_ax.annotate(f'{counts[port]:.0f}', (bar.get_x() + bar.get_width() / 2, bar.get_height()),
+                            xytext=(0, 2), textcoords='offset points', ha='center', fontsize=8)
+        fig.tight_layout()
+
+        tmp_path = save_path + ".tmp"
+        fig.savefig(tmp_path, format="png", metadata={HASH_KEY: digest})
+        os.replace(tmp_path, save_path)
+    finally:
+        fig.clear()
+        del fig
+    return save_path
+
+
+# 最近若干次运行的端口计数趋势图, timestamps 为每次运行的开始时间, series 为 {port: 计数列表}
+def plot_port_trend(timestamps, series, asn_number, scan_ports, results_dir=RESULTS_DIR):
+    save_path = trend_path(asn_number, scan_ports, results_dir)
+    digest = trend_hash(timestamps, series, scan_ports)
+    os.makedirs(os.path.dirname(save_path), exist_ok=True)
+    ports = sorted(series, key=lambda port: (-series[port][-1], port))
+    if ',' not in scan_ports:
+        ports = ports[:TREND_TOP_K]
+    dates = [datetime.fromtimestamp(timestamp, timezone.utc) for timestamp in timestamps]
+
+    fig = _new_figure(FIGURE_SIZE)
+    try:
+        ax = fig.subplots()
+        cmap = _colormap()
+        for index, port in enumerate(ports):
+            ax.plot(dates, series[port], marker='o', markersize=3, label=f'{port}',
+                    color=cmap(index / max(len(ports) - 1, 1)))
+        ax.set_xlabel('Scan Date (UTC)')
+        ax.set_ylabel('Number of Open Ports')
+        ax.set_title(f'Open Ports Trend (ASN {asn_number}, Ports: {scan_ports}, last {len(timestamps)} runs)')
+        ax.legend(loc='center left', bbox_to_anchor=(1.01, 0.5), title='Port')
+        fig.autofmt_xdate()
+        fig.tight_layout()
+
+        tmp_path = save_path + ".tmp"
+        fig.savefig(tmp_path, format="png", metadata={HASH_KEY: digest})
+        os.replace(tmp_path, save_path)
+    finally:
+        fig.clear()
+        del fig
+    return save_path
+
+
+# ASN × 端口 热力图, values 为每个 /24 的开放数, 颜色按 log(1 + x) 映射
+def plot_heatmap(values, row_labels, column_labels, scan_ports, save_path):
+    digest = _digest({"kind": "heatmap", "values": np.round(values, 6).tolist(), "rows": list(row_labels),
+                      "columns": list(column_labels), "scan_ports": scan_ports})
+    if stored_hash(save_path) == digest:
+        return save_path
+    os.makedirs(os.path.dirname(save_path), exist_ok=True)
+    height = min(max(4, 0.35 * len(row_labels) + 2), 200)
+    fig = _new_figure((max(FIGURE_SIZE[0], 0.45 * len(column_labels) + 4), height))
+    try:
+        ax = fig.subplots()
+        image = ax.imshow(np.log1p(values), aspect='auto', cmap=COLORMAP, interpolation='nearest')
+        ax.set_xticks(range(len(column_labels)))
+        ax.set_xticklabels(column_labels, rotation=90)
+        ax.set_yticks(range(len(row_labels)))
+        ax.set_yticklabels(row_labels)
+        ax.set_xlabel('Port')
+        ax.set_ylabel('ASN')
+        ax.set_title(f'Open Ports per /24 by ASN (Ports: {scan_ports})')
+        # 格子不多时直接标注数值
+        if values.size <= 600:
+            for (row, column), value in np.ndenumerate(values):
+                ax.text(column, row, f'{value:.2g}', ha='center', va='center', fontsize=7, color='white')
+        fig.colorbar(image, ax=ax, label='log(1 + open ports per /24)')
+        fig.tight_layout()
+
+        tmp_path = save_path + ".tmp"
+        fig.savefig(tmp_path, format="png", metadata={HASH_KEY: digest})
+        os.replace(tmp_path, save_path)
+    finally:
+        fig.clear()
+        del fig
+    return save_path
+
+
+def _render_job(job):
+    if job.get("kind") == "trend":
+        return plot_port_trend(job["timestamps"], job["series"], job["asn"], job["scan_ports"],
+                               job.get("results_dir", RESULTS_DIR))
+    if job.get("hosts") is not None:
+        return plot_full_range(job["port_counts"], job["asn"], job["scan_ports"], job["hosts"],
+                               job.get("results_dir", RESULTS_DIR))
+    return plot_port_statistics(job["port_counts"], job["asn"], job["scan_ports"], job.get("estimates"),
+                                job.get("results_dir", RESULTS_DIR))
+
+
+# 批量绘制, jobs 为 [{"asn", "scan_ports", "port_counts", "estimates"}] 或
+# 趋势图 [{"kind": "trend", "asn", "scan_ports", "timestamps", "series"}], 返回图片路径列表 (与有数据的任务顺序一致);
+# 输入与已有图片一致的任务直接跳过, force=True 时全部重新绘制
+def render_charts(jobs, max_workers=None, force=False):
+    jobs = [job if job.get("kind") == "trend" else dict(job, port_counts=dict(job["port_counts"]))
+            for job in jobs if _has_data(job)]
+    pending = [job for job in jobs if force or not is_unchanged(job)]
+    if len(pending) < len(jobs):
+        print(f"Charts unchanged for {len(jobs) - len(pending)}/{len(jobs)} charts, skipped rendering.")
+    _render_all(pending, max_workers)
+    return [_job_path(job) for job in jobs]
+
+
+def _render_all(jobs, max_workers=None):
+    if not jobs:
+        return []
+    max_workers = min(max_workers or os.cpu_count() or 1, len(jobs))
+    if max_workers == 1:
+        return [_render_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=max_workers, max_tasks_per_child=TASKS_PER_WORKER) as executor:
+        return list(executor.map(_render_job, jobs, chunksize=max(1, len(jobs) // (max_workers * 4))))
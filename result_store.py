@@ -0,0 +1,167 @@
+import json
+import os
+import shutil
+import socket
+import struct
+import time
+
+import numpy as np
+
+# 扫描结果的列式二进制存储: 每次扫描一个文件, 头部是一小段 JSON 元数据
+# (ASN、端口、速率、开始/结束时间、记录数), 后面依次是
+# ips uint32[n]、timestamps uint32[n]、ports uint16[n] 三列, 可以直接 mmap 读取
+
+STORE_DIR = "scan_store"
+FILE_SUFFIX = ".oprs"
+MAGIC = b'OPRS'
+VERSION = 1
+# MAGIC + version + 头部长度
+PREAMBLE = struct.Struct('<4sII')
+HEADER_ALIGN = 16
+COLUMNS = (("ips", np.uint32), ("timestamps", np.uint32), ("ports", np.uint16))
+# 流式写入时在内存中缓存的记录条数
+BUFFER_RECORDS = 65536
+
+
+def ip_to_int(ip):
+    return int.from_bytes(socket.inet_aton(ip), 'big')
+
+
+def int_to_ip(value):
+    return socket.inet_ntoa(int(value).to_bytes(4, 'big'))
+
+
+def run_id(timestamp):
+    return time.strftime("%Y%m%dT%H%M%SZ", time.gmtime(timestamp))
+
+
+# 结果文件路径: scan_store/<asn>/<开始时间>_<端口>.oprs
+def result_path(asn_number, scan_ports, start_time, store_dir=STORE_DIR):
+    return os.path.join(store_dir, str(asn_number), f"{run_id(start_time)}_{scan_ports}{FILE_SUFFIX}")
+
+
+def _encode_header(header):
+    body = json.dumps(header, sort_keys=True).encode()
+    padding = -(PREAMBLE.size + len(body)) % HEADER_ALIGN
+    body += b' ' * padding
+    return PREAMBLE.pack(MAGIC, VERSION, len(body)) + body
+
+
+# 写入器: 列数据先追加到临时文件, close() 时写入头部并拼接成最终文件,
+# 所以无论结果有多少条, 内存占用都只和缓冲区大小有关
+class ResultWriter:
+    def __init__(self, path, asn_number, scan_ports, rate, start_time=None, **extra):
+        self.path = path
+        self.header = {
+            "asn": str(asn_number),
+            "scan_ports": scan_ports,
+            "rate": rate,
+            "start_time": start_time if start_time is not None else time.time(),
+            "end_time": None,
+            "count": 0,
+        }
+        self.header.update(extra)
+        self._parts_dir = path + ".parts"
+        os.makedirs(self._parts_dir, exist_ok=True)
+        self._parts = {name: open(os.path.join(self._parts_dir, name), 'wb') for name, _ in COLUMNS}
+        self._buffer = []
+
+    # 追加一批列数据
+    def append(self, ports, ips, timestamps):
+        columns = {"ips": ips, "timestamps": timestamps, "ports": ports}
+        for name, dtype in COLUMNS:
+            np.asarray(columns[name], dtype=dtype).tofile(self._parts[name])
+        self.header["count"] += len(ports)
+
+    # 追加一条流式记录 (port, ip 字符串, timestamp), 与 masscan_stream.stream_scan 的 on_record 兼容
+    def add(self, record):
+        self._buffer.append(record)
+        if len(self._buffer) >= BUFFER_RECORDS:
+            self._flush_buffer()
+
+    def _flush_buffer(self):
+        if not self._buffer:
+            return
+        ports = [record[0] for record in self._buffer]
+        ips = [ip_to_int(record[1]) for record in self._buffer]
+        timestamps = [record[2] for record in self._buffer]
+        self._buffer = []
+        self.append(ports, ips, timestamps)
+
+    def close(self, end_time=None, **extra):
+        self._flush_buffer()
+        for part in self._parts.values():
+            part.close()
+        self.header["end_time"] = end_time if end_time is not None else time.time()
+        self.header.update(extra)
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'wb') as file:
+            file.write(_encode_header(self.header))
+            for name, _ in COLUMNS:
+                with open(os.path.join(self._parts_dir, name), 'rb') as part:
+                    shutil.copyfileobj(part, file)
+        os.replace(tmp_path, self.path)
+        shutil.rmtree(self._parts_dir, ignore_errors=True)
+        return self.path
+
+    # 放弃写入 (例如扫描失败), 删除临时数据, 不生成结果文件
+    def discard(self):
+        self._buffer = []
+        for part in self._parts.values():
+            part.close()
+        shutil.rmtree(self._parts_dir, ignore_errors=True)
+
+
+# 一次性写入内存中的三列数据
+def write_results(path, ports, ips, timestamps, asn_number, scan_ports, rate, start_time, end_time, **extra):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    writer = ResultWriter(path, asn_number, scan_ports, rate, start_time, **extra)
+    writer.append(ports, ips, timestamps)
+    return writer.close(end_time)
+
+
+def read_header(path):
+    with open(path, 'rb') as file:
+        magic, version, header_len = PREAMBLE.unpack(file.read(PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a scan result store file")
+        if version != VERSION:
+            raise ValueError(f"Unsupported scan result store version {version} in {path}")
+        header = json.loads(file.read(header_len))
+    header["data_offset"] = PREAMBLE.size + header_len
+    return header
+
+
+# 打开结果文件, 返回 (header, {列名: 只读 memmap 数组}), 不需要重新解析文本
+def open_results(path):
+    header = read_header(path)
+    count = header["count"]
+    offset = header["data_offset"]
+    columns = {}
+    for name, dtype in COLUMNS:
+        if count:
+            columns[name] = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(count,))
+        else:
+            columns[name] = np.empty(0, dtype=dtype)
+        offset += count * np.dtype(dtype).itemsize
+    return header, columns
+
+
+def load_port_histogram(path):
+    _, columns = open_results(path)
+    return np.bincount(columns["ports"], minlength=65536).astype(np.int64)
+
+
+# 列出某个 ASN 的全部结果文件 (按时间排序), 可按端口参数过滤
+def list_results(asn_number, scan_ports=None, store_dir=STORE_DIR):
+    asn_dir = os.path.join(store_dir, str(asn_number))
+    if not os.path.isdir(asn_dir):
+        return []
+    suffix = f"_{scan_ports}{FILE_SUFFIX}" if scan_ports is not None else FILE_SUFFIX
+    return [os.path.join(asn_dir, name) for name in sorted(os.listdir(asn_dir)) if name.endswith(suffix)]
+
+
+def latest_result(asn_number, scan_ports, store_dir=STORE_DIR):
+    results = list_results(asn_number, scan_ports, store_dir)
+    return results[-1] if results else None
@@ -0,0 +1,144 @@
+import bisect
+import math
+import random
+
+import numpy as np
+
+import prefixes
+
+# 抽样扫描: 把归一化后的地址空间切成若干等大小的层, 每层按比例随机抽取地址,
+# 只扫描样本, 用分层估计量估算每个端口的开放数量和置信区间;
+# 样本量逐轮翻倍, 直到端口排名不再变化
+
+DEFAULT_STRATA = 64
+DEFAULT_INITIAL_SAMPLE = 16384
+DEFAULT_MAX_FRACTION = 0.05
+DEFAULT_MAX_ROUNDS = 8
+# 95% 置信区间
+Z_SCORE = 1.96
+# 判断排名是否稳定时比较前多少个端口
+RANK_TOP_K = 20
+
+
+class StratifiedSampler:
+    def __init__(self, intervals, strata=DEFAULT_STRATA, seed=None):
+        population = prefixes.count_addresses(intervals)
+        stratum_size = max(1, math.ceil(population / strata))
+        self.strata = prefixes.split_intervals(intervals, stratum_size)
+        self.population = population
+        self.sizes = [prefixes.count_addresses(stratum) for stratum in self.strata]
+        self.sampled = [set() for _ in self.strata]
+        self.rng = random.Random(seed)
+        # 每层区间起点的累计偏移, 用于把层内偏移映射回地址
+        self._offsets = []
+        for stratum in self.strata:
+            offsets = [0]
+            for start, end in stratum:
+                offsets.append(offsets[-1] + end - start + 1)
+            self._offsets.append(offsets)
+
+    @property
+    def size(self):
+        return sum(len(sampled) for sampled in self.sampled)
+
+    def _address(self, stratum_index, offset):
+        offsets = self._offsets[stratum_index]
+        index = bisect.bisect_right(offsets, offset) - 1
+        return self.strata[stratum_index][index][0] + offset - offsets[index]
+
+    # 追加抽取 count 个未抽过的地址, 按各层大小比例分配 (最大余数法), 返回新地址列表
+    def draw(self, count):
+        remaining = [size - len(sampled) for size, sampled in zip(self.sizes, self.sampled)]
+        count = min(count, sum(remaining))
+        quotas = [count * size / self.population for size in self.sizes]
+        allocation = [min(int(quota), left) for quota, left in zip(quotas, remaining)]
+        order = sorted(range(len(quotas)), key=lambda i: quotas[i] - int(quotas[i]), reverse=True)
+        shortfall = count - sum(allocation)
+        while shortfall > 0:
+            progressed = False
+            for i in order:
+                if shortfall == 0:
+                    break
+                if allocation[i] < remaining[i]:
+                    allocation[i] += 1
+                    shortfall -= 1
+                    progressed = True
+            if not progressed:
+                break
+
+        addresses = []
+        for index, take in enumerate(allocation):
+            sampled = self.sampled[index]
+            new = set()
+            while len(new) < take:
+                offset = self.rng.randrange(self.sizes[index])
+                if offset not in sampled:
+                    new.add(offset)
+            sampled.update(new)
+            addresses.extend(self._address(index, offset) for offset in sorted(new))
+        return addresses
+
+    # 每个 IP 所在的层编号
+    def stratum_of(self, ips):
+        starts, ends, ids = [], [], []
+        for index, stratum in enumerate(self.strata):
+            for start, end in stratum:
+                starts.append(start)
+                ends.append(end)
+                ids.append(index)
+        starts = np.array(starts, dtype=np.int64)
+        ids = np.array(ids, dtype=np.int64)
+        order = np.argsort(starts)
+        position = np.searchsorted(starts[order], ips, side='right') - 1
+        return ids[order][np.maximum(position, 0)]
+
+
+# 分层估计: 返回 {port: (估计值, 下限, 上限)}
+def estimate(sampler, ips, ports, port_list):
+    port_list = np.asarray(sorted(port_list), dtype=np.int64)
+    sizes = np.array(sampler.sizes, dtype=np.float64)
+    sample_sizes = np.array([len(sampled) for sampled in sampler.sampled], dtype=np.float64)
+    strata = len(sampler.strata)
+
+    # 同一 (ip, port) 只计一次
+    keys = np.unique(np.asarray(ips, dtype=np.uint64) << 16 | np.asarray(ports, dtype=np.uint64))
+    unique_ips = (keys >> 16).astype(np.int64)
+    unique_ports = (keys & 0xFFFF).astype(np.int64)
+    port_index = np.searchsorted(port_list, unique_ports)
+    valid = (port_index < port_list.size) & (port_list[np.minimum(port_index, port_list.size - 1)] == unique_ports)
+    cells = sampler.stratum_of(unique_ips[valid]) * port_list.size + port_index[valid]
+    hits = np.bincount(cells, minlength=strata * port_list.size).reshape(strata, port_list.size)
+
+    observed = sample_sizes > 0
+    n = sample_sizes[observed][:, None]
+    big_n = sizes[observed][:, None]
+    p = hits[observed] / n
+    totals = (big_n * p).sum(axis=0)
+    # 有限总体修正的分层方差
+    variance = (big_n ** 2 * (1 - n / big_n) * p * (1 - p) / np.maximum(n - 1, 1)).sum(axis=0)
+    margin = Z_SCORE * np.sqrt(variance)
+    # 样本中一次都没出现时用 "三法则" 给出上限
+    zero_upper = 3 * sampler.population / max(sampler.size, 1)
+    results = {}
+    for index, port in enumerate(port_list.tolist()):
+        total = float(totals[index])
+        if hits[:, index].sum() == 0:
+            results[port] = (0.0, 0.0, min(zero_upper, sampler.population))
+        else:
+            results[port] = (total, max(0.0, total - margin[index]), min(sampler.population, total + margin[index]))
+    return results
+
+
+# 按估计值从大到小排名, 只比较有样本命中的前 top_k 个端口
+def ranking(estimates, top_k=RANK_TOP_K):
+    ranked = sorted((port for port, value in estimates.items() if value[0] > 0),
+                    key=lambda port: (-estimates[port][0], port))
+    return ranked[:top_k]
+
+
+def format_estimates(asn_number, sampler, estimates, limit=10):
+    ranked = ranking(estimates, limit)
+    rows = ", ".join(f"{port}: ~{estimates[port][0]:.0f} [{estimates[port][1]:.0f}-{estimates[port][2]:.0f}]"
+                     for port in ranked)
+    return (f"ASN {asn_number} sample {sampler.size}/{sampler.population} "
+            f"({sampler.size / sampler.population:.2%}): {rows}")
@@ -0,0 +1,221 @@
+import asyncio
+import ipaddress
+import os
+import resource
+import shutil
+import socket
+import struct
+import subprocess
+import time
+
+import masscan_parser
+import masscan_stream
+import prefixes
+
+# 扫描后端: masscan (需要 root 和原始套接字) 以及纯 Python 的 asyncio TCP connect 扫描,
+# 两者输出相同的记录流 (port, ip, timestamp) 和相同的 -oL 文本格式, 上层代码不需要区分
+
+# None 表示自动选择: 有 masscan 且以 root 运行时用 masscan, 否则用 connect 扫描
+DEFAULT_BACKEND = None
+# masscan 发送完毕后等待响应的时间 (秒), 自适应速率模式下按测得的 RTT 调整
+DEFAULT_WAIT = 5
+# connect 扫描的并发连接数和单个连接的超时 (秒)
+DEFAULT_CONCURRENCY = 1000
+DEFAULT_TIMEOUT = 1.0
+# 令牌桶容量 (秒): 允许的突发量为 rate * BURST_SECONDS
+BURST_SECONDS = 0.1
+
+
+# 目标: 空格分隔的 CIDR / IP, 或者 -iL 文件 (每行一个 CIDR / IP), 返回合并后的区间
+def parse_targets(targets=None, include_file=None):
+    items = str(targets or "").split()
+    if include_file:
+        with open(include_file, 'r') as file:
+            items.extend(line.strip() for line in file if line.strip() and not line.startswith('#'))
+    return prefixes.merge_intervals(prefixes.cidrs_to_intervals(items))
+
+
+class MasscanBackend:
+    name = "masscan"
+
+    @staticmethod
+    def available():
+        return shutil.which("masscan") is not None and hasattr(os, "geteuid") and os.geteuid() == 0
+
+    # 扫描并把结果以 -oL 格式写入 output_file, 成功返回 True
+    def scan(self, targets, output_file, scan_ports, rate, include_file=None, wait=DEFAULT_WAIT):
+        # 目标很多时 (例如抽样得到的单个地址) 通过 -iL 从文件读取
+        target_args = ["-iL", include_file] if include_file else [targets]
+        # masscan 默认输出为二进制格式，我们需要使用 -oL 来输出为列表格式
+        cmd = ["masscan", *target_args, f"-p{scan_ports}", f"--rate={rate}", f"--wait={wait}", "-oL",
+               output_file]
+        print(f"Executing command: {' '.join(cmd)}")  # 打印执行的命令字符串
+
+        try:
+            result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+            print("Scan completed successfully.")
+            print(result.stdout)
+            return True
+        except subprocess.CalledProcessError as e:
+            print(f"Error executing masscan: {e}")
+            print(f"Exit status: {e.returncode}")
+            print(f"Standard output: {e.stdout}")
+            print(f"Standard error: {e.stderr}")
+            return False
+
+    def stream(self, targets, scan_ports, rate, progress=None, on_record=None, report_interval=10, wait=DEFAULT_WAIT,
+               include_file=None):
+        return masscan_stream.stream_scan(targets, scan_ports, rate, progress, on_record, report_interval, wait,
+                                          include_file)
+
+
+# 令牌桶限速, 只在单个事件循环中使用
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = burst if burst is not None else max(1.0, self.rate * BURST_SECONDS)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# 尝试建立一次 TCP 连接, 连接成功即认为端口开放; 关闭时发送 RST, 不留下 TIME_WAIT
+async def probe(loop, ip, port, timeout):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+    try:
+        await asyncio.wait_for(loop.sock_connect(sock, (ip, port)), timeout)
+        return True
+    except (OSError, asyncio.TimeoutError):
+        return False
+    finally:
+        sock.close()
+
+
+# 并发数受限于文件描述符上限, 尽量调高软限制
+def raise_fd_limit(concurrency):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = concurrency + 256
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        new_soft = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (new_soft, hard))
+        soft = new_soft
+    return min(concurrency, soft - 64) if soft != resource.RLIM_INFINITY else concurrency
+
+
+class ConnectBackend:
+    name = "connect"
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT):
+        self.concurrency = concurrency
+        self.timeout = timeout
+
+    @staticmethod
+    def available():
+        return True
+
+    async def _run(self, intervals, ports, rate, on_open, progress=None, report_interval=10):
+        loop = asyncio.get_running_loop()
+        concurrency = raise_fd_limit(self.concurrency)
+        semaphore = asyncio.Semaphore(concurrency)
+        bucket = TokenBucket(rate)
+        total = prefixes.count_addresses(intervals) * len(ports)
+        state = {"sent": 0, "found": 0}
+        tasks = set()
+        started = time.monotonic()
+
+        def report():
+            elapsed = max(time.monotonic() - started, 1e-9)
+            pps = state["sent"] / elapsed
+            remaining = (total - state["sent"]) / pps if pps > 0 else 0
+            progress.set_status(pps / 1000, 100.0 * state["sent"] / total if total else 100.0,
+                                time.strftime('%H:%M:%S', time.gmtime(remaining)), state["found"])
+
+        async def check(ip, port):
+            try:
+                if await probe(loop, ip, port, self.timeout):
+                    state["found"] += 1
+                    on_open((port, ip, int(time.time())))
+            finally:
+                semaphore.release()
+
+        last_report = time.monotonic()
+        for start, end in intervals:
+            for value in range(start, end + 1):
+                ip = str(ipaddress.IPv4Address(value))
+                for port in ports:
+                    await bucket.acquire()
+                    await semaphore.acquire()
+                    task = loop.create_task(check(ip, port))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    state["sent"] += 1
+                    if progress is not None and time.monotonic() - last_report >= report_interval:
+                        report()
+                        print(progress.format())
+                        last_report = time.monotonic()
+        if tasks:
+            await asyncio.gather(*tasks)
+        if progress is not None:
+            report()
+        return state
+
+    # wait 只对 masscan 有意义, connect 扫描等待每个连接各自的超时
+    def scan(self, targets, output_file, scan_ports, rate, include_file=None, wait=DEFAULT_WAIT):
+        intervals = parse_targets(targets, include_file)
+        ports = masscan_parser.parse_port_spec(scan_ports)
+        print(f"Connect-scanning {prefixes.count_addresses(intervals)} addresses x {len(ports)} ports "
+              f"at {rate} pps, {self.concurrency} concurrent connects...")
+        with open(output_file, 'w') as file:
+            file.write("#masscan\n")
+
+            def write(record):
+                port, ip, timestamp = record
+                file.write(f"open tcp {port} {ip} {timestamp}\n")
+
+            state = asyncio.run(self._run(intervals, ports, rate, write))
+            file.write(f"# end {int(time.time())}\n")
+        print(f"Scan completed successfully, {state['found']} open ports from {state['sent']} probes.")
+        return True
+
+    def stream(self, targets, scan_ports, rate, progress=None, on_record=None, report_interval=10, wait=DEFAULT_WAIT,
+               include_file=None):
+        progress = progress or masscan_stream.ScanProgress()
+        intervals = parse_targets(targets, include_file)
+        ports = masscan_parser.parse_port_spec(scan_ports)
+
+        def emit(record):
+            progress.add(record)
+            if on_record is not None:
+                on_record(record)
+
+        asyncio.run(self._run(intervals, ports, rate, emit, progress, report_interval))
+        progress.returncode = 0
+        print("Scan completed successfully.")
+        print(progress.format())
+        return progress
+
+
+BACKENDS = {
+    MasscanBackend.name: MasscanBackend,
+    ConnectBackend.name: ConnectBackend,
+}
+
+
+def get_backend(name=None):
+    name = name or DEFAULT_BACKEND
+    if name is None:
+        name = MasscanBackend.name if MasscanBackend.available() else ConnectBackend.name
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown scanner backend {name}, expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
@@ -0,0 +1,147 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import asn
+
+# 多 ASN 并行扫描调度: 所有 masscan 任务共享一个全局发包速率 (pps)
+DEFAULT_GLOBAL_RATE = 20000
+DEFAULT_MAX_WORKERS = 4
+
+
+# 解析 ASN 列表, "all" 或 None 表示 ASN_Map 中的全部 ASN
+def resolve_asns(asns):
+    if asns is None or asns == "all":
+        return list(asn.ASN_Map.keys())
+    if isinstance(asns, str):
+        return [a.strip() for a in asns.split(',') if a.strip()]
+    return list(asns)
+
+
+# 读取 ASN_Map 中记录的地址数量 (逗号后的第二个字段)
+def asn_address_count(asn_number):
+    value = asn.ASN_Map.get(asn_number)
+    if value is None:
+        return None
+    return int(value.rsplit(',', 1)[1])
+
+
+# 按地址数量把 ASN 分配到若干条 lane (最长处理时间优先), 每条 lane 内串行扫描
+def plan_lanes(jobs, max_workers):
+    lane_count = max(1, min(max_workers, len(jobs)))
+    lanes = [[] for _ in range(lane_count)]
+    loads = [0] * lane_count
+    for asn_number, addresses in sorted(jobs, key=lambda job: job[1], reverse=True):
+        index = loads.index(min(loads))
+        lanes[index].append(asn_number)
+        loads[index] += addresses
+    return lanes, loads
+
+
+# 注水算法切分速率: 按 demands ({key: 地址数}) 的比例分配 budget, 分到的速率超过 caps ({key: 上限}) 的只给上限,
+# 省下的部分继续按比例分给其余的 key; 没有上限的 key 会用完全部 budget
+def fill_rates(demands, caps, budget):
+    rates = {}
+    pending = dict(demands)
+    while pending:
+        total = sum(pending.values())
+        shares = {key: budget * demand / total if total else budget / len(pending) for key, demand in pending.items()}
+        capped = [key for key, share in shares.items() if caps.get(key) is not None and caps[key] < share]
+        if not capped:
+            rates.update(shares)
+            break
+        for key in capped:
+            rates[key] = caps[key]
+            budget -= caps[key]
+            del pending[key]
+    return {key: max(1, int(rate)) for key, rate in rates.items()}
+
+
+# 同一 lane 中先扫描有速率上限、最短耗时 (地址数 / 上限) 最长的 ASN, 其余按地址数从大到小;
+# 受限的 ASN 尽早开始, 它空出来的速率可以分给其他 lane, 不会在最后单独拖长总耗时
+def order_lane(lane, addresses, rate_caps):
+    def key(asn_number):
+        cap = rate_caps.get(asn_number)
+        return (cap is None, -(addresses[asn_number] / cap if cap else addresses[asn_number]))
+    return sorted(lane, key=key)
+
+
+# 全局速率预算: 每个 ASN 开始扫描时重新分配速率. 空闲的 lane 分到未被占用的速率中按剩余地址数 (包括正在运行的扫描
+# 尚未扫描的部分) 应得的份额, 在它们之间用注水算法分配, 受上限限制省下的部分分给同一批的其他 lane;
+# 已结束的 lane 不再计入剩余地址数, 它释放的速率由之后开始的扫描分得; 其他 lane 都已经没有待扫描的 ASN 时,
+# 开始扫描的 lane 可以用完全部空闲速率.
+# 限制: 扫描器的速率在启动后不能调整, 重新分配只发生在 ASN 的边界上, 正在运行的扫描用不到之后空出来的速率
+class RateBudget:
+    def __init__(self, lanes, addresses, global_rate, rate_caps=None):
+        self.addresses = addresses
+        self.global_rate = global_rate
+        self.rate_caps = rate_caps or {}
+        self.queues = {index: list(lane) for index, lane in enumerate(lanes)}
+        # {lane: (速率, 开始时间, 地址数)}
+        self.active = {}
+        self._lock = threading.Lock()
+
+    def _remaining(self, index):
+        return sum(self.addresses[asn_number] for asn_number in self.queues[index])
+
+    # 取出 lane 的下一个 ASN 并分配速率, 返回 (asn, 速率), lane 已经没有 ASN 时返回 None
+    def acquire(self, index):
+        with self._lock:
+            if not self.queues[index]:
+                return None
+            now = time.monotonic()
+            pool = [lane for lane, queue in self.queues.items() if queue and lane not in self.active]
+            free = self.global_rate - sum(rate for rate, _, _ in self.active.values())
+            budget = free
+            if any(self.queues[lane] for lane in self.active):
+                pool_remaining = sum(self._remaining(lane) for lane in pool)
+                remaining = pool_remaining + sum(
+                    self._remaining(lane) + max(0.0, addresses - rate * (now - started))
+                    for lane, (rate, started, addresses) in self.active.items())
+                budget = min(free, self.global_rate * pool_remaining / remaining)
+            rates = fill_rates({lane: self._remaining(lane) for lane in pool},
+                               {lane: self.rate_caps.get(self.queues[lane][0]) for lane in pool}, budget)
+            asn_number = self.queues[index].pop(0)
+            self.active[index] = (rates[index], now, self.addresses[asn_number])
+            return asn_number, rates[index]
+
+    def release(self, index):
+        with self._lock:
+            self.active.pop(index, None)
+
+
+# 并行执行扫描任务, scan_job(asn_number, rate) 在工作线程中运行, 返回 {asn: 结果}
+# rate_caps 为 {asn: 速率上限} (自适应速率模式的校准结果), ASN 的速率不超过上限, 省下的速率由 RateBudget 分给其他 lane
+def run_scheduled(jobs, scan_job, global_rate=DEFAULT_GLOBAL_RATE, max_workers=DEFAULT_MAX_WORKERS, rate_caps=None):
+    if not jobs:
+        return {}
+    rate_caps = rate_caps or {}
+    addresses = dict(jobs)
+    lanes, loads = plan_lanes(jobs, max_workers)
+    lanes = [order_lane(lane, addresses, rate_caps) for lane in lanes]
+    rates = fill_rates(dict(enumerate(loads)), {index: rate_caps.get(lane[0]) for index, lane in enumerate(lanes)},
+                       global_rate)
+    for index, (lane, load) in enumerate(zip(lanes, loads)):
+        print(f"Lane {index}: ASNs {lane}, {load} addresses, starting rate {rates[index]} pps")
+    print(f"Estimated sweep time per port: {sum(loads) / global_rate:.1f}s at {global_rate} pps")
+
+    budget = RateBudget(lanes, addresses, global_rate, rate_caps)
+
+    def run_lane(index):
+        results = {}
+        while True:
+            job = budget.acquire(index)
+            if job is None:
+                return results
+            asn_number, rate = job
+            try:
+                results[asn_number] = scan_job(asn_number, rate)
+            finally:
+                budget.release(index)
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=len(lanes)) as executor:
+        futures = [executor.submit(run_lane, index) for index in range(len(lanes))]
+        for future in futures:
+            results.update(future.result())
+    return results